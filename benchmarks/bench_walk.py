@@ -0,0 +1,54 @@
+""" Times the zone and line extraction of XmlParser.test(), a single pass over the tree, against the size of the
+document
+
+Run with `python benchmarks/bench_walk.py [REGIONS ...]` from the root of the repository. The `wildcard` column
+times the former extraction, which ran one `{*}` query per kind of element and one more per element for the content,
+for comparison. Both take about the same time on these documents, most of it spent parsing `custom` attributes.
+"""
+import os
+import random
+import sys
+import timeit
+
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from htrvx.zones import PageXML  # noqa: E402
+
+from corpus import CorpusConfig, make_page as corpus_make_page  # noqa: E402
+
+
+def make_page(regions: int) -> etree._ElementTree:
+    """ Builds a PAGE document of 20 lines per region with word-level TextEquiv """
+    config = CorpusConfig(regions=regions, lines=20, words=8)
+    return corpus_make_page(config, random.Random(config.seed), "page.png")
+
+
+def wildcard(obj: PageXML) -> None:
+    for region in obj.xml.findall(".//{*}TextRegion"):
+        obj._parse_custom(region.get("custom", ""))
+        region.find(".//{*}TextLine")
+    for line in obj.xml.findall(".//{*}TextLine"):
+        obj._parse_custom(line.get("custom", ""))
+        obj._check_line_content(line)
+
+
+def walk(obj: PageXML) -> None:
+    obj._collect(check_empty=True)
+
+
+def main(sizes=(10, 50, 250, 1000), repeat: int = 5) -> None:
+    print("regions,lines,elements,walk_ms,wildcard_ms")
+    for regions in sizes:
+        obj = PageXML(make_page(regions))
+        elements = sum(1 for _ in obj.xml.iter())
+        timings = {
+            name: min(timeit.repeat(lambda: func(obj), number=1, repeat=repeat)) * 1000
+            for name, func in (("walk", walk), ("wildcard", wildcard))
+        }
+        print(f"{regions},{regions * 20},{elements},{timings['walk']:.2f},{timings['wildcard']:.2f}")
+
+
+if __name__ == "__main__":
+    main(tuple(int(size) for size in sys.argv[1:]) or (10, 50, 250, 1000))
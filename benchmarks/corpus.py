@@ -0,0 +1,141 @@
+""" Generator of synthetic ALTO 4 and PAGE 2019 corpora for benchmarks
+
+Documents point to schemas shipped with HTRVX and to small PNG files holding only a header, so that every check
+can run offline.
+"""
+import os
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+from lxml import etree
+
+ALTO_NS = "http://www.loc.gov/standards/alto/ns-v4#"
+ALTO_XSD = "http://www.loc.gov/standards/alto/v4/alto-4-2.xsd"
+PAGE_NS = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15"
+PAGE_XSD = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15/pagecontent.xsd"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+
+@dataclass
+class CorpusConfig:
+    """ Shape of a synthetic corpus
+
+    :param pages: Number of documents, one page each
+    :param regions: Regions per page
+    :param lines: Lines per region
+    :param words: Words per line, with word-level text in PAGE (0 for line-level text only)
+    :param zone_types: Vocabulary of zone types
+    :param line_types: Vocabulary of line types
+    :param empty: Share of lines without text and of regions without lines
+    :param untagged: Share of regions and lines without a type
+    :param seed: Seed of the random generator, corpora are reproducible
+    """
+    pages: int = 10
+    regions: int = 5
+    lines: int = 20
+    words: int = 0
+    zone_types: Sequence[str] = field(default_factory=lambda: ["MainZone", "MarginTextZone", "NumberingZone"])
+    line_types: Sequence[str] = field(default_factory=lambda: ["DefaultLine", "HeadingLine"])
+    empty: float = 0.0
+    untagged: float = 0.0
+    seed: int = 42
+
+
+def png_header(width: int, height: int) -> bytes:
+    """ Returns a PNG file made of its signature, header and end chunks: enough to be read but not decoded """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)) + \
+        chunk(b"IEND", b"")
+
+
+def _sample(rng: random.Random, config: CorpusConfig):
+    """ Yields, for each region, its type (None if untagged) and its lines as (type, has_text) """
+    for _ in range(config.regions):
+        zone_type = None if rng.random() < config.untagged else rng.choice(config.zone_types)
+        lines = [] if rng.random() < config.empty else [
+            (None if rng.random() < config.untagged else rng.choice(config.line_types), rng.random() >= config.empty)
+            for _ in range(config.lines)
+        ]
+        yield zone_type, lines
+
+
+def make_alto(config: CorpusConfig, rng: random.Random, image: str, page_id: int = 0) -> etree._ElementTree:
+    def el(parent, name, **attrib):
+        return etree.SubElement(parent, f"{{{ALTO_NS}}}{name}", **attrib)
+    root = etree.Element(f"{{{ALTO_NS}}}alto", nsmap={None: ALTO_NS, "xsi": XSI_NS})
+    root.set(f"{{{XSI_NS}}}schemaLocation", f"{ALTO_NS} {ALTO_XSD}")
+    description = el(root, "Description")
+    el(description, "MeasurementUnit").text = "pixel"
+    el(el(description, "sourceImageInformation"), "fileName").text = image
+    tags = el(root, "Tags")
+    for prefix, types in (("BT", config.zone_types), ("LT", config.line_types)):
+        for idx, label in enumerate(types):
+            el(tags, "OtherTag", ID=f"{prefix}{idx}", LABEL=label, DESCRIPTION=f"type {label}")
+    page = el(el(root, "Layout"), "Page", WIDTH="1000", HEIGHT="1500", PHYSICAL_IMG_NR=str(page_id), ID=f"p{page_id}")
+    space = el(page, "PrintSpace", HPOS="0", VPOS="0", WIDTH="1000", HEIGHT="1500")
+    box = dict(HPOS="10", VPOS="10", WIDTH="100", HEIGHT="10")
+    for r, (zone_type, lines) in enumerate(_sample(rng, config)):
+        block = el(space, "TextBlock", ID=f"r{r}", **box)
+        if zone_type:
+            block.set("TAGREFS", f"BT{list(config.zone_types).index(zone_type)}")
+        el(el(block, "Shape"), "Polygon", POINTS="10 10 10 20 110 20 110 10")
+        for li, (line_type, has_text) in enumerate(lines):
+            line = el(block, "TextLine", ID=f"r{r}l{li}", BASELINE="10 20 110 20", **box)
+            if line_type:
+                line.set("TAGREFS", f"LT{list(config.line_types).index(line_type)}")
+            el(line, "String", CONTENT="Some content" if has_text else "", **box)
+    return etree.ElementTree(root)
+
+
+def make_page(config: CorpusConfig, rng: random.Random, image: str, page_id: int = 0) -> etree._ElementTree:
+    def el(parent, name, **attrib):
+        return etree.SubElement(parent, f"{{{PAGE_NS}}}{name}", **attrib)
+
+    def text(parent, value):
+        el(el(parent, "TextEquiv"), "Unicode").text = value
+
+    root = etree.Element(f"{{{PAGE_NS}}}PcGts", nsmap={None: PAGE_NS, "xsi": XSI_NS})
+    root.set(f"{{{XSI_NS}}}schemaLocation", f"{PAGE_NS} {PAGE_XSD}")
+    metadata = el(root, "Metadata")
+    el(metadata, "Creator").text = "htrvx"
+    el(metadata, "Created").text = "2024-01-01T00:00:00"
+    el(metadata, "LastChange").text = "2024-01-01T00:00:00"
+    page = el(root, "Page", imageFilename=image, imageWidth="1000", imageHeight="1500")
+    for r, (zone_type, lines) in enumerate(_sample(rng, config)):
+        region = el(page, "TextRegion", id=f"p{page_id}r{r}")
+        if zone_type:
+            region.set("custom", f"structure {{type:{zone_type};}}")
+        el(region, "Coords", points="10,10 10,20 110,20 110,10")
+        for li, (line_type, has_text) in enumerate(lines):
+            line = el(region, "TextLine", id=f"p{page_id}r{r}l{li}")
+            structure = f" structure {{type:{line_type};}}" if line_type else ""
+            line.set("custom", f"readingOrder {{index:{li};}}{structure}")
+            el(line, "Coords", points="10,10 10,20 110,20 110,10")
+            for w in range(config.words):
+                word = el(line, "Word", id=f"p{page_id}r{r}l{li}w{w}")
+                el(word, "Coords", points="10,10 10,20 20,20 20,10")
+                text(word, "word" if has_text else "")
+            text(line, "Some content" if has_text else "")
+    return etree.ElementTree(root)
+
+
+def write_corpus(directory: str, format: str = "alto", config: CorpusConfig = CorpusConfig()) -> List[str]:
+    """ Writes config.pages documents of the given format, and their images, to directory. Returns the paths of
+    the documents.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(config.seed)
+    make = make_alto if format == "alto" else make_page
+    paths = []
+    for page_id in range(config.pages):
+        image = f"page{page_id:06d}.png"
+        with open(os.path.join(directory, image), "wb") as f:
+            f.write(png_header(1000, 1500))
+        path = os.path.join(directory, f"page{page_id:06d}.xml")
+        make(config, rng, image, page_id).write(path, xml_declaration=True, encoding="UTF-8")
+        paths.append(path)
+    return paths
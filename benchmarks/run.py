@@ -0,0 +1,89 @@
+""" Times each check and the whole test() on synthetic corpora of several sizes
+
+Run from the root of the repository, eg. `python benchmarks/run.py --sizes 10 100 1000 --output bench.json`.
+Results are printed as CSV and, with --output, saved as JSON so that they can be compared between releases.
+Everything runs offline: documents use the schemas shipped with HTRVX.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from htrvx.cache import _htrvx_version  # noqa: E402
+from htrvx.testing import test  # noqa: E402
+
+from corpus import CorpusConfig, write_corpus  # noqa: E402
+
+NoCheck = dict(segmonto=False, check_empty=False, check_image=False, xsd=False)
+Checks: Dict[str, Dict[str, bool]] = {
+    "parse": NoCheck,
+    "segmonto": {**NoCheck, "segmonto": True},
+    "check_empty": {**NoCheck, "check_empty": True},
+    "check_image": {**NoCheck, "check_image": True},
+    "xsd": {**NoCheck, "xsd": True},
+    "all": dict(segmonto=True, check_empty=True, check_image=True, xsd=True)
+}
+
+
+def run(sizes: List[int], formats: List[str], checks: List[str], config: CorpusConfig,
+        repeat: int = 3, jobs: int = 1) -> List[Dict[str, Any]]:
+    results = []
+    print("format,pages,lines,check,seconds,pages_per_second")
+    with tempfile.TemporaryDirectory() as directory:
+        for format in formats:
+            for size in sizes:
+                config.pages = size
+                files = write_corpus(os.path.join(directory, f"{format}-{size}"), format, config)
+                for check in checks:
+                    options = dict(format=format, raise_empty=True, jobs=jobs, keep_logs=False, **Checks[check])
+                    test(files[:1], **options)  # Warms up schemas and regexes
+                    seconds = min(timeit.repeat(lambda: test(files, **options), number=1, repeat=repeat))
+                    result = {
+                        "format": format, "pages": size, "lines": size * config.regions * config.lines,
+                        "check": check, "seconds": round(seconds, 6),
+                        "pages_per_second": round(size / seconds, 2)
+                    }
+                    print(",".join(str(value) for value in result.values()))
+                    results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="Numbers of pages")
+    parser.add_argument("--formats", nargs="+", default=["alto", "page"], choices=["alto", "page"])
+    parser.add_argument("--checks", nargs="+", default=list(Checks), choices=list(Checks))
+    parser.add_argument("--regions", type=int, default=5, help="Regions per page")
+    parser.add_argument("--lines", type=int, default=20, help="Lines per region")
+    parser.add_argument("--words", type=int, default=0, help="Words per line (PAGE only)")
+    parser.add_argument("--empty", type=float, default=0.05, help="Share of empty regions and lines")
+    parser.add_argument("--untagged", type=float, default=0.05, help="Share of untagged regions and lines")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measure, the fastest is kept")
+    parser.add_argument("--jobs", type=int, default=1, help="Processes used by test()")
+    parser.add_argument("--output", help="Path of the JSON results")
+    args = parser.parse_args(argv)
+
+    config = CorpusConfig(regions=args.regions, lines=args.lines, words=args.words,
+                          empty=args.empty, untagged=args.untagged)
+    results = run(args.sizes, args.formats, args.checks, config, repeat=args.repeat, jobs=args.jobs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "htrvx": _htrvx_version(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
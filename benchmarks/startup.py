@@ -0,0 +1,100 @@
+""" Times the imports of HTRVX modules with `python -X importtime`, in fresh interpreters
+
+Run from the root of the repository, eg. `python benchmarks/startup.py --max-ms 150`. For each module, the median
+of several runs is printed with the slowest modules it imports. With --max-ms, the script fails when a module takes
+longer than that to import, and it always fails when a module imports one of the modules that HTRVX only loads on
+use (see Deferred), so that it can guard startup time in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+Root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only needed by rare paths: downloading schemas, parallel runs, plugins, the daemon, archives, image
+#   checks...
+Deferred = ["requests", "multiprocessing", "importlib.metadata", "http.server", "http.client", "statistics",
+            "subprocess", "concurrent.futures", "logging", "zipfile", "tarfile"]
+# Terminal output is not needed by library imports
+DeferredFromLibrary = ["click"]
+
+Modules = {
+    "htrvx.cli": Deferred,
+    "htrvx.testing": Deferred + DeferredFromLibrary,
+}
+
+
+def import_times(module: str) -> Tuple[int, Dict[str, int]]:
+    """ Imports module in a fresh interpreter and returns its cumulative import time in microseconds and the
+    cumulative times of the modules imported by it, leaving out those loaded at startup (eg. by site)
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=Root, capture_output=True, text=True, check=True)
+    # Modules are listed once imported, after the modules they import, indented by depth
+    times: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():  # Header
+            continue
+        if name[1:] == module:
+            return int(cumulative), times
+        if not name[1:].startswith(" "):  # Another top-level import
+            times = {}
+        else:
+            times[name.strip()] = int(cumulative)
+    return 0, times
+
+
+def run(repeat: int = 5, top: int = 5) -> List[Dict[str, Any]]:
+    results = []
+    for module, deferred in Modules.items():
+        runs = [import_times(module) for _ in range(repeat)]
+        total = statistics.median(run[0] for run in runs)
+        times = runs[-1][1]
+        slowest = sorted(
+            ((name, cumulative) for name, cumulative in times.items() if name != module),
+            key=lambda item: -item[1]
+        )[:top]
+        results.append({
+            "module": module,
+            "ms": round(total / 1000, 1),
+            "slowest": [{"module": name, "ms": round(cumulative / 1000, 1)} for name, cumulative in slowest],
+            "loaded_deferred": sorted(name for name in deferred if name in times)
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per module, the median is kept")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest imported modules printed")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail when a module takes longer to import")
+    parser.add_argument("--output", help="Path of the JSON results")
+    args = parser.parse_args(argv)
+
+    failed = False
+    results = run(repeat=args.repeat, top=args.top)
+    for result in results:
+        print(f"{result['module']}: {result['ms']} ms")
+        for imported in result["slowest"]:
+            print(f"    {imported['ms']:8.1f} ms {imported['module']}")
+        if result["loaded_deferred"]:
+            failed = True
+            print(f"    imports {', '.join(result['loaded_deferred'])}, which should only be imported on use")
+        if args.max_ms is not None and result["ms"] > args.max_ms:
+            failed = True
+            print(f"    slower than {args.max_ms} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
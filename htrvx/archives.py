@@ -0,0 +1,146 @@
+""" Reading of the files inside zip and tar archives without extracting them. A file inside an archive is named
+after the archive and its path in it, separated by `!`, eg. `release.zip!data/page.xml`.
+"""
+import os
+import posixpath
+import threading
+from collections import OrderedDict
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+MemberSeparator = "!"
+ArchiveExtensions = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_archive(path: str) -> bool:
+    """ Tells whether path is a file with the extension of a zip or tar archive """
+    return path.lower().endswith(ArchiveExtensions) and os.path.isfile(path)
+
+
+def _normalize_member(member: str) -> str:
+    return posixpath.normpath(member.replace("\\", "/")).lstrip("/")
+
+
+def split_member(name: str) -> Optional[Tuple[str, str]]:
+    """ Returns the path of the archive and the path in the archive of name, None if name is not inside an archive
+    """
+    start = name.find(MemberSeparator)
+    while start != -1:
+        if is_archive(name[:start]):
+            return name[:start], _normalize_member(name[start + 1:])
+        start = name.find(MemberSeparator, start + 1)
+    return None
+
+
+def join_link(name: str, link: str) -> str:
+    """ Returns the path of link, relative to the directory of the file name. Links of files inside archives point
+    inside the same archive, eg. `release.zip!f33.jpeg` for `f33.jpeg` in `release.zip!page.xml`.
+    """
+    member = split_member(name) if MemberSeparator in name else None
+    if member is None:
+        return os.path.join(os.path.dirname(name), link)
+    archive, member = member
+    return f"{archive}{MemberSeparator}{posixpath.join(posixpath.dirname(member), link)}"
+
+
+class Archive:
+    """ Zip or tar archive, optionally compressed, whose members are read on demand.
+
+    Reading members of compressed tar archives in the order of the archive is the fastest: the archive is then
+    decompressed once. Zip archives can be read in any order.
+
+    :raises ValueError: If path is neither a zip nor a tar archive
+    """
+    def __init__(self, path: str):
+        # Imported on use, with their compression modules: most runs do not read archives
+        import tarfile
+        import zipfile
+        self.path = path
+        self._zip: Optional["zipfile.ZipFile"] = None
+        self._tar: Optional["tarfile.TarFile"] = None
+        self._members: Dict[str, Union["zipfile.ZipInfo", "tarfile.TarInfo"]] = {}
+        if zipfile.is_zipfile(path):
+            try:
+                self._zip = zipfile.ZipFile(path)
+            except zipfile.BadZipFile as E:
+                raise ValueError(f"{path} is not a readable zip archive: {E}")
+            members = [(info.filename, info) for info in self._zip.infolist() if not info.is_dir()]
+        else:
+            try:
+                self._tar = tarfile.open(path)
+            except tarfile.TarError as E:
+                raise ValueError(f"{path} is neither a zip nor a tar archive: {E}")
+            members = [(info.name, info) for info in self._tar.getmembers() if info.isfile()]
+        for member, info in members:
+            self._members.setdefault(_normalize_member(member), info)
+
+    def names(self) -> List[str]:
+        """ Returns the paths of the files of the archive, in the order of the archive """
+        return list(self._members)
+
+    def exists(self, member: str) -> bool:
+        return _normalize_member(member) in self._members
+
+    def open(self, member: str) -> IO[bytes]:
+        """ Returns a binary stream of member, read from the archive as it is consumed
+
+        :raises FileNotFoundError: If member is not a file of the archive
+        """
+        try:
+            info = self._members[_normalize_member(member)]
+        except KeyError:
+            raise FileNotFoundError(f"No file `{member}` in archive {self.path}")
+        if self._zip is not None:
+            return self._zip.open(info)
+        return self._tar.extractfile(info)
+
+    def close(self) -> None:
+        for archive in (self._zip, self._tar):
+            if archive is not None:
+                archive.close()
+
+
+# Archives opened by each thread (tar files can't be shared between threads), by path and state of the file
+_local = threading.local()
+_MaxOpenArchives = 8
+
+
+def open_archive(path: str) -> Archive:
+    """ Returns the archive at path, opened once per thread as long as the file does not change. The last
+    archives used are kept open.
+    """
+    archives: "OrderedDict[Tuple[str, int, int], Archive]" = getattr(_local, "archives", None)
+    if archives is None:
+        archives = _local.archives = OrderedDict()
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key in archives:
+        archives.move_to_end(key)
+        return archives[key]
+    archive = archives[key] = Archive(path)
+    while len(archives) > _MaxOpenArchives:
+        archives.popitem(last=False)[1].close()
+    return archive
+
+
+def iter_members(path: str, extension: str = ".xml") -> Iterator[str]:
+    """ Yields the names of the files with extension in the archive at path, eg. `path!data/page.xml` """
+    extension = extension.lower()
+    for member in open_archive(path).names():
+        if member.lower().endswith(extension):
+            yield f"{path}{MemberSeparator}{member}"
+
+
+def exists(name: str) -> bool:
+    """ Tells whether the file name, on the filesystem or inside an archive, exists """
+    member = split_member(name) if MemberSeparator in name else None
+    if member is None:
+        return os.path.exists(name)
+    return open_archive(member[0]).exists(member[1])
+
+
+def open_file(name: str) -> IO[bytes]:
+    """ Opens the file name, on the filesystem or inside an archive, in binary mode """
+    member = split_member(name) if MemberSeparator in name else None
+    if member is None:
+        return open(name, "rb")
+    return open_archive(member[0]).open(member[1])
@@ -0,0 +1,219 @@
+""" On-disk cache of test results, so that unchanged files are not tested again between runs """
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from htrvx.archives import open_file, split_member, MemberSeparator
+from htrvx.schemas import _here as _schemas_dir
+
+
+def default_cache_dir() -> str:
+    """ Returns $HTRVX_CACHE_DIR, or htrvx/ in $XDG_CACHE_HOME (~/.cache by default) """
+    if os.environ.get("HTRVX_CACHE_DIR"):
+        return os.environ["HTRVX_CACHE_DIR"]
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "htrvx")
+
+
+def dependency_state(path: str, detailed: bool = False) -> Union[bool, List[int]]:
+    """ Returns what a cached result knows about a file it depends on: whether it exists or, when the result
+    depends on its content, its size and modification time (False if it does not exist). Files inside archives
+    depend on the size and modification time of their archive.
+    """
+    member = split_member(path) if MemberSeparator in path else None
+    if member is not None:
+        path, detailed = member[0], True
+    if not detailed:
+        return os.path.exists(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+@lru_cache(maxsize=1)
+def _htrvx_version() -> str:
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return version("htrvx")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+@lru_cache(maxsize=1)
+def _schemas_fingerprint() -> str:
+    """ Hash of the schemas shipped with HTRVX, which XSD results depend on """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(_schemas_dir, "*.xsd"))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open_file(path) as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """ Stores the serialized result of a file under a key made of the hash of its content, the options of the
+    test, the version of HTRVX and, when XSD validation is on, the schemas shipped with HTRVX.
+
+    Results depending on other files (eg. linked images, or the schema files of XSD validation, local or in the
+    schema store) record their state, see dependency_state(), and are dropped if it changed.
+
+    :param directory: Directory of the cache, see default_cache_dir()
+    :param max_size: Maximum size of the cache in bytes, least recently used entries are removed first by prune()
+    """
+    def __init__(self, directory: Optional[str] = None, max_size: int = 512 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        # Set once an entry could not be written (eg. the directory is read-only), results are then not saved
+        self.read_only = False
+
+    def key(self, path: str, options: Dict[str, Any]) -> str:
+        """ Computes the key of the result of path tested with options (keyword arguments of test_single()) """
+        fingerprint = {
+            "version": _htrvx_version(),
+            "options": options,
+            "schemas": _schemas_fingerprint() if options.get("xsd") else None,
+            # Image links are relative to the file
+            "path": os.path.abspath(path) if options.get("check_image") or options.get("check_image_size") else None
+        }
+        fingerprint = json.dumps(fingerprint, sort_keys=True, default=sorted)
+        return hashlib.sha256(f"{_file_hash(path)}:{fingerprint}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """ Returns the value stored under key, or None if it is missing or if one of its dependencies changed """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for dependency, state in entry.get("dependencies", {}).items():
+            if dependency_state(dependency, detailed=not isinstance(state, bool)) != state:
+                return None
+        # Marks the entry as recently used, unless another process pruned it in the meantime
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def set(self, key: str, value: Dict[str, Any],
+            dependencies: Optional[Dict[str, Union[bool, List[int]]]] = None) -> None:
+        """ Stores value under key. When the cache can't be written, a warning is logged once and values are no
+        longer stored.
+
+        :param dependencies: Paths the value depends on, with their state when it was computed
+        """
+        if self.read_only:
+            return
+        path = self._path(key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so that concurrent processes never read a partial entry
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"value": value, "dependencies": dependencies or {}}, f)
+            os.replace(tmp, path)
+        except OSError as E:
+            # Imported on use, as in htrvx.schemas: writes seldom fail
+            import logging
+            logging.getLogger(__name__).warning(
+                f"Results are not cached, the cache at {self.directory} can't be written: {E}"
+            )
+            self.read_only = True
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _entries(self):
+        for bucket in os.scandir(self.directory) if os.path.isdir(self.directory) else []:
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith(".json"):
+                        yield entry
+
+    def prune(self) -> int:
+        """ Removes the least recently used entries until the cache fits in max_size. Returns the number of
+        removed entries.
+        """
+        entries = []
+        total = 0
+        # Other processes may prune the same directory at the same time: entries they removed are skipped
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    def clear(self) -> None:
+        """ Removes every entry of the cache """
+        for entry in list(self._entries()):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Tuple[int, int]:
+        """ Returns the number of entries and their total size in bytes """
+        sizes = []
+        for entry in self._entries():
+            try:
+                sizes.append(entry.stat().st_size)
+            except OSError:
+                continue
+        return len(sizes), sum(sizes)
+
+
+class PeriodicPrune:
+    """ Prunes cache every interval seconds in a background thread, and once more when stopped. Long-running
+    processes (the daemon, --watch) use it rather than pruning after each batch of files, as pruning stats every
+    entry of the cache.
+    """
+    def __init__(self, cache: ResultCache, interval: float = 600.0):
+        self.cache = cache
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="htrvx-prune", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.cache.prune()
+
+    def start(self) -> "PeriodicPrune":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cache.prune()
@@ -0,0 +1,85 @@
+""" Checks added by plugins, fed by the same traversal of each document as the built-in checks
+
+A check declares the local names of the elements it needs (eg. `TextLine`), receives each of them during the walk
+of the document and then returns its statuses. Checks are registered with register() or, for packages, with an
+entry point in the `htrvx.checks` group, eg. in setup.py:
+
+    entry_points={"htrvx.checks": ["no-empty-ids = my_package.checks:NoEmptyIds"]}
+
+and enabled with `htrvx --check no-empty-ids`.
+"""
+from typing import ClassVar, Dict, FrozenSet, List, Optional, Type, TYPE_CHECKING
+
+import lxml.etree as ET
+
+if TYPE_CHECKING:
+    from htrvx.testing import Status
+
+EntryPointGroup = "htrvx.checks"
+
+
+class UnknownCheck(ValueError):
+    """Error raised when no check is registered under a name"""
+
+
+class Check:
+    """ Base class of checks. A new instance is created for every file.
+
+    With the DOM engine, elements are given in document order, with their whole subtree. With the streaming engine,
+    they are given at their end tag, also with their whole subtree, which is kept in memory until then: prefer
+    small elements (eg. TextLine rather than Page).
+
+    :param format: `alto` or `page`
+    :param filepath: Path of the tested file, if it is one
+    """
+    # Name of the check, used to enable it and as the task of its statuses
+    name: ClassVar[str] = ""
+    # Local names of the elements the check needs, whatever their namespace
+    tags: ClassVar[FrozenSet[str]] = frozenset()
+    # Formats the check applies to
+    formats: ClassVar[FrozenSet[str]] = frozenset(["alto", "page"])
+    # Changing it invalidates the cached results of files tested with the check
+    version: ClassVar[str] = "1"
+
+    def __init__(self, format: str, filepath: Optional[str] = None):
+        self.format = format
+        self.filepath = filepath
+
+    def element(self, element: ET._Element, name: str) -> None:
+        """ Receives an element whose local name is in tags """
+
+    def result(self) -> List["Status"]:
+        """ Returns the statuses of the check, once the document was traversed """
+        raise NotImplementedError
+
+
+_registry: Dict[str, Type[Check]] = {}
+_entry_points_loaded = [False]
+
+
+def register(check: Type[Check]) -> Type[Check]:
+    """ Registers a check class under its name, can be used as a decorator """
+    if not check.name:
+        raise ValueError(f"{check.__name__} has no name")
+    _registry[check.name] = check
+    return check
+
+
+def available_checks() -> Dict[str, Type[Check]]:
+    """ Returns the registered checks by name, loading those of the `htrvx.checks` entry points on first call """
+    if not _entry_points_loaded[0]:
+        from importlib.metadata import entry_points
+        _entry_points_loaded[0] = True
+        for entry_point in entry_points(group=EntryPointGroup):
+            check = entry_point.load()
+            if not check.name:
+                check.name = entry_point.name
+            _registry.setdefault(check.name, check)
+    return dict(_registry)
+
+
+def get_check(name: str) -> Type[Check]:
+    try:
+        return available_checks()[name]
+    except KeyError:
+        raise UnknownCheck(f"No check named `{name}`, available checks: {', '.join(sorted(_registry)) or 'none'}")
@@ -1,15 +1,88 @@
+import itertools
+import json
+import os
 import sys
 import click
 
+from htrvx.cache import ResultCache
+from htrvx.checks import available_checks, get_check, UnknownCheck
+from htrvx.client import Client, ClientError, DefaultHost, DefaultPort
+from htrvx.images import ImageResolver
+from htrvx.inputs import iter_paths, read_file_list, MissingInput
+from htrvx.reports import Reports
+from htrvx.schemas import schema_store, SchemaStore
 from htrvx.testing import test
+from htrvx.timings import TimingReport
 from typing import Sequence, Optional
 
-@click.command()
-@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False, file_okay=True))
+# Modules of subcommands and of options used on their own (--watch, --sample, --changed-since) are imported by the
+#   code using them, so that short runs only pay for the imports they need
+
+
+def _check_names(ctx, param, value):
+    for name in value:
+        try:
+            get_check(name)
+        except UnknownCheck as E:
+            raise click.BadParameter(str(E))
+    return value
+
+
+def _sample_size(ctx, param, value):
+    if value is None:
+        return None
+    from htrvx.sampling import parse_sample_size, InvalidSampleSize
+    try:
+        return parse_sample_size(value)
+    except InvalidSampleSize as E:
+        raise click.BadParameter(str(E))
+
+
+def _max_errors(ctx, param, value):
+    """ Returns the limits of --max-errors: a number for every check, or a number per check name with `*` for the
+    checks not listed
+    """
+    if not value:
+        return None
+    limits = {}
+    for limit in value:
+        check, _, number = limit.rpartition("=")
+        try:
+            number = int(number)
+        except ValueError:
+            number = -1
+        if number < 0:
+            raise click.BadParameter(f"`{limit}` is neither N nor CHECK=N, N being a positive number")
+        limits[check or "*"] = number
+    return limits["*"] if list(limits) == ["*"] else limits
+
+
+class _DefaultGroup(click.Group):
+    """ Group running its default command when the first argument is neither one of its commands nor a help
+    option, so that `htrvx FILES` keeps working next to `htrvx schemas` and `htrvx --help` lists the commands
+    """
+    def __init__(self, *args, default: str, **kwargs):
+        super(_DefaultGroup, self).__init__(*args, **kwargs)
+        self.default = default
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in self.get_help_option_names(ctx)):
+            args = [self.default, *args]
+        return super(_DefaultGroup, self).parse_args(ctx, args)
+
+
+@click.group(cls=_DefaultGroup, default="check", context_settings={"help_option_names": ["-h", "--help"]})
+def main():
+    """ HTRVX checks ALTO and PAGE files, see `htrvx check --help`. `htrvx FILES` is short for `htrvx check FILES`.
+    """
+
+
+@main.command("check")
+@click.argument("files", nargs=-1, type=click.Path())
 @click.option("-v", "--verbose", default=False, is_flag=True,
               help="Prints more information", show_default=True)
 @click.option("-f", "--format", default="alto", type=click.Choice(["alto", "page", "auto"]),
-              help="Format of files", show_default=True)
+              help="Format of files, auto detects it from the namespace of each file", show_default=True)
 @click.option("-s", "--segmonto", is_flag=True, default=False,
               help="Apply Segmonto Zoning verification", show_default=True)
 @click.option("--zone", default=None, multiple=True,
@@ -20,8 +93,15 @@ from typing import Sequence, Optional
               help="Check for empty lines or empty zones", show_default=True)
 @click.option("-i", "--check-image", is_flag=True, default=False,
               help="Check if image links in the XML points to real files", show_default=True)
+@click.option("--check-image-size", is_flag=True, default=False,
+              help="Check that linked images, read from their header, have the size declared by the page")
+@click.option("--image-manifest", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="With --check-image, look images up in this list of paths (one per line or NUL-separated, "
+                   "relative to its directory) instead of the filesystem")
 @click.option("-r", "--raise-empty", is_flag=True, default=False,
               help="Warns but not fails if empty lines or empty zones are found", show_default=True)
+@click.option("--check", "checks", multiple=True, callback=_check_names, metavar="NAME",
+              help="Run a check provided by a plugin, see `htrvx checks`")
 @click.option("-x", "--xsd", is_flag=True, default=False,
               help="Apply XSD Schema verification", show_default=True)
 @click.option("-l", "--verbose-level", default="zen", type=click.Choice(["minimal", "low", "zen", "all"]),
@@ -36,17 +116,91 @@ from typing import Sequence, Optional
               help="Maximum number of untagged zones")
 @click.option("--max-untagged-lines", default=-1, type=click.INT, show_default=True,
               help="Maximum number of untagged lines")
+@click.option("--max-errors", default=None, multiple=True, callback=_max_errors, metavar="[CHECK=]N",
+              help="Show at most N errors per check and summarize the others as `+N more`, either for every check "
+                   "or for CHECK only (eg. `--max-errors 20 --max-errors schema=5`)")
+@click.option("--fail-fast", is_flag=True, default=False,
+              help="Stop at the first failing file, skipping its remaining checks")
+@click.option("--max-failures", default=None, type=click.IntRange(min=1), metavar="N",
+              help="Stop once N files failed")
+@click.option("--huge-tree", is_flag=True, default=False,
+              help="Lift the XML parser's safety limits on depth and text size, for very large trusted files")
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=0), show_default=True,
+              help="Number of processes used to test files, 0 uses every available CPU")
+@click.option("--engine", default="dom", type=click.Choice(["dom", "stream"]), show_default=True,
+              help="Parse whole files (dom) or stream zones and lines to keep memory low on large files (stream)")
+@click.option("--no-cache", is_flag=True, default=False,
+              help="Do not reuse nor save results of previous runs for unchanged files")
+@click.option("--cache-dir", default=None, type=click.Path(file_okay=False),
+              help="Directory of the result cache [default: $HTRVX_CACHE_DIR or ~/.cache/htrvx]")
+@click.option("--cache-max-size", default=512, type=click.IntRange(min=0), show_default=True,
+              help="Maximum size of the result cache in MB, least recently used results are removed first")
+@click.option("--clear-cache", is_flag=True, default=False,
+              help="Empty the result cache before testing")
+@click.option("--files-from", default=None, type=click.File("r", lazy=True), metavar="FILE",
+              help="Also test the paths listed in FILE, one per line or NUL-separated, - for the standard input")
+@click.option("--changed-since", default=None, metavar="REF",
+              help="Only test XML files added or modified since the git reference REF, or linking to images that "
+                   "changed since then. If FILES are given, only those are considered")
+@click.option("--sample", default=None, callback=_sample_size, metavar="N|P%",
+              help="Only test a random sample of N files or P% of the files, drawn from each directory in "
+                   "proportion to its number of files, and estimate the failure rate of each check over all files")
+@click.option("--seed", default=None, type=click.INT,
+              help="Seed of --sample, to draw the same sample again [default: random, printed with the estimates]")
+@click.option("--watch", default=None, multiple=True, type=click.Path(exists=True, file_okay=False), metavar="DIR",
+              help="Test the XML files in DIR, then test again the ones added or modified, until Ctrl+C. Files are "
+                   "tested in this process, which keeps schemas in memory")
+@click.option("--interval", default=1.0, type=click.FloatRange(min=0.05), show_default=True,
+              help="Seconds between two polls of the directories of --watch")
+@click.option("--report", default=None, type=click.Choice(sorted(Reports)),
+              help="Write a machine-readable report, file by file, to --output")
+@click.option("-o", "--output", default="-", type=click.File("w", lazy=True), show_default=True,
+              help="Path of the report, - for the standard output")
+@click.option("--timings", is_flag=True, default=False,
+              help="Measure the time spent on parsing and on each check, and print totals and the slowest files "
+                   "at the end. Results are not read from the cache")
+@click.option("--slowest", default=10, type=click.IntRange(min=0), show_default=True,
+              help="Number of slowest files printed with --timings")
 def cmd(files, verbose: bool = False, group: bool = True, format: str ="alto", segmonto: bool = True,
         check_empty: bool = True, raise_empty: bool = True,
-        xsd: bool = False, check_image: bool = False, verbose_level: str = "zen",
+        xsd: bool = False, check_image: bool = False, check_image_size: bool = False,
+        image_manifest: Optional[str] = None, checks: Sequence[str] = (),
+        verbose_level: str = "zen",
         zone: Optional[Sequence[str]] = None, line: Optional[Sequence[str]] = None,
         allow_untagged: Optional[str] = None,
         max_untagged_zones: int = -1,
-        max_untagged_lines: int = -1):
+        max_untagged_lines: int = -1,
+        max_errors=None,
+        fail_fast: bool = False,
+        max_failures: Optional[int] = None,
+        huge_tree: bool = False,
+        jobs: int = 1,
+        engine: str = "dom",
+        no_cache: bool = False,
+        cache_dir: Optional[str] = None,
+        cache_max_size: int = 512,
+        clear_cache: bool = False,
+        files_from=None,
+        changed_since: Optional[str] = None,
+        sample=None,
+        seed: Optional[int] = None,
+        watch: Sequence[str] = (),
+        interval: float = 1.0,
+        report: Optional[str] = None,
+        output=None,
+        timings: bool = False,
+        slowest: int = 10):
     """ Apply the XSD on FILES. XSD can be a URI, a filepath or a schema provided with this tool (eg. "ALTO-Segmonto")
 
+    FILES can be files, directories, searched recursively for XML files, or quoted glob patterns, expanded by
+    htrvx rather than by the shell. Files are tested as they are found.
+
     eg. `htrvx ./data/**/*.xml --group --schema --format alto`
 
+    eg. `htrvx ./data --group --schema --format alto` or `htrvx "./data/**/*.xml" --format alto`
+
+    Schemas declared by files are looked up in the schema store, see `htrvx schemas --help`.
+
     With multiple zones
 
     eg. `htrvx ./data/**/*.xml --group --schema --format alto --zone Col --zone Header`
@@ -54,14 +208,213 @@ def cmd(files, verbose: bool = False, group: bool = True, format: str ="alto", s
     """
     if allow_untagged == "both":
         allow_untagged = {"line", "zone"}
-    if test(files, verbose=verbose, group=group, format=format, segmonto=segmonto,
+    if watch:
+        from htrvx.watch import watch as watch_directories
+        if files or files_from is not None or changed_since or sample is not None or report or jobs != 1 or \
+                fail_fast or max_failures is not None or timings or clear_cache:
+            raise click.UsageError("--watch can't be combined with FILES, --files-from, --changed-since, --sample, "
+                                   "--report, --jobs, --fail-fast, --max-failures, --timings or --clear-cache")
+        watcher = watch_directories(
+            watch, interval=interval, verbose=verbose, group=group, format=format, segmonto=segmonto,
             xsd=xsd, raise_empty=raise_empty, check_empty=check_empty, check_image=check_image,
             verbose_level=verbose_level, zones=zone, lines=line, allow_untagged=allow_untagged,
-            max_untagged_zones=max_untagged_zones, max_untagged_lines=max_untagged_lines)[1]:
+            max_untagged_zones=max_untagged_zones, max_untagged_lines=max_untagged_lines, engine=engine,
+            cache=None if no_cache else ResultCache(cache_dir, max_size=cache_max_size * 1024 * 1024),
+            image_resolver=ImageResolver.from_manifest(image_manifest) if image_manifest else None,
+            check_image_size=check_image_size, huge_tree=huge_tree, checks=checks, max_errors=max_errors
+        )
+        sys.exit(1 if watcher.failing else 0)
+    sources = itertools.chain(files, read_file_list(files_from)) if files_from is not None else files
+    inputs = iter_paths(sources)
+    if changed_since:
+        from htrvx.git import changed_files, GitError
+        try:
+            changed = changed_files(changed_since)
+        except GitError as E:
+            raise click.UsageError(f"--changed-since failed: {E}")
+        if files or files_from is not None:
+            try:
+                selected = {os.path.realpath(file) for file in inputs}
+            except MissingInput as E:
+                raise click.BadParameter(str(E), param_hint="FILES")
+            changed = [file for file in changed if os.path.realpath(file) in selected]
+        inputs = [os.path.relpath(file) for file in changed]
+    estimate = None
+    if sample is not None:
+        from htrvx.sampling import draw_sample, SampleEstimate
+        # Every path is needed before drawing: this reads the file tree, not the files
+        try:
+            drawn = draw_sample(inputs, sample, seed=seed)
+        except MissingInput as E:
+            raise click.BadParameter(str(E), param_hint="FILES")
+        inputs = drawn.files
+        estimate = SampleEstimate(drawn)
+    cache = None
+    if not no_cache:
+        cache = ResultCache(cache_dir, max_size=cache_max_size * 1024 * 1024)
+        if clear_cache:
+            cache.clear()
+    report_writer = Reports[report](output) if report else None
+    timing_report = TimingReport(slowest=slowest) if timings else None
+    image_resolver = ImageResolver.from_manifest(image_manifest) if image_manifest else None
+    # Keep the report alone on the standard output when it is written there
+    err = report_writer is not None
+    try:
+        status = test(
+            inputs, verbose=verbose, group=group, format=format, segmonto=segmonto,
+            xsd=xsd, raise_empty=raise_empty, check_empty=check_empty, check_image=check_image,
+            verbose_level=verbose_level, zones=zone, lines=line, allow_untagged=allow_untagged,
+            max_untagged_zones=max_untagged_zones, max_untagged_lines=max_untagged_lines, jobs=jobs, engine=engine,
+            cache=cache, report=report_writer, keep_logs=report_writer is None, timing_report=timing_report,
+            image_resolver=image_resolver, check_image_size=check_image_size, huge_tree=huge_tree,
+            fail_fast=fail_fast, max_failures=max_failures, checks=checks, estimate=estimate,
+            max_errors=max_errors, err=err
+        )[1]
+    except MissingInput as E:
+        raise click.BadParameter(str(E), param_hint="FILES")
+    finally:
+        if report_writer is not None:
+            report_writer.close()
+    if timing_report is not None:
+        timing_report.print(err=err)
+    if estimate is not None:
+        estimate.print(err=err)
+    if status:
         sys.exit(0)
     else:
         sys.exit(1)
 
 
+@main.command("checks")
+def list_checks():
+    """ List the checks provided by plugins, to use with `htrvx check --check NAME` """
+    for name, check in sorted(available_checks().items()):
+        description = (check.__doc__ or "").strip().split("\n")[0]
+        click.echo(f"{name}: {description} (elements: {', '.join(sorted(check.tags))})")
+
+
+def _daemon_options(command):
+    """ Options locating the daemon, shared by `htrvx serve` and `htrvx client` """
+    command = click.option("--socket", "socket_path", default=None, type=click.Path(dir_okay=False),
+                           help="Unix socket of the daemon, instead of --host and --port")(command)
+    command = click.option("--port", default=DefaultPort, type=click.IntRange(0, 65535), show_default=True,
+                           help="Port of the daemon")(command)
+    return click.option("--host", default=DefaultHost, show_default=True, help="Interface of the daemon")(command)
+
+
+@main.command("serve")
+@_daemon_options
+@click.option("--profiles", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="JSON file mapping profile names to options of htrvx.testing.test(), eg. "
+                   "{\"segmonto\": {\"segmonto\": true, \"xsd\": true}}")
+@click.option("--no-cache", is_flag=True, default=False,
+              help="Do not reuse nor save results of previous runs for unchanged files")
+@click.option("--cache-dir", default=None, type=click.Path(file_okay=False),
+              help="Directory of the result cache [default: $HTRVX_CACHE_DIR or ~/.cache/htrvx]")
+@click.option("--cache-max-size", default=512, type=click.IntRange(min=0), show_default=True,
+              help="Maximum size of the result cache in MB")
+def serve(socket_path: Optional[str] = None, host: str = DefaultHost, port: int = DefaultPort,
+          profiles: Optional[str] = None, no_cache: bool = False, cache_dir: Optional[str] = None,
+          cache_max_size: int = 512):
+    """ Start a daemon answering validation requests of `htrvx client` until Ctrl+C. Schemas and vocabularies
+    stay loaded between requests, which then cost their checks only.
+
+    Requests by path read any file the daemon can read: the daemon listens on localhost by default.
+    """
+    from htrvx.server import Validation, BadRequest, serve as serve_validation
+    cache = None if no_cache else ResultCache(cache_dir, max_size=cache_max_size * 1024 * 1024)
+    try:
+        validation = Validation.from_file(profiles, cache=cache) if profiles else Validation(cache=cache)
+    except (BadRequest, ValueError) as E:
+        raise click.BadParameter(str(E), param_hint="--profiles")
+    click.echo(f"Listening on {socket_path or f'{host}:{port}'} with profile(s) "
+               f"{', '.join(sorted(validation.profiles))}", err=True)
+    try:
+        serve_validation(validation, socket_path=socket_path, host=host, port=port)
+    except OSError as E:
+        raise click.ClickException(f"Can't listen on {socket_path or f'{host}:{port}'}: {E}")
+
+
+@main.command("client")
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@_daemon_options
+@click.option("--profile", default=None, help="Profile of the daemon to use [default: default]")
+@click.option("--payload", is_flag=True, default=False,
+              help="Send the content of FILES rather than their path, eg. when the daemon runs on another "
+                   "filesystem")
+def client(files: Sequence[str], socket_path: Optional[str] = None, host: str = DefaultHost,
+           port: int = DefaultPort, profile: Optional[str] = None, payload: bool = False):
+    """ Test FILES with the daemon started by `htrvx serve` and print one JSON result per file. Exits with 1 if a
+    file is not valid.
+    """
+    daemon = Client(socket_path=socket_path, host=host, port=port)
+    valid = True
+    for file in files:
+        try:
+            if payload:
+                with open(file, encoding="utf-8") as f:
+                    result = daemon.validate(xml=f.read(), name=file, profile=profile)
+            else:
+                result = daemon.validate(path=os.path.abspath(file), name=file, profile=profile)
+        except ClientError as E:
+            raise click.ClickException(str(E))
+        valid = valid and result["status"]
+        click.echo(json.dumps(result))
+    sys.exit(0 if valid else 1)
+
+
+@main.group("schemas")
+@click.option("--store", default=None, type=click.Path(file_okay=False),
+              help="Directory of the schema store [default: $HTRVX_SCHEMA_DIR or ~/.local/share/htrvx/schemas]")
+@click.pass_context
+def schemas(ctx, store: Optional[str] = None):
+    """ Manage the schema store, where schemas declared by files are saved with the schemas they import or include.
+    Once filled, validation does not need the network: set HTRVX_OFFLINE=1 to forbid any download.
+    """
+    ctx.obj = SchemaStore(store) if store else schema_store
+
+
+@schemas.command("sync")
+@click.option("--refresh", is_flag=True, default=False,
+              help="Download schemas again, even if they are shipped with HTRVX or already stored")
+@click.pass_obj
+def schemas_sync(store: SchemaStore, refresh: bool = False):
+    """ Store the known ALTO and PAGE schemas and their dependencies """
+    for url in store.sync(refresh=refresh):
+        click.echo(f"Stored {url}")
+
+
+@schemas.command("add")
+@click.argument("url")
+@click.option("--from", "source", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Local copy of the schema at URL, eg. on a machine without network")
+@click.option("--refresh", is_flag=True, default=False, help="Download schemas again, even if already stored")
+@click.pass_obj
+def schemas_add(store: SchemaStore, url: str, source: Optional[str] = None, refresh: bool = False):
+    """ Store the schema at URL and its dependencies """
+    for stored in store.add(url, source=source, refresh=refresh):
+        click.echo(f"Stored {stored}")
+
+
+@schemas.command("list")
+@click.pass_obj
+def schemas_list(store: SchemaStore):
+    """ List stored schemas with the start of their SHA-256 """
+    for entry in sorted(store.entries().values(), key=lambda entry: entry["url"]):
+        click.echo(f"{entry['sha256'][:12]} {entry['url']}")
+
+
+@schemas.command("verify")
+@click.pass_obj
+def schemas_verify(store: SchemaStore):
+    """ Check the integrity of stored schemas and that their dependencies are available """
+    problems = store.verify()
+    for problem in problems:
+        click.echo(click.style(problem, fg="red"), err=True)
+    if problems:
+        sys.exit(1)
+    click.echo(f"{len(store.entries())} schema(s) verified")
+
+
 if __name__ == "__main__":
-    cmd()
+    main()
@@ -0,0 +1,83 @@
+""" Client of the validation daemon started by `htrvx serve`, see htrvx.server. It only depends on the standard
+library, so that each call costs a request rather than the imports and schema compilation of a full run.
+"""
+import json
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from http.client import HTTPConnection
+
+DefaultHost = "127.0.0.1"
+DefaultPort = 8765
+
+
+class ClientError(ValueError):
+    """Error raised when the daemon can't be reached or rejects a request"""
+
+
+class Client:
+    """ Sends validation requests to a daemon listening on socket_path or, without it, on host and port
+
+    :param timeout: Seconds to wait for each response, None waits as long as the checks take
+    """
+    def __init__(self, socket_path: Optional[str] = None, host: str = DefaultHost, port: int = DefaultPort,
+                 timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _connection(self) -> "HTTPConnection":
+        # Imported on use, as the modules of the CLI import this one for its defaults
+        from http.client import HTTPConnection
+        if not self.socket_path:
+            return HTTPConnection(self.host, self.port, timeout=self.timeout)
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        connection = HTTPConnection("localhost", timeout=self.timeout)
+        # Requests are sent on the socket already set rather than on a new TCP connection
+        connection.sock = sock
+        return connection
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        from http.client import HTTPException
+        connection = None
+        try:
+            connection = self._connection()
+            body = json.dumps(payload).encode() if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, HTTPException, ValueError) as E:
+            raise ClientError(f"No answer from the daemon at {self.socket_path or f'{self.host}:{self.port}'}: {E}")
+        finally:
+            if connection is not None:
+                connection.close()
+        if response.status != 200:
+            raise ClientError(data.get("error") or f"HTTP error {response.status}")
+        return data
+
+    def health(self) -> Dict[str, Any]:
+        """ Returns the status of the daemon and the names of its profiles """
+        return self._request("GET", "/health")
+
+    def validate(self, path: Optional[str] = None, xml: Optional[str] = None, name: Optional[str] = None,
+                 profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """ Tests the file at path, as seen by the daemon, or the XML document xml
+
+        :param name: Name of the result, by default path
+        :param profile: Options of the daemon to use, `default` by default
+        :param options: Options overriding those of the profile, see htrvx.testing.test()
+        :returns: The name of the file, its global status and its FileLog as a dictionary (tests and timings)
+        """
+        payload: Dict[str, Any] = {"path": path} if path is not None else {"xml": xml}
+        for key, value in (("name", name), ("profile", profile), ("options", options)):
+            if value is not None:
+                payload[key] = value
+        return self._request("POST", "/validate", payload)
@@ -0,0 +1,185 @@
+""" Errors found by the checks, kept as compact records and only formatted into messages when they are printed or
+exported. A file with thousands of faulty lines costs a few references per error, or none past the limit of its
+check.
+"""
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+from htrvx.schemas import simplify_message
+
+# Limit of the number of errors kept by each check: a single one for every check, or one per check name, where `*`
+#   sets the limit of the checks not listed
+ErrorLimits = Union[int, Dict[str, int]]
+
+
+class ErrorRecord(NamedTuple):
+    """ Error found by a check
+
+    :param kind: `typing` for an element whose type is missing or forbidden, `empty` for an element without text,
+        `schema` for an error of the XSD validation, `message` for an error already written as a message (eg. by a
+        plugin)
+    :param element: `zone` or `line`, for typing and emptiness
+    :param id: ID of the element
+    :param category: Type of the element for typing, message of the validator for the schema, the message itself
+        for `message`
+    :param line: Line of the source where the element starts, or of the schema error
+    """
+    kind: str
+    element: Optional[str] = None
+    id: Optional[str] = None
+    category: Optional[str] = None
+    line: Optional[int] = None
+
+
+def error_limit(limits: Optional[ErrorLimits], check: str) -> Optional[int]:
+    """ Returns the maximum number of errors kept for check, None if they all are """
+    if limits is None or isinstance(limits, int):
+        return limits
+    return limits.get(check, limits.get("*"))
+
+
+def _empty_or_wrong(category: Optional[str]) -> str:
+    if category is None:
+        return "is not categorized"
+    return f"has a forbidden type (`{category}`)"
+
+
+def _format(record: ErrorRecord) -> str:
+    location = f" (line {record.line})" if record.line is not None else ""
+    if record.kind == "typing":
+        return f"{record.element.capitalize()} with id #{record.id} {_empty_or_wrong(record.category)}{location}"
+    if record.kind == "empty":
+        return f"{'Region' if record.element == 'zone' else 'Line'} with id #{record.id} is empty{location}"
+    if record.kind == "schema":
+        return f"Line {record.line:04d}: {simplify_message(record.category)}"
+    return record.category
+
+
+def _group_key(record: ErrorRecord) -> Optional[str]:
+    """ Returns the key under which record is grouped with the errors of its log """
+    if record.kind == "typing":
+        return f"`{record.category}`" if record.category is not None else "Missing"
+    if record.kind == "schema":
+        return simplify_message(record.category)
+    return record.category
+
+
+def _group_member(record: ErrorRecord) -> str:
+    return str(record.line) if record.kind == "schema" else f"#{record.id}"
+
+
+def _format_group(kind: str, element: Optional[str], key: Optional[str], members: List[str], count: int) -> str:
+    if len(members) < count:
+        members = [*members, f"+{count - len(members)} more"]
+    listed = ", ".join(members)
+    if kind == "typing":
+        return f"{key} tag for {element}(s) is forbidden ({count} annotations): {listed}"
+    if kind == "empty":
+        return f"{'Zones' if element == 'zone' else 'Lines'} with missing IDs: {listed}"
+    if kind == "schema":
+        return f"{key} on line(s): {listed}"
+    return key if count == 1 else f"{key} ({count} times)"
+
+
+class ErrorLog(Sequence[str]):
+    """ Errors of one kind found by a check, stored as records and formatted on access: iterating over it yields
+    the messages that are printed and exported
+
+    Records are stored by column, the kind and the element being shared by the whole log, so that each error only
+    costs three references.
+
+    :param kind: Kind of the errors, see ErrorRecord
+    :param element: `zone` or `line`, for typing and emptiness
+    :param group: Format the errors of the same category as a single message listing their elements
+    :param limit: Maximum number of errors kept, the others are only counted and summarized as `+N more`. None
+        keeps them all.
+    """
+    __slots__ = ("kind", "element", "group", "limit", "omitted", "_ids", "_categories", "_lines", "_omitted_groups")
+
+    def __init__(self, kind: str, element: Optional[str] = None, group: bool = False, limit: Optional[int] = None):
+        self.kind = kind
+        self.element = element
+        self.group = group
+        self.limit = limit
+        self.omitted = 0
+        self._ids: List[Optional[str]] = []
+        self._categories: List[Optional[str]] = []
+        self._lines: List[Optional[int]] = []
+        # Number of errors left out by group, so that grouped messages still count every error
+        self._omitted_groups: Counter = Counter()
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[str], limit: Optional[int] = None) -> "ErrorLog":
+        """ Builds the log of errors already written as messages """
+        log = cls("message", limit=limit)
+        for message in messages:
+            log.add(category=message)
+        return log
+
+    def add(self, id: Optional[str] = None, category: Optional[str] = None, line: Optional[int] = None) -> None:
+        if self.limit is None or len(self._ids) < self.limit:
+            self._ids.append(id)
+            self._categories.append(category)
+            self._lines.append(line)
+        else:
+            self.omitted += 1
+            if self.group:
+                self._omitted_groups[_group_key(ErrorRecord(self.kind, self.element, id, category, line))] += 1
+
+    @property
+    def records(self) -> List[ErrorRecord]:
+        """ Returns the errors kept """
+        return [
+            ErrorRecord(self.kind, self.element, id, category, line)
+            for id, category, line in zip(self._ids, self._categories, self._lines)
+        ]
+
+    @property
+    def total(self) -> int:
+        """ Returns the number of errors found, kept or not """
+        return len(self._ids) + self.omitted
+
+    def _iter_grouped(self) -> Iterator[str]:
+        members: Dict[Optional[str], List[str]] = defaultdict(list)
+        for record in self.records:
+            members[_group_key(record)].append(_group_member(record))
+        for key in self._omitted_groups:
+            members.setdefault(key, [])
+        keys = list(members)
+        # Types are listed in alphabetical order, schema errors in the order of the document
+        if self.kind == "typing":
+            keys.sort()
+        for key in keys:
+            yield _format_group(self.kind, self.element, key, members[key],
+                                len(members[key]) + self._omitted_groups[key])
+
+    def __iter__(self) -> Iterator[str]:
+        if self.group:
+            yield from self._iter_grouped()
+            return
+        for record in self.records:
+            yield _format(record)
+        if self.omitted:
+            yield f"+{self.omitted} more"
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        return list(self)[index]
+
+    def __len__(self) -> int:
+        """ Returns the number of messages, see total for the number of errors """
+        if self.group:
+            return sum(1 for _ in self._iter_grouped())
+        return len(self._ids) + int(bool(self.omitted))
+
+    def __bool__(self) -> bool:
+        return self.total > 0
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (ErrorLog, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ErrorLog({list(self)!r})"
@@ -0,0 +1,62 @@
+""" Selection of the files changed in a git repository, for incremental validation """
+import os
+import subprocess
+from typing import List, Optional, Set
+
+ImageExtensions = frozenset([".jpg", ".jpeg", ".png", ".tif", ".tiff", ".jp2", ".gif", ".webp"])
+
+
+class GitError(ValueError):
+    """Error raised when git fails, eg. outside a repository or with an unknown reference"""
+
+
+def _git(*args: str, cwd: Optional[str] = None, allow_no_match: bool = False, input: Optional[str] = None) -> List[str]:
+    """ Runs git and returns its NUL-separated output
+
+    :param allow_no_match: Treat exit code 1 (eg. nothing found by git grep) as an empty output
+    :param input: Text written to the standard input of git
+    """
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True,
+                                input=input.encode() if input is not None else None)
+    except FileNotFoundError as E:
+        raise GitError("git is not installed") from E
+    if result.returncode == 1 and allow_no_match:
+        return []
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode(errors="replace").strip())
+    return [path for path in result.stdout.decode().split("\0") if path]
+
+
+def changed_files(ref: str, cwd: Optional[str] = None, extension: str = ".xml") -> List[str]:
+    """ Returns the files with the given extension that were added or modified since ref (including uncommitted and
+    untracked ones), as well as the ones mentioning an image that was added, modified or deleted since ref.
+
+    Images are matched by file name with `git grep`: a few files linking to an image with the same name in another
+    directory may be tested too, which is harmless.
+
+    :param ref: Any git revision, eg. `origin/main` or `HEAD~3`
+    :param cwd: Directory inside the repository, defaults to the current one
+    :returns: Absolute paths, sorted
+    """
+    top = _git("rev-parse", "--show-toplevel", cwd=cwd)[0].strip()
+    changed: Set[str] = set(_git("diff", "--name-only", "-z", "--diff-filter=ACMR", ref, cwd=top))
+    changed.update(_git("ls-files", "--others", "--exclude-standard", "-z", cwd=top))
+    files = {path for path in changed if path.lower().endswith(extension)}
+
+    images = {
+        os.path.basename(path)
+        for path in changed.union(_git("diff", "--name-only", "-z", "--diff-filter=D", ref, cwd=top))
+        if os.path.splitext(path)[1].lower() in ImageExtensions
+    }
+    if images:
+        # Patterns are read from the standard input: thousands of images would not fit in the arguments of git
+        files.update(_git(
+            "grep", "-l", "-z", "-F", "--untracked", "-f", "-", "--", f":(icase)*{extension}",
+            cwd=top, allow_no_match=True, input="".join(f"{image}\n" for image in sorted(images) if "\n" not in image)
+        ))
+
+    return sorted(
+        path for path in (os.path.join(top, path) for path in files)
+        if os.path.exists(path)
+    )
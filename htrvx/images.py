@@ -0,0 +1,218 @@
+""" Lookup of the images linked by XML files, batched by directory, and reading of their size from their header """
+import hashlib
+import os
+import struct
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+from htrvx.archives import open_archive, open_file, split_member, MemberSeparator
+from htrvx.inputs import read_file_list
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def _normalize(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path))
+
+
+class ImageResolver:
+    """ Tells whether image files exist by listing each directory once and keeping its listing, rather than
+    asking the filesystem about every image. Listings are kept for the life of the resolver: use one per run.
+
+    With a manifest, images are looked up in it instead of the filesystem. Images inside archives
+    (`archive.zip!image.jpg`, see htrvx.archives) are looked up in the listing of their archive.
+
+    Names are compared with the listing as they are written: a link whose case differs from the name of its image
+    is missing, even on case-insensitive filesystems (Windows, macOS) where the image can be opened.
+
+    :param manifest: Paths of every available image, eg. the listing of an object store
+    :param threads: Number of threads listing directories given to prefetch()
+    """
+    def __init__(self, manifest: Optional[Iterable[str]] = None, threads: int = 8):
+        self.manifest: Optional[FrozenSet[str]] = frozenset(
+            _normalize(path) for path in manifest
+        ) if manifest is not None else None
+        self.threads = threads
+        self._listings: Dict[str, "Future"] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional["ThreadPoolExecutor"] = None
+
+    @classmethod
+    def from_manifest(cls, path: str, **kwargs) -> "ImageResolver":
+        """ Reads a manifest with one path per line or NUL-separated paths. Relative paths are relative to the
+        directory of the manifest.
+        """
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path) as f:
+            return cls([os.path.join(base, entry) for entry in read_file_list(f)], **kwargs)
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """ Hash of the manifest, None when images are looked up on the filesystem """
+        if self.manifest is None:
+            return None
+        return hashlib.sha256("\0".join(sorted(self.manifest)).encode()).hexdigest()
+
+    def _listing(self, directory: str) -> Optional[FrozenSet[str]]:
+        """ Returns the names in directory, listed by the first caller only. None when the directory exists but
+        can't be listed.
+        """
+        # Imported on use, like the pool of prefetch(): only runs checking images need them
+        from concurrent.futures import Future
+        with self._lock:
+            future = self._listings.get(directory)
+            owner = future is None
+            if owner:
+                future = self._listings[directory] = Future()
+        if owner:
+            try:
+                names = frozenset(os.listdir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                names = frozenset()
+            except OSError:
+                names = None
+            future.set_result(names)
+        return future.result()
+
+    def prefetch(self, directories: Iterable[str]) -> None:
+        """ Lists directories in the background, on a pool of threads """
+        if self.manifest is not None:
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="htrvx-images")
+            pending = {
+                _normalize(directory) for directory in directories if MemberSeparator not in directory
+            } - set(self._listings)
+        for directory in pending:
+            self._pool.submit(self._listing, directory)
+
+    def exists(self, path: str) -> bool:
+        member = split_member(path) if MemberSeparator in path else None
+        if member is not None:
+            return open_archive(member[0]).exists(member[1])
+        path = _normalize(path)
+        if self.manifest is not None:
+            return path in self.manifest
+        directory, name = os.path.split(path)
+        names = self._listing(directory)
+        if names is None:
+            return os.path.exists(path)
+        return name in names
+
+    def prefetching(self, files: Iterable[Any], ahead: int = 64) -> Iterator[Any]:
+        """ Yields files, the directories of the next `ahead` file paths being listed in the background while the
+        current ones are tested: linked images are usually next to their XML file.
+        """
+        upcoming = deque()
+        for file in files:
+            if isinstance(file, str):
+                self.prefetch([os.path.dirname(file)])
+            upcoming.append(file)
+            if len(upcoming) > ahead:
+                yield upcoming.popleft()
+        yield from upcoming
+
+    def clear(self) -> None:
+        """ Forgets the directory listings, eg. after images were added """
+        with self._lock:
+            self._listings.clear()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def __getstate__(self):
+        # Listings, locks and threads stay in their process
+        return {"manifest": self.manifest, "threads": self.threads}
+
+    def __setstate__(self, state):
+        self.__init__(threads=state["threads"])
+        self.manifest = state["manifest"]
+
+
+# JPEG start of frame markers, which hold the size of the image (not DHT, JPG and DAC)
+_JpegSOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers without a length
+_JpegStandalone = frozenset([0x01, *range(0xD0, 0xDA)])
+
+
+def _png_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    header = f.read(24)
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def _jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":  # Fill bytes
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in _JpegStandalone:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        if marker in _JpegSOF:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(struct.unpack(">H", length)[0] - 2, os.SEEK_CUR)
+
+
+def _tiff_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    header = f.read(8)
+    order = "<" if header[:2] == b"II" else ">"
+    if len(header) < 8 or struct.unpack(f"{order}H", header[2:4])[0] != 42:  # Not BigTIFF
+        return None
+    f.seek(struct.unpack(f"{order}I", header[4:8])[0])
+    count = f.read(2)
+    if len(count) < 2:
+        return None
+    size = {}
+    for _ in range(struct.unpack(f"{order}H", count)[0]):
+        entry = f.read(12)
+        if len(entry) < 12:
+            return None
+        tag, kind = struct.unpack(f"{order}HH", entry[:4])
+        if tag in (256, 257):  # ImageWidth, ImageLength, as SHORT or LONG
+            size[tag] = struct.unpack(f"{order}H", entry[8:10])[0] if kind == 3 else \
+                struct.unpack(f"{order}I", entry[8:12])[0]
+            if len(size) == 2:
+                return size[256], size[257]
+    return None
+
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    """ Returns the width and height of the PNG, JPEG or TIFF image at path, read from its header only: pixels are
+    never decoded and only a few hundred bytes are read for most files. path can be inside an archive.
+
+    :returns: None if the format is not supported or if the header is not readable
+    :raises OSError: If the file can't be opened
+    """
+    with open_file(path) as f:
+        signature = f.read(4)
+        f.seek(0)
+        try:
+            if signature == b"\x89PNG":
+                return _png_size(f)
+            elif signature[:2] == b"\xff\xd8":
+                return _jpeg_size(f)
+            elif signature in (b"II*\x00", b"MM\x00*"):
+                return _tiff_size(f)
+        except (struct.error, OSError, ValueError):
+            return None
+    return None
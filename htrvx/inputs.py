@@ -0,0 +1,102 @@
+""" Lazy enumeration of the files to test from directories, archives, glob patterns and lists of files """
+import glob
+import os
+import re
+from typing import IO, Iterable, Iterator
+
+from htrvx.archives import is_archive, iter_members, split_member, open_archive, MemberSeparator
+
+_GlobMagic = re.compile(r"[*?[]")
+
+
+class MissingInput(ValueError):
+    """Error raised when a path given as input neither exists nor matches as a pattern"""
+
+
+def walk(directory: str, extension: str = ".xml") -> Iterator[str]:
+    """ Yields the files with the given extension under directory, recursively, with os.scandir().
+
+    Entries are sorted directory by directory so that the order is stable. Symbolic links to directories are not
+    followed, which avoids cycles.
+    """
+    extension = extension.lower()
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except (PermissionError, NotADirectoryError):
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(extension) and entry.is_file():
+                yield entry.path
+        # Reversed so that the first subdirectory is popped first
+        stack.extend(reversed(subdirectories))
+
+
+def _archive_members(path: str, extension: str) -> Iterator[str]:
+    try:
+        members = list(iter_members(path, extension=extension))
+    except ValueError as E:
+        raise MissingInput(str(E))
+    yield from members
+
+
+def iter_paths(sources: Iterable[str], extension: str = ".xml") -> Iterator[str]:
+    """ Yields the files designated by sources, as they are found
+
+    :param sources: Files, directories (searched recursively for files with extension), zip or tar archives (whose
+        files with extension are named `archive.zip!path/in/archive.xml`, see htrvx.archives), files inside
+        archives or glob patterns, where `**` matches any number of directories (eg. `data/**/*.xml`). Archives
+        found in directories are not opened.
+    :raises MissingInput: When a source does not exist, once the files of the previous ones were yielded
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            yield from walk(source, extension=extension)
+        elif is_archive(source):
+            yield from _archive_members(source, extension)
+        elif os.path.exists(source):
+            yield source
+        elif MemberSeparator in source and split_member(source):
+            archive, member = split_member(source)
+            try:
+                found = open_archive(archive).exists(member)
+            except ValueError as E:
+                raise MissingInput(str(E))
+            if not found:
+                raise MissingInput(f"No file `{member}` in archive `{archive}`")
+            yield source
+        elif _GlobMagic.search(source):
+            for path in glob.iglob(source, recursive=True):
+                if is_archive(path):
+                    yield from _archive_members(path, extension)
+                elif os.path.isfile(path):
+                    yield path
+        else:
+            raise MissingInput(f"Path `{source}` does not exist")
+
+
+def read_file_list(stream: IO[str], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """ Yields the paths listed in stream, one per line or separated by NUL characters (eg. `find -print0`)
+
+    The separator is NUL if one is found in the first chunk read. Empty entries are skipped.
+    """
+    buffer = stream.read(chunk_size)
+    separator = "\0" if "\0" in buffer else "\n"
+    while buffer:
+        chunk = stream.read(chunk_size)
+        *paths, rest = buffer.split(separator)
+        if not chunk:
+            paths.append(rest)
+            rest = ""
+        for path in paths:
+            if separator == "\n":
+                path = path.rstrip("\r")
+            if path:
+                yield path
+        buffer = rest + chunk
@@ -0,0 +1,39 @@
+""" Shared XML parsers: every file is parsed once, by a parser reused for every file of the same thread """
+import threading
+from typing import IO, Dict, Tuple, Union
+
+from lxml import etree
+
+_local = threading.local()
+
+
+def get_parser(
+    remove_blank_text: bool = True,
+    remove_comments: bool = True,
+    remove_pis: bool = True,
+    huge_tree: bool = False
+) -> etree.XMLParser:
+    """ Returns the parser of the current thread for these options, created on first use.
+
+    Blank text between elements, comments and processing instructions are not used by any check: dropping them
+    saves memory and time. They are still read, and so are checked for well-formedness.
+
+    :param huge_tree: Lift libxml2's limits on the depth of trees and the size of text nodes, for very large files
+        only: these limits protect against malicious documents
+    """
+    parsers: Dict[Tuple[bool, ...], etree.XMLParser] = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    key = (remove_blank_text, remove_comments, remove_pis, huge_tree)
+    parser = parsers.get(key)
+    if parser is None:
+        parser = parsers[key] = etree.XMLParser(
+            remove_blank_text=remove_blank_text, remove_comments=remove_comments, remove_pis=remove_pis,
+            huge_tree=huge_tree
+        )
+    return parser
+
+
+def parse(source: Union[str, IO], **options) -> etree._ElementTree:
+    """ Parses source with the shared parser of the current thread, see get_parser() for options """
+    return etree.parse(source, parser=get_parser(**options))
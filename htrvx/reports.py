@@ -0,0 +1,89 @@
+""" Machine-readable reports, written file by file as soon as each file is tested """
+import json
+from typing import IO, Dict, Type, TYPE_CHECKING
+
+from lxml import etree
+
+if TYPE_CHECKING:
+    from htrvx.testing import FileLog
+
+
+class Report:
+    """ Writes the result of each file to stream as soon as it is added
+
+    Reports are context managers, closing them finishes the document without closing the stream.
+    """
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def add(self, name: str, filelog: "FileLog") -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.stream.flush()
+
+    def __enter__(self) -> "Report":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JsonLinesReport(Report):
+    """ One JSON object per file, eg.
+
+    `{"file": "a.xml", "status": false, "passed": 1, "total": 2, "tests": [{"status": "failure", ...}, ...]}`
+
+    Timed runs add the seconds spent per phase under "timings".
+    """
+    def add(self, name: str, filelog: "FileLog") -> None:
+        passed, total = filelog.score
+        record = {
+            "file": name,
+            "status": passed == total,
+            "passed": passed,
+            "total": total,
+            "tests": filelog.to_dict()["tests"] or []
+        }
+        if filelog.timings is not None:
+            record["timings"] = filelog.timings
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+class JUnitReport(Report):
+    """ JUnit XML with one testsuite per file and one testcase per test. Warnings are reported in system-out. """
+    def __init__(self, stream: IO[str]):
+        super(JUnitReport, self).__init__(stream)
+        self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="htrvx">\n')
+
+    def add(self, name: str, filelog: "FileLog") -> None:
+        passed, total = filelog.score
+        suite = etree.Element("testsuite", name=name, tests=str(total), failures=str(total - passed), errors="0")
+        if filelog.timings is not None:
+            suite.set("time", f"{filelog.duration:.6f}")
+        for status in filelog:
+            case = etree.SubElement(
+                suite, "testcase", classname=name,
+                name=status.task if not status.level else f"{status.task}[{status.level}]"
+            )
+            if status.duration is not None:
+                case.set("time", f"{status.duration:.6f}")
+            details = "\n".join(status.errors or [])
+            if status.status == "failure":
+                failure = etree.SubElement(case, "failure", message=status.message or "failed", type=status.task)
+                failure.text = details
+            elif status.status == "warning":
+                etree.SubElement(case, "system-out").text = "\n".join(filter(None, [status.message, details]))
+        self.stream.write(etree.tostring(suite, encoding="unicode", pretty_print=True))
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.write("</testsuites>\n")
+        super(JUnitReport, self).close()
+
+
+Reports: Dict[str, Type[Report]] = {
+    "jsonl": JsonLinesReport,
+    "junit": JUnitReport
+}
@@ -0,0 +1,170 @@
+""" Random samples of a corpus, stratified by directory, and estimates of the failure rate of each check over the
+whole corpus from the results of its sample
+"""
+import math
+import os
+import random
+from collections import defaultdict
+from functools import partial
+from statistics import NormalDist
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union, TYPE_CHECKING
+
+import click
+
+if TYPE_CHECKING:
+    from htrvx.testing import FileLog
+
+# Task under which the failure rate of whole files is reported
+AnyCheck = "any"
+
+
+class InvalidSampleSize(ValueError):
+    """Error raised when a sample size is neither a number of files nor a percentage"""
+
+
+def parse_sample_size(value: str) -> Union[int, float]:
+    """ Parses `N`, a number of files, or `P%`, a share of the files
+
+    :returns: A number of files as an int, or a share of the files between 0 and 1 as a float
+    """
+    value = value.strip()
+    try:
+        if value.endswith("%"):
+            share = float(value[:-1]) / 100
+            if 0 < share <= 1:
+                return share
+        elif int(value) > 0:
+            return int(value)
+    except ValueError:
+        pass
+    raise InvalidSampleSize(f"`{value}` is neither a positive number of files nor a percentage in ]0%, 100%]")
+
+
+def stratum(path: str) -> str:
+    """ Returns the stratum of path, its directory """
+    return os.path.dirname(os.path.normpath(path))
+
+
+class Sample(NamedTuple):
+    files: List[str]
+    # Number of files of the corpus in each stratum
+    strata: Dict[str, int]
+    seed: int
+
+    @property
+    def population(self) -> int:
+        return sum(self.strata.values())
+
+
+def draw_sample(paths: Iterable[str], size: Union[int, float], seed: Optional[int] = None) -> Sample:
+    """ Draws a sample of paths where each directory gets a number of files proportional to its own number of files.
+    The sample only depends on the set of paths, the size and the seed: not on the order of paths.
+
+    :param size: Number of files, or share of the files as a float, see parse_sample_size(). At least one file is
+        drawn from a non-empty corpus.
+    :param seed: Seed of the draw, a random one is picked (and returned with the sample) when not given
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    strata: Dict[str, List[str]] = defaultdict(list)
+    for path in paths:
+        strata[stratum(path)].append(path)
+    population = sum(len(members) for members in strata.values())
+    if isinstance(size, float):
+        size = max(1, round(population * size)) if population else 0
+    size = min(size, population)
+
+    # Largest remainder method: each directory gets the integer part of its share, then the files left go to the
+    #   directories with the largest fractional parts
+    quotas = {name: size * len(members) / population for name, members in strata.items()}
+    allocation = {name: int(quota) for name, quota in quotas.items()}
+    left = size - sum(allocation.values())
+    for name in sorted(quotas, key=lambda name: (allocation[name] - quotas[name], name))[:left]:
+        allocation[name] += 1
+
+    rng = random.Random(seed)
+    files = []
+    for name in sorted(strata):
+        files.extend(rng.sample(sorted(strata[name]), allocation[name]))
+    return Sample(sorted(files), {name: len(members) for name, members in strata.items()}, seed)
+
+
+def wilson_interval(rate: float, size: float, z: float) -> Tuple[float, float]:
+    """ Wilson score interval of a proportion, which stays within [0, 1] and is not empty for rates of 0 or 1 """
+    if size <= 0:
+        return 0.0, 1.0
+    denominator = 1 + z * z / size
+    centre = (rate + z * z / (2 * size)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / size + z * z / (4 * size * size)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+class Rate(NamedTuple):
+    task: str
+    failures: int
+    tested: int
+    # Estimated failure rate over the corpus, with the bounds of its confidence interval
+    rate: float
+    low: float
+    high: float
+
+
+class SampleEstimate:
+    """ Estimates the failure rate of each check over the corpus a sample was drawn from.
+
+    Files of each directory weigh the number of files of the directory they stand for. Intervals are Wilson score
+    intervals over the effective size of the weighted sample, narrowed by the finite population correction: they
+    are empty when the whole corpus was tested.
+
+    :param sample: Sample whose files are added
+    :param confidence: Confidence level of the intervals
+    """
+    def __init__(self, sample: Sample, confidence: float = 0.95):
+        self.sample = sample
+        self.confidence = confidence
+        # Failures and files tested, by task and stratum
+        self._counts: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+    def add(self, name: str, filelog: "FileLog") -> None:
+        tasks: Dict[str, bool] = {AnyCheck: not filelog.status}
+        for status in filelog.tests or []:
+            tasks[status.task] = tasks.get(status.task, False) or status.status == "failure"
+        for task, failed in tasks.items():
+            counts = self._counts[task][stratum(name)]
+            counts[0] += int(failed)
+            counts[1] += 1
+
+    def rate(self, task: str) -> Rate:
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        strata = self._counts.get(task, {})
+        failures = sum(counts[0] for counts in strata.values())
+        tested = sum(counts[1] for counts in strata.values())
+        if not tested:
+            return Rate(task, 0, 0, 0.0, 0.0, 1.0)
+        # Directories missing from the sample (eg. files not given to draw_sample()) weigh their own files
+        weights = {name: max(self.sample.strata.get(name, 0), counts[1]) for name, counts in strata.items()}
+        population = sum(weights.values())
+        rate = sum(weights[name] * counts[0] / counts[1] for name, counts in strata.items()) / population
+        # Kish's effective sample size, each file weighing weights[stratum] / files tested in the stratum
+        effective = population ** 2 / sum(weights[name] ** 2 / counts[1] for name, counts in strata.items())
+        correction = math.sqrt(max(0.0, (population - tested) / (population - 1))) if population > 1 else 0.0
+        low, high = wilson_interval(rate, effective, z * correction)
+        return Rate(task, failures, tested, rate, low, high)
+
+    def rates(self) -> List[Rate]:
+        """ Returns the estimated rate of failing files, then the rate of each check """
+        return [self.rate(AnyCheck)] + [self.rate(task) for task in sorted(self._counts) if task != AnyCheck]
+
+    def print(self, err: bool = False) -> None:
+        """ Prints the estimated failure rates
+
+        :param err: Print to the standard error instead of the standard output
+        """
+        echo = partial(click.echo, err=err)
+        echo("\n=====\nSAMPLE\n=====\n")
+        echo(f"{len(self.sample.files)} of {self.sample.population} file(s) sampled from {len(self.sample.strata)} "
+             f"director(y/ies) with --seed {self.sample.seed}")
+        echo(f"\n{'check':<20} {'failures':>12} {'rate':>7}   {self.confidence:.0%} interval")
+        for rate in self.rates():
+            echo(f"{rate.task:<20} {f'{rate.failures}/{rate.tested}':>12} {rate.rate:7.1%}   "
+                 f"[{rate.low:.1%}, {rate.high:.1%}]")
@@ -1,11 +1,12 @@
 import os
-import requests
-import hashlib
-from typing import Optional, Union
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Union, Dict, Tuple
 from lxml import etree
-import logging
 
-logger = logging.getLogger(__name__)
+from htrvx.parsing import parse
+from htrvx.schemas.store import SchemaStore, SchemaNotFound, is_url, is_offline, url_hash, schema_dependencies
 
 _here = os.path.dirname(__file__)
 
@@ -16,71 +17,215 @@ Schemas = {
 }
 
 
-class SchemaNotFound(ValueError):
-    """Error raised when a value is not found"""
+def _schema_path(URL: str) -> Optional[str]:
+    """ Returns the local file of the schema at URL: URL itself, or the copy shipped with HTRVX or stored in the
+    schema store
+    """
+    for path in (URL, Validator.cache_xsd_path(URL), schema_store.path(URL)):
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def schema_files(location: str) -> Tuple[str, ...]:
+    """ Returns the files validation against the schema at location (a schemaLocation or a known name) reads: the
+    schema and, transitively, the schemas it imports or includes. Schemas not found are listed where the schema
+    store would save them, so that results depending on them can be dropped once they are added. Listed once per
+    process and store, like compiled schemas.
+    """
+    return _schema_files(location, schema_store.directory)
+
+
+@lru_cache(maxsize=32)
+def _schema_files(location: str, store_directory: str) -> Tuple[str, ...]:
+    files, seen = [], set()
+    queue = [Schemas.get(location, location)]
+    while queue:
+        current = queue.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        path = _schema_path(current)
+        if path is None:
+            files.append(os.path.join(store_directory, url_hash(current)) if is_url(current) else current)
+            continue
+        files.append(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        try:
+            queue.extend(schema_dependencies(content, current))
+        except etree.XMLSyntaxError:
+            continue
+    return tuple(files)
+
+
+# Content of the schema documents resolved by CacheResolver, by URL, read once per process
+_schema_documents: Dict[str, bytes] = {}
+_schema_documents_lock = threading.Lock()
+
+
+def _schema_document(URL: str) -> Optional[bytes]:
+    """ Returns the content of the schema at URL, a local path or a URL whose schema is shipped with HTRVX or
+    stored in the schema store. Documents are read once and then kept in memory.
+    """
+    with _schema_documents_lock:
+        if URL in _schema_documents:
+            return _schema_documents[URL]
+    path = _schema_path(URL)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        content = f.read()
+    with _schema_documents_lock:
+        _schema_documents[URL] = content
+    return content
 
 
 class CacheResolver(etree.Resolver):
     cache = _here
 
     def resolve(self, URL, id, context):
-        # determine cache path
-        if os.path.exists(URL):
-            return self.resolve_file(open(URL), context, base_url=URL)
-        xsd_path = Validator.cache_xsd_path(URL)
-        if os.path.exists(xsd_path):
-            return self.resolve_file(open(xsd_path), context, base_url=URL)
-        raise requests.HTTPError(f"Unable to reach {URL} and not found in cache at {xsd_path}")
+        content = _schema_document(URL)
+        if content is not None:
+            return self.resolve_string(content, context, base_url=URL)
+        import requests
+        raise requests.HTTPError(f"Unable to reach {URL} and not found in cache at {Validator.cache_xsd_path(URL)}")
+
+
+def _compile_schema(xsd_path: str, base_url: Optional[str] = None) -> etree.XMLSchema:
+    """ Compiles the schema at xsd_path. base_url is the URL of a schema read from a local copy, against which its
+    relative imports and includes are resolved rather than against the directory of the copy.
+    """
+    parser = etree.XMLParser(no_network=True)
+    parser.resolvers.add(CacheResolver())
+    xmlschema_doc = etree.parse(xsd_path, parser=parser, base_url=base_url)
+    return etree.XMLSchema(xmlschema_doc)
+
+
+class SchemaCache:
+    """ Process-wide LRU cache of compiled XML Schemas, keyed by their resolved path or URL
+
+    Compiling a schema (and its imports) is costly: the cache makes sure a schema is compiled at most once per
+    process, as long as it is not evicted. Each compiled schema comes with a lock: its error log is overwritten by
+    every validation, so that threads sharing it validate one at a time (see Validator.validate()).
+
+    :param maxsize: Maximum number of compiled schemas to keep, least recently used ones are evicted first. A
+        negative value disables eviction.
+    """
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._schemas: "OrderedDict[str, Tuple[etree.XMLSchema, threading.Lock]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(xsd_path: str) -> str:
+        """ Resolves a schema path, URL or known name (eg. `alto`) to the key used in the cache """
+        resolved = Validator.get_schema(xsd_path)
+        if is_url(resolved):
+            return resolved
+        return os.path.realpath(resolved)
+
+    def get(self, xsd_path: str) -> etree.XMLSchema:
+        """ Returns the compiled schema for xsd_path, compiling it if it is not in the cache yet """
+        return self.entry(xsd_path)[0]
+
+    def entry(self, xsd_path: str) -> Tuple[etree.XMLSchema, threading.Lock]:
+        """ Returns the compiled schema for xsd_path with the lock held while it validates a document """
+        key = self.key(xsd_path)
+        with self._lock:
+            if key in self._schemas:
+                self.hits += 1
+                self._schemas.move_to_end(key)
+                return self._schemas[key]
+            self.misses += 1
+            # Key of a URL is its local copy, whose relative dependencies are relative to the URL
+            entry = self._schemas[key] = (
+                _compile_schema(key, base_url=xsd_path if is_url(xsd_path) else None), threading.Lock()
+            )
+            if 0 <= self.maxsize < len(self._schemas):
+                self._schemas.popitem(last=False)
+                self.evictions += 1
+            return entry
+
+    def clear(self) -> None:
+        """ Drops every compiled schema and resets the statistics """
+        with self._lock:
+            self._schemas.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns the hits, misses, evictions, current size and maximum size of the cache """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._schemas),
+                "maxsize": self.maxsize
+            }
+
+    def __contains__(self, xsd_path: str) -> bool:
+        return self.key(xsd_path) in self._schemas
+
+    def __len__(self) -> int:
+        return len(self._schemas)
 
 
 class Validator:
-    def __init__(self, xsd_path: str):
-        parser = etree.XMLParser(no_network=True)
-        parser.resolvers.add(CacheResolver())
-        xmlschema_doc = etree.parse(self.get_schema(xsd_path), parser=parser)
-        self.xmlschema = etree.XMLSchema(xmlschema_doc)
+    def __init__(self, xsd_path: str, cache: Optional[SchemaCache] = None):
+        self.xmlschema, self._lock = (cache if cache is not None else schema_cache).entry(xsd_path)
+        # Errors of the last document validated by this validator, see validate()
+        self.error_log: Optional[etree._ListErrorLog] = None
 
     @staticmethod
-    def retrieve_xsd(file: Union[str, etree._ElementTree]) -> Optional[str]:
+    def schema_link(file: Union[str, etree._ElementTree]) -> Optional[str]:
+        """ Returns the location of the schema declared by file, as written in its schemaLocation """
         ns = '{http://www.w3.org/2001/XMLSchema-instance}'
         if not isinstance(file, etree._ElementTree):
-            document = etree.parse(file)
+            document = parse(file)
         else:
             document = file
         schemaLink = document.getroot().get(ns + 'schemaLocation')
         if schemaLink:
             for link in schemaLink.split():
                 if link.endswith(".xsd"):
-                    return Validator.get_schema(link)
+                    return link
         return None
 
+    @staticmethod
+    def retrieve_xsd(file: Union[str, etree._ElementTree]) -> Optional[str]:
+        link = Validator.schema_link(file)
+        return Validator.get_schema(link) if link else None
+
     @staticmethod
     def cache_xsd_path(xsd_path):
-        xsd_path = xsd_path.replace("http://", "").replace("https://", "")
-        return os.path.join(_here, "", f"{hashlib.sha256(xsd_path.encode()).hexdigest()}.xsd")
+        return os.path.join(_here, "", url_hash(xsd_path))
 
     @staticmethod
     def get_schema(xsd_path):
+        """ Resolves a schema name, path or URL to a local path. URLs are looked up in the schemas shipped with
+        HTRVX, then in the user's schema store, where they are downloaded with their dependencies if missing.
+
+        :raises SchemaNotFound: If the URL is missing from both and HTRVX_OFFLINE is set
+        """
         if not xsd_path:
-            raise
-        if xsd_path.startswith("http://") or xsd_path.startswith("https://"):
-            new_xsd_path = f"downloaded_{hashlib.sha256(xsd_path.encode()).hexdigest()}.xsd"
+            raise SchemaNotFound("No schema given")
+        if is_url(xsd_path):
             if os.path.exists(Validator.cache_xsd_path(xsd_path)):
                 return Validator.cache_xsd_path(xsd_path)
-            elif os.path.exists(new_xsd_path):
-                return new_xsd_path
-            try:
-                schema_req = requests.get(xsd_path)
-                schema_req.raise_for_status()
-            except requests.HTTPError as E:
-                logger.warning(f"HTTP error while contacting {xsd_path}: {E}. Trying HTTPS if HTTP failed.")
-                # ALTO seems to throw an error because they moved to HTTP
-                if xsd_path.startswith("http://"):
-                    return Validator.get_schema(xsd_path.replace("http://", "https://"))
-                raise
-            with open(new_xsd_path, "w") as f:
-                f.write(schema_req.text)
-            return new_xsd_path
+            stored = schema_store.path(xsd_path)
+            if stored:
+                return stored
+            if is_offline():
+                raise SchemaNotFound(f"{xsd_path} is not in the schema store, add it with `htrvx schemas add`")
+            # Imported on use, like requests: most runs never download
+            import logging
+            logging.getLogger(__name__).info(f"Downloading {xsd_path} to the schema store {schema_store.directory}")
+            schema_store.add(xsd_path)
+            return schema_store.path(xsd_path)
 
         elif xsd_path in Schemas:
             return Schemas[xsd_path]
@@ -88,15 +233,28 @@ class Validator:
 
     def validate(self, xml_path: Union[str, etree._ElementTree]) -> bool:
         if not isinstance(xml_path, etree._ElementTree):
-            xml_doc = etree.parse(xml_path)
+            xml_doc = parse(xml_path)
         else:
             xml_doc = xml_path
-        result = self.xmlschema.validate(xml_doc)
+        # The compiled schema, and its error log, are shared by the threads of the process (eg. the daemon's):
+        #   the log is copied before another thread validates a document
+        with self._lock:
+            result = self.xmlschema.validate(xml_doc)
+            self.error_log = self.xmlschema.error_log
         return result
 
 
-def simplify_log_line(string: etree._LogEntry) -> str:
-    return string.message.replace("{http://www.loc.gov/standards/alto/ns-v4#}", "alto:")\
+schema_cache = SchemaCache()
+schema_store = SchemaStore()
+
+
+def simplify_message(message: str) -> str:
+    """ Replaces the namespaces of ALTO and PAGE by their prefix in a message of the validator """
+    return message.replace("{http://www.loc.gov/standards/alto/ns-v4#}", "alto:")\
         .replace("{http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15}", "page:")
 
 
+def simplify_log_line(string: etree._LogEntry) -> str:
+    return simplify_message(string.message)
+
+
@@ -0,0 +1,203 @@
+""" User-level store of XML Schemas and of the schemas they import or include, so that validation never needs the
+network once the store is filled (see `htrvx schemas --help`)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from lxml import etree
+
+_here = os.path.dirname(__file__)
+
+XSNamespace = "http://www.w3.org/2001/XMLSchema"
+
+# Schemas commonly declared by ALTO and PAGE files, stored by `htrvx schemas sync`
+KnownSchemas = [
+    "http://www.loc.gov/standards/alto/alto-v2.0.xsd",
+    "http://www.loc.gov/standards/alto/v4/alto-4-0.xsd",
+    "http://www.loc.gov/standards/alto/v4/alto-4-1.xsd",
+    "http://www.loc.gov/standards/alto/v4/alto-4-2.xsd",
+    "http://www.loc.gov/standards/alto/v4/alto-4-3.xsd",
+    "http://schema.primaresearch.org/PAGE/gts/pagecontent/2016-07-15/pagecontent.xsd",
+    "http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15/pagecontent.xsd",
+    "http://schema.primaresearch.org/PAGE/gts/pagecontent/2018-07-15/pagecontent.xsd",
+    "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15/pagecontent.xsd"
+]
+
+
+class SchemaNotFound(ValueError):
+    """Error raised when a value is not found"""
+
+
+def is_url(path: str) -> bool:
+    return path.startswith("http://") or path.startswith("https://")
+
+
+def _normalize(url: str) -> str:
+    """ Drops the scheme of url: schemas are the same over HTTP and HTTPS """
+    return url.replace("http://", "").replace("https://", "")
+
+
+def url_hash(url: str) -> str:
+    """ Returns the name under which the schema at url is saved, in the store and in HTRVX's own schemas """
+    return f"{hashlib.sha256(_normalize(url).encode()).hexdigest()}.xsd"
+
+
+def bundled_path(url: str) -> Optional[str]:
+    """ Returns the path of the copy of url shipped with HTRVX, if any """
+    path = os.path.join(_here, url_hash(url))
+    return path if os.path.exists(path) else None
+
+
+def default_store_dir() -> str:
+    """ Returns $HTRVX_SCHEMA_DIR, or htrvx/schemas in $XDG_DATA_HOME (~/.local/share by default) """
+    if os.environ.get("HTRVX_SCHEMA_DIR"):
+        return os.environ["HTRVX_SCHEMA_DIR"]
+    return os.path.join(
+        os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), "htrvx", "schemas"
+    )
+
+
+def is_offline() -> bool:
+    """ Whether network lookups are forbidden, with HTRVX_OFFLINE=1 """
+    return os.environ.get("HTRVX_OFFLINE", "").lower() in {"1", "true", "yes"}
+
+
+def schema_dependencies(content: bytes, base_url: str) -> List[str]:
+    """ Returns the absolute locations of the schemas imported, included or redefined by the schema content """
+    root = etree.fromstring(content, parser=etree.XMLParser(no_network=True, resolve_entities=False))
+    return [
+        urljoin(base_url, element.get("schemaLocation"))
+        for element in root.iterchildren(f"{{{XSNamespace}}}import", f"{{{XSNamespace}}}include",
+                                         f"{{{XSNamespace}}}redefine")
+        if element.get("schemaLocation")
+    ]
+
+
+def _download(url: str) -> bytes:
+    # Imported on use: requests takes longer to import than most runs need to test a few files
+    import requests
+    try:
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+    except requests.HTTPError:
+        # ALTO seems to throw an error because they moved to HTTP
+        if url.startswith("http://"):
+            return _download(url.replace("http://", "https://"))
+        raise
+    return response.content
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    """ Writes then renames, so that concurrent processes never read a partial file """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+class SchemaStore:
+    """ Schemas saved under the hash of their URL, with an index recording for each one its URL, the SHA-256 of its
+    content and the URLs of its dependencies
+
+    :param directory: Directory of the store, see default_store_dir(). Resolved on use when not given.
+    """
+    def __init__(self, directory: Optional[str] = None):
+        self._directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        return self._directory or default_store_dir()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def entries(self) -> Dict[str, Dict]:
+        """ Returns the index of the store: for each URL without its scheme, its url, file, sha256 and
+        dependencies
+        """
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def path(self, url: str) -> Optional[str]:
+        """ Returns the path of the stored copy of url, if any """
+        path = os.path.join(self.directory, url_hash(url))
+        return path if os.path.exists(path) else None
+
+    def add(self, url: str, source: Optional[str] = None, refresh: bool = False) -> List[str]:
+        """ Stores the schema at url and, transitively, the schemas it depends on. Schemas shipped with HTRVX or
+        already stored are not downloaded again, unless refresh is True.
+
+        :param source: Local file holding the schema at url, eg. on a machine without network
+        :returns: URLs of the schemas stored
+        """
+        offline = is_offline()
+        os.makedirs(self.directory, exist_ok=True)
+        stored, seen = [], set()
+        queue = [(url, source)]
+        with self._lock:
+            index = self.entries()
+            while queue:
+                current, current_source = queue.pop()
+                if _normalize(current) in seen:
+                    continue
+                seen.add(_normalize(current))
+                if current_source:
+                    with open(current_source, "rb") as f:
+                        content = f.read()
+                elif (not refresh or offline) and self.path(current):
+                    with open(self.path(current), "rb") as f:
+                        content = f.read()
+                elif (not refresh or offline) and bundled_path(current):
+                    with open(bundled_path(current), "rb") as f:
+                        content = f.read()
+                elif offline:
+                    raise SchemaNotFound(f"{current} is not available offline (HTRVX_OFFLINE is set)")
+                else:
+                    content = _download(current)
+                dependencies = schema_dependencies(content, current)
+                _write_atomic(os.path.join(self.directory, url_hash(current)), content)
+                index[_normalize(current)] = {
+                    "url": current,
+                    "file": url_hash(current),
+                    "sha256": hashlib.sha256(content).hexdigest(),
+                    "dependencies": dependencies
+                }
+                stored.append(current)
+                queue.extend((dependency, None) for dependency in dependencies)
+            _write_atomic(self._index_path, json.dumps(index, indent=2, sort_keys=True).encode())
+        return stored
+
+    def sync(self, urls: Optional[List[str]] = None, refresh: bool = False) -> List[str]:
+        """ Stores the given schemas, by default the known ALTO and PAGE ones, with their dependencies """
+        stored = []
+        for url in urls or KnownSchemas:
+            stored.extend(self.add(url, refresh=refresh))
+        return stored
+
+    def verify(self) -> List[str]:
+        """ Checks that every stored schema is intact and that its dependencies are stored or shipped with HTRVX.
+        Returns the problems found.
+        """
+        problems = []
+        for key, entry in sorted(self.entries().items()):
+            path = os.path.join(self.directory, entry["file"])
+            if not os.path.exists(path):
+                problems.append(f"{entry['url']}: file {entry['file']} is missing")
+                continue
+            with open(path, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() != entry["sha256"]:
+                    problems.append(f"{entry['url']}: content does not match its SHA-256")
+            for dependency in entry["dependencies"]:
+                if not self.path(dependency) and not bundled_path(dependency):
+                    problems.append(f"{entry['url']}: dependency {dependency} is not stored")
+        return problems
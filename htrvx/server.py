@@ -0,0 +1,200 @@
+""" Validation daemon: a long-running process answering validation requests over HTTP, on a Unix socket or on a
+local port, so that the imports, compiled schemas and vocabularies of HTRVX are loaded once (see `htrvx serve`).
+
+Requests are JSON documents posted to `/validate`:
+
+    {"path": "/data/page.xml", "profile": "segmonto", "options": {"xsd": true}}
+    {"xml": "<alto ...>...</alto>", "name": "page.xml"}
+
+and answered with `{"name": ..., "status": true, "tests": [...], "timings": ...}`, see FileLog.to_dict().
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from lxml import etree
+
+from htrvx.cache import ResultCache, PeriodicPrune
+from htrvx.client import DefaultHost, DefaultPort
+from htrvx.testing import test
+
+logger = logging.getLogger(__name__)
+
+# Options of htrvx.testing.test() that profiles and requests can set
+ProfileOptions = frozenset([
+    "format", "segmonto", "check_empty", "raise_empty", "check_image", "check_image_size", "xsd", "group",
+    "zones", "lines", "allow_untagged", "max_untagged_zones", "max_untagged_lines", "engine", "huge_tree",
+    "checks", "timings", "max_errors"
+])
+
+# Same defaults as `htrvx check`: no check is run unless asked for
+DefaultProfile: Dict[str, Any] = {
+    "format": "alto", "segmonto": False, "check_empty": False, "raise_empty": False, "check_image": False,
+    "xsd": False, "group": False, "max_untagged_zones": -1, "max_untagged_lines": -1
+}
+
+
+class BadRequest(ValueError):
+    """Error raised when a validation request can't be answered, sent back to the client"""
+
+
+def _normalize_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """ Checks option names and converts JSON values to the types given by the CLI """
+    unknown = set(options) - ProfileOptions
+    if unknown:
+        raise BadRequest(f"Unknown option(s): {', '.join(sorted(unknown))}")
+    normalized = {}
+    for key, value in options.items():
+        if key == "allow_untagged" and value == "both":
+            value = {"line", "zone"}
+        elif isinstance(value, list):
+            value = tuple(value)
+        normalized[key] = value
+    return normalized
+
+
+class Validation:
+    """ Answers validation requests with named option profiles
+
+    :param profiles: Options by profile name. `default` is used by requests without a profile and is based on the
+        defaults of `htrvx check`, as every other profile.
+    :param cache: Cache of results, used for requests by path
+    """
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None, cache: Optional[ResultCache] = None):
+        self.profiles = {"default": dict(DefaultProfile)}
+        for name, options in (profiles or {}).items():
+            self.profiles[name] = {**DefaultProfile, **_normalize_options(options)}
+        self.cache = cache
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "Validation":
+        """ Reads profiles from a JSON file mapping profile names to options """
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def validate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        profile = request.get("profile") or "default"
+        if profile not in self.profiles:
+            raise BadRequest(f"Unknown profile `{profile}`, available profiles: {', '.join(sorted(self.profiles))}")
+        options = {**self.profiles[profile], **_normalize_options(request.get("options") or {})}
+
+        if isinstance(request.get("path"), str):
+            file = request["path"]
+            if not os.path.isfile(file):
+                raise BadRequest(f"Path `{file}` is not a file the daemon can read")
+        elif isinstance(request.get("xml"), str):
+            file = BytesIO(request["xml"].encode())
+        else:
+            raise BadRequest("Requests need a `path` or an `xml` string")
+        name = request.get("name") or request.get("path") or "payload"
+
+        try:
+            # The cache is pruned by serve(), not by each request
+            statuses, _ = test([file], verbose=False, jobs=1, cache=self.cache, keep_logs=True, prune_cache=False,
+                               **options)
+        except (etree.XMLSyntaxError, OSError, ValueError) as E:
+            raise BadRequest(f"{name}: {E}")
+        filelog = next(iter(statuses.values()))
+        return {"name": name, "status": bool(filelog), **filelog.to_dict()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, code: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": f"No route {self.path}"})
+        self._reply(200, {"status": "ok", "profiles": sorted(self.server.validation.profiles)})
+
+    def do_POST(self):
+        if self.path != "/validate":
+            return self._reply(404, {"error": f"No route {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            if not isinstance(request, dict):
+                raise BadRequest("Requests are JSON objects")
+            self._reply(200, self.server.validation.validate(request))
+        except (BadRequest, ValueError) as E:
+            self._reply(400, {"error": str(E)})
+        except Exception as E:
+            logger.exception("Failed to answer a validation request")
+            self._reply(500, {"error": f"{type(E).__name__}: {E}"})
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+# Connections waiting to be accepted: beyond them, clients of a Unix socket are refused rather than kept waiting
+RequestQueueSize = 128
+
+
+class _TCPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = RequestQueueSize
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = RequestQueueSize
+
+    def server_close(self):
+        super(_UnixServer, self).server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def make_server(
+    validation: Validation,
+    socket_path: Optional[str] = None,
+    host: str = DefaultHost,
+    port: int = DefaultPort
+) -> socketserver.BaseServer:
+    """ Returns a server answering requests with validation, on the Unix socket socket_path or on host and port.
+    Requests are answered in threads, which share compiled schemas: documents validated against the same schema
+    are validated one at a time, so that each response carries the errors of its own document.
+
+    Requests by path read any file the daemon can read: only listen on a local interface or on a socket whose
+    permissions restrict its users.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                raise OSError(f"{socket_path} exists and is not a socket")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(socket_path) == 0:
+                    raise OSError(f"A daemon already listens on {socket_path}")
+            os.remove(socket_path)  # Left by a daemon that did not stop cleanly
+        server = _UnixServer(socket_path, _Handler)
+    else:
+        server = _TCPServer((host, port), _Handler)
+    server.validation = validation
+    return server
+
+
+def serve(validation: Validation, prune_interval: float = 600.0, **kwargs) -> None:
+    """ Answers requests until interrupted, see make_server() for arguments
+
+    :param prune_interval: Seconds between two prunings of the cache of validation, which is pruned again on exit
+    """
+    server = make_server(validation, **kwargs)
+    pruner = PeriodicPrune(validation.cache, prune_interval).start() if validation.cache is not None else None
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pruner is not None:
+            pruner.stop()
@@ -1,17 +1,31 @@
+import os
 import re
-from collections import defaultdict
-from typing import Iterable, List, Dict, Optional, Tuple, Union, IO, Sequence
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union, IO, Sequence, Pattern, Any, \
+    TYPE_CHECKING
 try:
     from typing import Literal
 except ImportError:
     from typing_extensions import Literal
 
-import click
 from lxml import etree
 
-from htrvx.schemas import Validator, simplify_log_line
-from htrvx.zones import AltoXML, PageXML, Element, SegmontoZoneRegex, SegmontoLineRegex
-from dataclasses import dataclass
+from htrvx.archives import open_file, split_member, MemberSeparator
+from htrvx.cache import ResultCache, dependency_state
+from htrvx.checks import get_check
+from htrvx.errors import ErrorLog, ErrorLimits, error_limit
+from htrvx.images import ImageResolver, image_size
+from htrvx.parsing import parse
+from htrvx.schemas import Validator, SchemaNotFound, schema_files
+from htrvx.timings import Clock, TimingReport, dispatch
+from htrvx.zones import AltoXML, PageXML, Element, SegmontoZoneRegex, SegmontoLineRegex, UnknownFormat, \
+    sniff_namespace, detect_format
+from dataclasses import dataclass, field, fields
+
+if TYPE_CHECKING:
+    from htrvx.reports import Report
+    from htrvx.sampling import SampleEstimate
 
 # Spacing for printing
 Space1 = "  "
@@ -54,14 +68,21 @@ def _msg(status):
 @dataclass
 class Status:
     status: Literal["success", "warning", "failure"]
-    task: Literal["segmonto", "schema", "empty-verification", "image-link-check", "custom-typing-check"]
+    # Checks of plugins use their own name, see htrvx.checks
+    task: Literal["segmonto", "schema", "empty-verification", "image-link-check", "custom-typing-check",
+                  "format-detection", "image-size-check"]
     message: Optional[str] = None
-    errors: Optional[List[str]] = None
+    # Messages, or an ErrorLog whose records are only formatted into messages when printed or exported
+    errors: Optional[Sequence[str]] = None
     level: Optional[Literal["zone", "line"]] = None
+    # Seconds spent on the check, only measured with timings on
+    duration: Optional[float] = None
 
-    def print(self, mode: Optional[str] = None) -> None:
+    def print(self, mode: Optional[str] = None, err: bool = False) -> None:
         if mode in {"minimal", "low"} and self.status == "success":
             return None
+        # Terminal output is imported on use, library calls do not need it
+        import click
         additional_info = ""
         if self.level:
             additional_info = f" at the \033[1m{self.level}\033[0m's level"
@@ -72,16 +93,52 @@ class Status:
                 f"test{additional_info} {_msg(status=self.status)}{': '+self.message if self.message else ''}.",
                 fg=_color(self.status, mode=mode)
             ),
-            color=True
+            color=True,
+            err=err
         )
         if self.errors and mode != "minimal":
             for error in self.errors:
-                click.echo(click.style(f"{Space2}┗ {error}", fg="blue" if mode != "zen" else None), color=True)
+                click.echo(click.style(f"{Space2}┗ {error}", fg="blue" if mode != "zen" else None), color=True,
+                           err=err)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field.name: getattr(self, field.name) for field in fields(self)}
+        if self.errors is not None:
+            data["errors"] = list(self.errors)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Status":
+        return cls(**data)
 
 
 @dataclass
 class FileLog:
     tests: Optional[List[Status]] = None
+    # Seconds spent per phase (parse, checks), only measured with timings on
+    timings: Optional[Dict[str, float]] = None
+    # Files the results depend on (eg. linked images), with their state when tested (see dependency_state()). Kept
+    #   out of comparisons and exports: they only tell the cache when the results are outdated.
+    dependencies: Optional[Dict[str, Union[bool, List[int]]]] = field(default=None, repr=False, compare=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tests": [status.to_dict() for status in self.tests] if self.tests is not None else None,
+            "timings": self.timings
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FileLog":
+        tests = data.get("tests")
+        return cls(
+            tests=[Status.from_dict(status) for status in tests] if tests is not None else None,
+            timings=data.get("timings")
+        )
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Returns the total number of seconds spent on the file, if timings were measured"""
+        return sum(self.timings.values()) if self.timings is not None else None
 
     def append(self, value) -> None:
         if self.tests is None:
@@ -111,90 +168,82 @@ class FileLog:
     def __bool__(self) -> bool:
         return self.status
 
-    def print(self, mode: Optional[str] = None) -> None:
+    def print(self, mode: Optional[str] = None, err: bool = False) -> None:
         if self.tests:
             for element in self.tests:
-                element.print(mode=mode)
+                element.print(mode=mode, err=err)
 
 
-def _empty_or_wrong(category):
-    if category is None:
-        return "is not categorized"
-    return f"has a forbidden type (`{category}`)"
+def parse_segmonto_errors(errors: Iterable[Element], group=False, element_type="element",
+                          limit: Optional[int] = None) -> ErrorLog:
+    """ Returns the log of the elements whose type is missing or forbidden, formatted when it is read
 
-
-def _get_ids(ids: Iterable[str]) -> str:
-    return ", ".join([f"#{val}" for val in ids])
-
-
-def parse_segmonto_errors(errors: Iterable[Element], group=False, element_type="element") -> List[str]:
-    """ Parse a list of errors
-    
+    :param limit: Maximum number of errors kept, see ErrorLog
     """
-    if not errors:
-        return []
-
-    if not group:
-        return [
-            f"{element_type.capitalize()} with id #{error.id} {_empty_or_wrong(error.category)}"
-            for error in errors
-        ]
-
-    groups = defaultdict(list)
+    log = ErrorLog("typing", element_type, group=group, limit=limit)
     for error in errors:
-        groups[f"`{error.category}`" if error.category is not None else "Missing"].append(error.id)
+        log.add(error.id, error.category, error.line)
+    return log
 
-    return [
-        f"{tag_name} tag for {element_type}(s) is forbidden ({len(ids)} annotations): {_get_ids(ids)}"
-        for tag_name, ids in sorted(list(groups.items()), key=lambda x: x[0])
-    ]
 
-
-def parse_empty(empty, group=False) -> Tuple[List[str], List[str]]:
-    """ Parses the empty log and returns two list of errors: one for lines, one for regions
+def parse_empty(empty, group=False, limit: Optional[int] = None) -> Tuple[ErrorLog, ErrorLog]:
+    """ Parses the empty log and returns two logs of errors: one for regions, one for lines
 
     """
-    if not empty:
-        return [], []
-
-    zone_errors = [z.id for z in empty if z.tagname == "Region"]
-    line_errors = [z.id for z in empty if z.tagname == "Line"]
+    zone_errors = ErrorLog("empty", "zone", group=group, limit=limit)
+    line_errors = ErrorLog("empty", "line", group=group, limit=limit)
+    for element in empty or []:
+        if element.tagname == "Region":
+            zone_errors.add(element.id, line=element.line)
+        elif element.tagname == "Line":
+            line_errors.add(element.id, line=element.line)
+    return zone_errors, line_errors
 
-    if not group:
-        return (
-            [f"Region with id #{zone} is empty" for zone in zone_errors],
-            [f"Line with id #{line} is empty" for line in line_errors]
-        )
-    return (
-        [f"Zones with missing IDs: {_get_ids(zone_errors)}"] if zone_errors else [],
-        [f"Lines with missing IDs: {_get_ids(line_errors)}"] if line_errors else []
-    )
 
-
-def parse_alto_logs(error_log: Iterable[etree._LogEntry], group: bool = False) -> List[str]:
-    """ Parses a Schema error log and returns the error with simplifications as string
+def parse_alto_logs(error_log: Iterable[etree._LogEntry], group: bool = False,
+                    limit: Optional[int] = None) -> ErrorLog:
+    """ Returns the log of the errors of a Schema validation, with simplifications once formatted
 
     """
-    if not group:
-        return [
-            f"Line {line.line:04d}: {simplify_log_line(line)}"
-            for line in error_log
-        ]
-    errors = defaultdict(list)
-    for line in error_log:
-        if group:
-            errors[simplify_log_line(line)].append(str(line.line))
-
-    return [
-        f"{error} on line(s): {', '.join(lines)}"
-        for error, lines in errors.items()
-    ]
+    log = ErrorLog("schema", group=group, limit=limit)
+    for entry in error_log:
+        log.add(category=entry.message, line=entry.line)
+    return log
+
+
+@lru_cache(maxsize=64)
+def _compile_vocabulary(patterns: Tuple[str, ...]) -> Pattern:
+    """ Compiles a list of allowed types into a single regular expression """
+    return re.compile("|".join([re.escape(pat) for pat in patterns]))
+
+
+def _check_image_size(obj: Union[AltoXML, PageXML], filepath: str, exists: bool) -> Status:
+    """ Compares the size of the image at filepath, read from its header, with the one declared by obj """
+    if not filepath:
+        return Status("failure", task="image-size-check", message="No image file were declared in the XML.")
+    if not exists:
+        return Status("failure", task="image-size-check", message=f"Image file at path `{filepath}` not found.")
+    declared = obj.declared_image_size()
+    if declared is None:
+        return Status("warning", task="image-size-check", message="No size in pixels declared for the page")
+    try:
+        actual = image_size(filepath)
+    except OSError:
+        actual = None
+    if actual is None:
+        return Status("warning", task="image-size-check",
+                      message=f"Size of image `{filepath}` can't be read (JPEG, PNG and TIFF are supported)")
+    if actual != declared:
+        return Status("failure", task="image-size-check",
+                      message=f"Image `{filepath}` is {actual[0]}x{actual[1]} pixels, "
+                              f"the page declares {declared[0]}x{declared[1]}")
+    return Status("success", task="image-size-check")
 
 
 def test_single(
     file: Union[str, IO, etree._ElementTree],
     group: bool = True,
-    format: Literal["alto", "page"] = "alto",
+    format: Literal["alto", "page", "auto"] = "alto",
     segmonto: bool = True,
     check_empty: bool = True,
     raise_empty: bool = True,
@@ -204,133 +253,352 @@ def test_single(
     lines: Optional[Sequence[str]] = None,
     allow_untagged: Optional[Union[str, Sequence[str]]] = False,
     max_untagged_zones: int = 0,
-    max_untagged_lines: int = 1
+    max_untagged_lines: int = 1,
+    engine: Literal["dom", "stream"] = "dom",
+    timings: bool = False,
+    image_resolver: Optional[ImageResolver] = None,
+    check_image_size: bool = False,
+    huge_tree: bool = False,
+    fail_fast: bool = False,
+    checks: Sequence[str] = (),
+    max_errors: Optional[ErrorLimits] = None
 ) -> FileLog:
+    """ Runs the requested checks on a single file and returns its log
+
+    :param format: `alto`, `page` or `auto` to detect the format from the namespace of the root element
+    :param engine: `dom` parses the whole file before checking it, `stream` reads zones and lines with iterparse
+        and keeps only one zone in memory at a time. XSD validation always requires the whole tree.
+    :param timings: Measure the time spent on each phase, in FileLog.timings, and on each check, in
+        Status.duration
+    :param image_resolver: Looks linked images up, by default each one is checked on the filesystem
+    :param check_image_size: Compare the size of the linked image, read from its header, with the one declared by
+        the page
+    :param huge_tree: Lift libxml2's safety limits on the size of trees, for very large files only. Files are
+        parsed once, by a parser shared by the current thread (see htrvx.parsing), and the tree is given to every
+        check.
+    :param fail_fast: Stop at the first failing check. Checks run from the cheapest to the most costly: typing and
+        emptiness, image link, image size and XSD validation.
+    :param checks: Names of checks of plugins to run (see htrvx.checks), after typing and emptiness. They are fed
+        by the same traversal of the document as the built-in checks.
+    :param max_errors: Maximum number of errors kept by each check, the others are counted and summarized as
+        `+N more`. Either one number for every check or a number per check name (eg. `{"schema": 10}`), where `*`
+        applies to the checks not listed. Errors are kept as records and only formatted once printed or exported.
+    """
     filelog = FileLog()
+    clock = Clock() if timings else None
+
+    filepath = file if isinstance(file, str) else None
+    stream = None
+    if filepath is not None and MemberSeparator in filepath and split_member(filepath):
+        # Files inside archives are streamed from the archive, and their image links resolved in it. Their stream is
+        #   closed once tested, the file of its archive stays open for the next files.
+        stream = file = open_file(filepath)
+
+    try:
+        if format not in {"alto", "page", "auto"}:
+            raise ValueError("Format for files should be either `alto`, `page` or `auto`")
+
+        streaming = engine == "stream" and not hasattr(file, "xpath")
+        if streaming:
+            parsed_xml = None
+        elif not hasattr(file, "xpath"):  # Definitely not perfect, ToDo: FIX
+            parsed_xml = parse(file, huge_tree=huge_tree)
+        else:
+            parsed_xml = file
+
+        if format == "auto":
+            try:
+                format, _ = detect_format(sniff_namespace(file if parsed_xml is None else parsed_xml))
+            except UnknownFormat as E:
+                filelog.append(Status("failure", task="format-detection", message=str(E)))
+                if clock:
+                    clock.lap("parse")
+                return _finish(filelog, clock)
+
+        cls = AltoXML if format == "alto" else PageXML
+        plugins = [
+            check(format, filepath)
+            for check in map(get_check, checks) if format in check.formats
+        ]
 
-    if format == "alto":
-        cls = AltoXML
-    elif format == "page":
-        cls = PageXML
-    else:
-        raise ValueError("Format for files should be either `alto` or `page`")
-
-    if not hasattr(file, "xpath"):  # Definitely not perfect, ToDo: FIX
-        parsed_xml = etree.parse(file)
-    else:
-        parsed_xml = file
-
-    custom_typing_check = bool(zones or lines)
-
-    line_regex = None
-    zone_regex = None
-    if custom_typing_check:
-        if lines:
-            line_regex = re.compile("|".join([re.escape(pat) for pat in lines]))
-        if zones:
-            zone_regex = re.compile("|".join([re.escape(pat) for pat in zones]))
-    elif segmonto:
-        line_regex = SegmontoLineRegex
-        zone_regex = SegmontoZoneRegex
-
-    # For some tests, we need to parse the file internally
-    if segmonto or check_empty or check_image or custom_typing_check:
-        obj = cls(parsed_xml)
-
-        if check_image:
-            filepath, status = obj.check_image_link(file if isinstance(file, str) else None)
-            message = ""
-            if not status:
-                if filepath:
-                    message = f"Image file at path `{filepath}` not found."
-                else:
-                    message = "No image file were declared in the XML."
-
-            filelog.append(Status(
-                "success" if status else "failure",
-                task="image-link-check",
-                message=message if message else None
-            ))
-
-        zone_errors, line_errors, empty = obj.test(
-            check_empty=check_empty,
-            check_typing=segmonto or custom_typing_check,
-            typing_check_lines=line_regex,
-            typing_check_zones=zone_regex,
-            allow_untagged=allow_untagged,
-            max_untagged_zones=max_untagged_zones,
-            max_untagged_lines=max_untagged_lines
-        )
-
-        if segmonto or custom_typing_check:
-            if segmonto or zones:
-                filelog.append(
-                    Status(
-                        "success" if not zone_errors else "failure",
-                        task="segmonto" if segmonto else "custom-typing-check",
-                        message=f"{len(zone_errors)} wrongly tagged zones" if zone_errors else "",
-                        errors=parse_segmonto_errors(zone_errors, group=group, element_type="zone"),
-                        level="zone"
-                    )
+        custom_typing_check = bool(zones or lines)
+
+        line_regex = None
+        zone_regex = None
+        if custom_typing_check:
+            if lines:
+                line_regex = _compile_vocabulary(tuple(lines))
+            if zones:
+                zone_regex = _compile_vocabulary(tuple(zones))
+        elif segmonto:
+            line_regex = SegmontoLineRegex
+            zone_regex = SegmontoZoneRegex
+
+        # For some tests, we need to parse the file internally. Checks run from the cheapest to the most costly one, so
+        #   that fail_fast skips the costly ones once a check failed.
+        if segmonto or check_empty or check_image or check_image_size or custom_typing_check or plugins:
+            obj = cls(file, stream=True, huge_tree=huge_tree, checks=plugins) if streaming else \
+                cls(parsed_xml, checks=plugins)
+            if clock:
+                clock.lap("parse")
+
+            if segmonto or check_empty or custom_typing_check:
+                zone_errors, line_errors, empty = obj.test(
+                    check_empty=check_empty,
+                    check_typing=segmonto or custom_typing_check,
+                    typing_check_lines=line_regex,
+                    typing_check_zones=zone_regex,
+                    allow_untagged=allow_untagged,
+                    max_untagged_zones=max_untagged_zones,
+                    max_untagged_lines=max_untagged_lines
                 )
-            if segmonto or lines:
-                filelog.append(
-                    Status(
-                        "success" if not line_errors else "failure",
-                        task="segmonto" if segmonto else "custom-typing-check",
-                        message=f"{len(line_errors)} wrongly tagged lines" if line_errors else "",
-                        errors=parse_segmonto_errors(line_errors, group=group, element_type="line"),
-                        level="line"
+                # Typing and emptiness are checked in the same pass: their statuses share its duration
+                duration = clock.lap("zones-and-lines") if clock else None
+                first_status = len(filelog)
+
+                if segmonto or custom_typing_check:
+                    typing_task = "segmonto" if segmonto else "custom-typing-check"
+                    if segmonto or zones:
+                        filelog.append(
+                            Status(
+                                "success" if not zone_errors else "failure",
+                                task=typing_task,
+                                message=f"{len(zone_errors)} wrongly tagged zones" if zone_errors else "",
+                                errors=parse_segmonto_errors(zone_errors, group=group, element_type="zone",
+                                                             limit=error_limit(max_errors, typing_task)),
+                                level="zone"
+                            )
+                        )
+                    if segmonto or lines:
+                        filelog.append(
+                            Status(
+                                "success" if not line_errors else "failure",
+                                task=typing_task,
+                                message=f"{len(line_errors)} wrongly tagged lines" if line_errors else "",
+                                errors=parse_segmonto_errors(line_errors, group=group, element_type="line",
+                                                             limit=error_limit(max_errors, typing_task)),
+                                level="line"
+                            )
+                        )
+
+                if check_empty:
+                    empty = parse_empty(empty, group=group, limit=error_limit(max_errors, "empty-verification"))
+
+                    for results, element_type in zip(empty, ["zone", "line"]):
+                        if not results:
+                            success = "success"
+                        elif raise_empty and results:
+                            success = "failure"
+                        else:
+                            success = "warning"
+                        filelog.append(
+                            Status(
+                                success,
+                                task="empty-verification",
+                                message=f"{results.total} empty {element_type}(s) found" if results else "",
+                                errors=results,
+                                level=element_type
+                            )
+                        )
+                if clock:
+                    for status in list(filelog)[first_status:]:
+                        status.duration = duration
+                if fail_fast and not filelog.status:
+                    return _finish(filelog, clock)
+
+            if plugins:
+                statuses = obj.run_checks()
+                duration = clock.lap("plugin-checks") if clock else None
+                for status in statuses:
+                    status.duration = duration
+                    limit = error_limit(max_errors, status.task)
+                    if status.errors and limit is not None:
+                        status.errors = ErrorLog.from_messages(status.errors, limit=limit)
+                    filelog.append(status)
+                if fail_fast and not filelog.status:
+                    return _finish(filelog, clock)
+
+            if check_image or check_image_size:
+                image, exists = obj.check_image_link(filepath, image_resolver)
+                # Results checked against a manifest do not depend on the filesystem
+                if image and (image_resolver is None or image_resolver.manifest is None):
+                    filelog.dependencies = {
+                        # Images inside archives depend on the state of their archive
+                        image: dependency_state(image, detailed=True) if check_image_size or MemberSeparator in image
+                        else exists
+                    }
+
+            if check_image:
+                duration = clock.lap("image-link-check") if clock else None
+                message = ""
+                if not exists:
+                    if image:
+                        message = f"Image file at path `{image}` not found."
+                    else:
+                        message = "No image file were declared in the XML."
+
+                filelog.append(Status(
+                    "success" if exists else "failure",
+                    task="image-link-check",
+                    message=message if message else None,
+                    duration=duration
+                ))
+                if fail_fast and not exists:
+                    return _finish(filelog, clock)
+
+            if check_image_size:
+                filelog.append(_check_image_size(obj, image, exists))
+                if clock:
+                    filelog.tests[-1].duration = clock.lap("image-size-check")
+                if fail_fast and not filelog.status:
+                    return _finish(filelog, clock)
+        elif clock:
+            clock.lap("parse")
+
+        if xsd:
+            if parsed_xml is None:
+                if hasattr(file, "seek"):
+                    file.seek(0)
+                parsed_xml = parse(file, huge_tree=huge_tree)
+                if clock:
+                    clock.lap("parse")
+            link = Validator.schema_link(parsed_xml)
+            if link:
+                # Results depend on the files of the schema, local or in the schema store, which change between runs
+                filelog.dependencies = {
+                    **(filelog.dependencies or {}),
+                    **{path: dependency_state(path, detailed=True) for path in schema_files(link)}
+                }
+            try:
+                validator = Validator(link) if link else None
+            except (SchemaNotFound, OSError, etree.XMLSchemaParseError, etree.XMLSyntaxError) as E:
+                # A schema missing from the store offline, failing to download, or whose imports can't be resolved
+                #   or parsed, only fails this file
+                filelog.append(Status("failure", task="schema", message=str(E), errors=[]))
+            else:
+                if validator is None:
+                    filelog.append(
+                        Status(
+                            "failure",
+                            task="schema",
+                            message="XSD not found",
+                            errors=[]
+                        )
                     )
-                )
-
-        if check_empty:
-            empty = parse_empty(empty, group=group)
-
-            for results, element_type in zip(empty, ["zone", "line"]):
-                if not results:
-                    success = "success"
-                elif raise_empty and results:
-                    success = "failure"
+                elif validator.validate(parsed_xml):
+                    filelog.append(Status("success", task="schema", message="validation passed"))
                 else:
-                    success = "warning"
-                filelog.append(
-                    Status(
-                        success,
-                        task="empty-verification",
-                        message=f"{len(results)} empty {element_type}(s) found" if results else "",
-                        errors=results,
-                        level=element_type
-                    )
-                )
-    if xsd:
-        xsd_path = Validator.retrieve_xsd(parsed_xml)
-        if xsd_path:
-            validator = Validator(xsd_path)
-            if validator.validate(parsed_xml):
-                filelog.append(Status("success", task="schema", message="validation passed"))
-            else:
-                filelog.append(
-                    Status(
-                        "failure",
-                        task="schema",
-                        message="validation failed",
-                        errors=parse_alto_logs(validator.xmlschema.error_log, group=group)
+                    filelog.append(
+                        Status(
+                            "failure",
+                            task="schema",
+                            message="validation failed",
+                            errors=parse_alto_logs(validator.error_log, group=group,
+                                                   limit=error_limit(max_errors, "schema"))
+                        )
                     )
-                )
-        else:
-            filelog.append(
-                Status(
-                    "failure",
-                    task="schema",
-                    message="XSD not found",
-                    errors=[]
-                )
-            )
+            if clock:
+                filelog.tests[-1].duration = clock.lap("schema")
 
+        return _finish(filelog, clock)
+    finally:
+        if stream is not None:
+            stream.close()
+
+
+def _finish(filelog: FileLog, clock: Optional[Clock]) -> FileLog:
+    """ Stores the measures of clock, if any, in filelog and returns it """
+    if clock:
+        filelog.timings = clock.timings
     return filelog
 
 
+def _cached_test_single(file: Union[str, IO, etree._ElementTree], cache: Optional[ResultCache], **options) -> FileLog:
+    """ Runs test_single(), unless the result for this file path and options is found in the cache.
+
+    Timed runs skip the cache: a cached result would not tell the time it takes to test the file.
+    """
+    if cache is None or not isinstance(file, str) or options.get("timings"):
+        return test_single(file, **options)
+    resolver = options.get("image_resolver")
+    key = cache.key(file, {
+        **options,
+        "image_resolver": resolver.fingerprint if resolver is not None else None,
+        "checks": [f"{name}@{get_check(name).version}" for name in options.get("checks") or ()]
+    })
+    cached = cache.get(key)
+    if cached is not None:
+        return FileLog.from_dict(cached)
+    filelog = test_single(file, **options)
+    cache.set(key, filelog.to_dict(), dependencies=filelog.dependencies)
+    return filelog
+
+
+# Options shared by test_single() calls inside a worker process, set by _init_worker
+_worker_options: Dict[str, Any] = {}
+_worker_cache: List[Optional[ResultCache]] = [None]
+
+
+def _init_worker(options: Dict[str, Any], cache: Optional[ResultCache] = None) -> None:
+    """ Initializes a worker process: stores the options and compiles the regexes it will need.
+
+    Schemas are compiled on first use and then kept by htrvx.schemas.schema_cache for the life of the worker.
+    """
+    _worker_options.clear()
+    _worker_options.update(options)
+    _worker_cache[0] = cache
+    for key in ("zones", "lines"):
+        if options.get(key):
+            _compile_vocabulary(tuple(options[key]))
+
+
+def _worker_test_single(file: str) -> FileLog:
+    return _cached_test_single(file, _worker_cache[0], **_worker_options)
+
+
+def _iter_filelogs(
+    files: Iterable[Union[str, IO, etree._ElementTree]],
+    jobs: int = 1,
+    cache: Optional[ResultCache] = None,
+    **options
+) -> Iterator[Tuple[Union[str, IO, etree._ElementTree], FileLog]]:
+    """ Runs test_single() on each file and yields each file with its FileLog, in the order of files
+
+    With jobs > 1, file paths are dispatched over a pool of processes. Opened or parsed files can't be sent to
+    other processes and are tested in the current one. Results of file paths are looked up in and saved to cache.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1:
+        for file in files:
+            yield file, _cached_test_single(file, cache, **options)
+        return
+
+    # Imported on use, with multiprocessing
+    from concurrent.futures import Future, ProcessPoolExecutor
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(options, cache))
+    # Keep a bounded window of pending results so that files are consumed lazily
+    pending: "deque[Tuple[Union[str, IO, etree._ElementTree], Future]]" = deque()
+    try:
+        for file in files:
+            if isinstance(file, str):
+                pending.append((file, pool.submit(_worker_test_single, file)))
+            else:
+                local = Future()
+                local.set_result(test_single(file, **options))
+                pending.append((file, local))
+            if len(pending) >= jobs * 4:
+                file, future = pending.popleft()
+                yield file, future.result()
+        while pending:
+            file, future = pending.popleft()
+            yield file, future.result()
+    finally:
+        # When the consumer stops early (eg. fail fast), files not started yet are dropped and running ones are
+        #   awaited, so that no worker is left behind
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
 def test(
     files: Iterable[Union[str, IO, etree._ElementTree]],
     verbose: bool = False,
@@ -346,49 +614,135 @@ def test(
     lines: Optional[Sequence[str]] = None,
     allow_untagged: Optional[Union[str, Sequence[str]]] = False,
     max_untagged_zones: int = 0,
-    max_untagged_lines: int = 1
+    max_untagged_lines: int = 1,
+    jobs: int = 1,
+    engine: Literal["dom", "stream"] = "dom",
+    cache: Optional[ResultCache] = None,
+    report: Optional["Report"] = None,
+    keep_logs: bool = True,
+    timings: bool = False,
+    timing_report: Optional[TimingReport] = None,
+    image_resolver: Optional[ImageResolver] = None,
+    check_image_size: bool = False,
+    huge_tree: bool = False,
+    fail_fast: bool = False,
+    max_failures: Optional[int] = None,
+    checks: Sequence[str] = (),
+    estimate: Optional["SampleEstimate"] = None,
+    max_errors: Optional[ErrorLimits] = None,
+    prune_cache: bool = True,
+    err: bool = False
 ) -> Tuple[Dict[str, FileLog], bool]:
     """ Tests all single files in files and returns their filelog as well as a global boolean status
 
+    :param jobs: Number of processes used to test files, 0 uses every available CPU.
+    :param engine: Parsing engine used by test_single(), either `dom` or `stream`.
+    :param cache: Cache of results, files whose content and options did not change are not tested again.
+    :param report: Report to which each file's log is added as soon as it is tested.
+    :param keep_logs: Keep the log of every file to return them. Without it, the returned dictionary is empty and
+        memory does not grow with the number of files.
+    :param timings: Measure the time spent on each file and check, see test_single(). Measures of each file are
+        passed to the hooks registered with htrvx.timings.add_hook().
+    :param timing_report: Aggregates the measures of each file, implies timings.
+    :param image_resolver: Looks linked images up. By default, a new one lists each directory once for this run,
+        and is closed once the files are tested.
+    :param check_image_size: Compare the size of linked images with the one declared by pages.
+    :param huge_tree: Lift libxml2's safety limits on the size of trees, for very large files.
+    :param fail_fast: Stop at the first failing file, skipping the remaining checks of that file (see
+        test_single()) and the remaining files. Same as max_failures=1 with shorter checks.
+    :param max_failures: Stop once this number of files failed. Files not tested are not part of the result.
+    :param checks: Names of checks of plugins to run, see htrvx.checks. With jobs > 1 on platforms starting worker
+        processes with spawn (Windows, macOS), only checks registered through entry points are known by workers.
+    :param estimate: Estimates the failure rates of a corpus from the results of files sampled from it, see
+        htrvx.sampling.draw_sample().
+    :param max_errors: Maximum number of errors kept by each check, see test_single().
+    :param prune_cache: Prune cache once the files are tested. Long-running callers testing few files at a time
+        (the daemon, --watch) prune it on their own schedule instead, see htrvx.cache.PeriodicPrune.
+    :param err: Print the verbose output to the standard error instead of the standard output, eg. when a report
+        is written there.
     """
+    if verbose:
+        import click
+    if fail_fast:
+        max_failures = 1
+    failures = 0
+    timings = timings or timing_report is not None
+    own_resolver = (check_image or check_image_size) and image_resolver is None
+    if own_resolver:
+        image_resolver = ImageResolver()
+    if (check_image or check_image_size) and jobs == 1:
+        # Workers of jobs > 1 have their own copy of the resolver, whose listings would not be shared
+        files = image_resolver.prefetching(files)
     statuses: Dict[str, FileLog] = defaultdict(FileLog)
+    passing, tested = 0, 0
+
+    filelogs = _iter_filelogs(
+        files, jobs=jobs, cache=cache,
+        group=group, format=format,
+        segmonto=segmonto, check_empty=check_empty, raise_empty=raise_empty, xsd=xsd,
+        check_image=check_image, zones=zones, lines=lines, allow_untagged=allow_untagged,
+        max_untagged_zones=max_untagged_zones,
+        max_untagged_lines=max_untagged_lines,
+        engine=engine, timings=timings, image_resolver=image_resolver, check_image_size=check_image_size,
+        huge_tree=huge_tree, fail_fast=fail_fast, checks=tuple(checks), max_errors=max_errors
+    )
 
-    for idx, file in enumerate(files):
-        if not isinstance(file, str):
-            file_name = "File %s" % str(idx+1).zfill(3)
-        else:
-            file_name = file
-
-        statuses[file_name] = test_single(
-            file,
-            group=group, format=format,
-            segmonto=segmonto, check_empty=check_empty, raise_empty=raise_empty, xsd=xsd,
-            check_image=check_image, zones=zones, lines=lines, allow_untagged=allow_untagged,
-            max_untagged_zones=max_untagged_zones,
-            max_untagged_lines=max_untagged_lines
-        )
-        if verbose:
-            filelog = statuses[file_name]
-            passed, total = filelog.score
-            status_string: str = "success" if passed == total else "failure"
-            # Print the element overal status
-            click.echo(
-                click.style(
-                    f"{_char(status_string)} [{passed}/{total}] {file_name}",
-                    fg=_color(status_string, mode=verbose_level)
-                ),
-                color=True
-            )
-            if status_string == "success" and verbose_level in {"minimal", "low"}:
-                continue
-            # Print the details
-            filelog.print(mode=verbose_level)
-
-    passing_files = [int(bool(file_statuses)) for file_statuses in statuses.values()]
+    try:
+        for idx, (file, filelog) in enumerate(filelogs):
+            if not isinstance(file, str):
+                file_name = "File %s" % str(idx+1).zfill(3)
+            else:
+                file_name = file
+
+            if keep_logs:
+                statuses[file_name] = filelog
+            else:
+                passing += int(bool(filelog))
+                tested += 1
+            failures += int(not filelog)
+            if report is not None:
+                report.add(file_name, filelog)
+            if estimate is not None:
+                estimate.add(file_name, filelog)
+            if filelog.timings is not None:
+                dispatch(file_name, filelog.timings)
+                if timing_report is not None:
+                    timing_report.add(file_name, filelog.timings)
+            if verbose:
+                passed, total = filelog.score
+                status_string: str = "success" if passed == total else "failure"
+                # Print the element overal status
+                click.echo(
+                    click.style(
+                        f"{_char(status_string)} [{passed}/{total}] {file_name}",
+                        fg=_color(status_string, mode=verbose_level)
+                    ),
+                    color=True,
+                    err=err
+                )
+                if status_string != "success" or verbose_level not in {"minimal", "low"}:
+                    # Print the details
+                    filelog.print(mode=verbose_level, err=err)
+            if max_failures is not None and failures >= max_failures:
+                # Cancels the files waiting in workers
+                filelogs.close()
+                if verbose:
+                    click.echo(f"Stopped after {failures} failing file(s)", err=err)
+                break
+    finally:
+        if own_resolver:
+            image_resolver.close()
+
+    if cache is not None and prune_cache:
+        cache.prune()
+
+    if keep_logs:
+        passing = sum([int(bool(file_statuses)) for file_statuses in statuses.values()])
+        tested = len(statuses)
 
     if verbose:
-        click.echo("\n\n\n=====\nREPORT\n=====\n")
-        click.echo(f"{sum(passing_files)}/{len(statuses)} valid XML files")
+        click.echo("\n\n\n=====\nREPORT\n=====\n", err=err)
+        click.echo(f"{passing}/{tested} valid XML files", err=err)
 
-    return statuses, len(statuses) == sum(passing_files)
+    return statuses, tested == passing
 
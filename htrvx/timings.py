@@ -0,0 +1,84 @@
+""" Timing of the checks: per-file phases, totals over a run, slowest files and hooks to export them """
+import heapq
+import time
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+# Callables receiving the name of each tested file and its durations per phase, in seconds
+TimingHook = Callable[[str, Dict[str, float]], None]
+_hooks: List[TimingHook] = []
+
+
+def add_hook(hook: TimingHook) -> None:
+    """ Registers hook, called with the durations of each file tested with timings on, eg. to send them to a
+    metrics system
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: TimingHook) -> None:
+    _hooks.remove(hook)
+
+
+def dispatch(name: str, timings: Dict[str, float]) -> None:
+    for hook in _hooks:
+        hook(name, timings)
+
+
+class Clock:
+    """ Measures consecutive phases: each lap() attributes the time elapsed since the previous one to a phase """
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> float:
+        now = time.perf_counter()
+        duration = now - self._last
+        self._last = now
+        self.timings[phase] = self.timings.get(phase, 0.0) + duration
+        return duration
+
+
+class TimingReport:
+    """ Totals per phase and slowest files over a run
+
+    :param slowest: Number of slowest files to keep
+    """
+    def __init__(self, slowest: int = 10):
+        self.slowest = slowest
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.files = 0
+        self._slowest: List[Tuple[float, str]] = []
+
+    def add(self, name: str, timings: Dict[str, float]) -> None:
+        self.files += 1
+        for phase, duration in timings.items():
+            self.totals[phase] += duration
+        total = sum(timings.values())
+        if len(self._slowest) < self.slowest:
+            heapq.heappush(self._slowest, (total, name))
+        elif self._slowest and total > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (total, name))
+
+    def slowest_files(self) -> List[Tuple[str, float]]:
+        """ Returns the slowest files with their total duration, slowest first """
+        return [(name, total) for total, name in sorted(self._slowest, reverse=True)]
+
+    def print(self, err: bool = False) -> None:
+        """ Prints the totals per phase and the slowest files
+
+        :param err: Print to the standard error instead of the standard output
+        """
+        import click
+        echo = partial(click.echo, err=err)
+        echo("\n=====\nTIMINGS\n=====\n")
+        total = sum(self.totals.values())
+        for phase, duration in sorted(self.totals.items(), key=lambda x: -x[1]):
+            share = duration / total * 100 if total else 0
+            echo(f"{phase:<20} {duration:10.3f}s {share:5.1f}%")
+        echo(f"{'total':<20} {total:10.3f}s for {self.files} file(s)")
+        if self._slowest:
+            echo("\nSlowest files:")
+            for name, duration in self.slowest_files():
+                echo(f"{duration:10.3f}s {name}")
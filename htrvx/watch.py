@@ -0,0 +1,116 @@
+""" Watch mode: directories are polled and only the XML files added or modified since the previous poll are tested
+again, in the same process, so that compiled schemas and vocabularies stay in memory between rounds
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import click
+
+from htrvx.cache import PeriodicPrune
+from htrvx.inputs import walk
+from htrvx.testing import FileLog, test
+
+# Modification time in nanoseconds and size of each file, by path
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def scan(directories: Iterable[str], extension: str = ".xml") -> Snapshot:
+    """ Returns the state of the files under directories. Polling stats every file, which works on any local or
+    network filesystem, unlike inotify.
+    """
+    snapshot = {}
+    for directory in directories:
+        for path in walk(directory, extension=extension):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # Removed since it was listed
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+class Watcher:
+    """ Keeps the state of the files under directories and the status of each one when it was last tested
+
+    :param directories: Directories searched recursively for files with extension
+    """
+    def __init__(self, directories: Iterable[str], extension: str = ".xml"):
+        self.directories = list(directories)
+        self.extension = extension
+        self.results: Dict[str, bool] = {}
+        self._snapshot: Snapshot = {}
+
+    def poll(self) -> Tuple[List[str], List[str]]:
+        """ Returns the files added or modified since the previous poll, every file on the first one, and the files
+        removed since then
+        """
+        snapshot = scan(self.directories, extension=self.extension)
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        removed = sorted(set(self._snapshot) - set(snapshot))
+        for path in removed:
+            self.results.pop(path, None)
+        self._snapshot = snapshot
+        return changed, removed
+
+    def validate(self, files: List[str], **options) -> Dict[str, FileLog]:
+        """ Tests files in the current process, see htrvx.testing.test() for options, and records their status """
+        statuses, _ = test(files, jobs=1, keep_logs=True, prune_cache=False, **options)
+        for path, filelog in statuses.items():
+            self.results[path] = bool(filelog)
+        return statuses
+
+    @property
+    def failing(self) -> List[str]:
+        return sorted(path for path, valid in self.results.items() if not valid)
+
+    def summary(self) -> str:
+        return f"{len(self.results) - len(self.failing)}/{len(self.results)} valid XML files"
+
+
+def watch(
+    directories: Iterable[str],
+    interval: float = 1.0,
+    verbose: bool = False,
+    rounds: Optional[int] = None,
+    prune_interval: float = 600.0,
+    **options
+) -> Watcher:
+    """ Tests every file under directories, then polls them every interval seconds and tests again the files added
+    or modified, printing a running summary after each round. Stops on Ctrl+C.
+
+    A file caught while it is being written is tested again once its writing ends, as its state changes again.
+
+    :param rounds: Number of polls before returning, unlimited by default
+    :param prune_interval: Seconds between two prunings of the cache of options, which is pruned again on exit
+    :param options: Options of htrvx.testing.test()
+    """
+    watcher = Watcher(directories)
+    polls = 0
+    cache = options.get("cache")
+    pruner = PeriodicPrune(cache, prune_interval).start() if cache is not None else None
+    try:
+        while rounds is None or polls < rounds:
+            if polls:
+                time.sleep(interval)
+            polls += 1
+            changed, removed = watcher.poll()
+            # Files removed right after the poll are caught by the next one
+            changed = [path for path in changed if os.path.exists(path)]
+            if not changed and not removed:
+                continue
+            statuses = watcher.validate(changed, verbose=verbose, **options) if changed else {}
+            failing = [path for path, filelog in statuses.items() if not filelog]
+            if not verbose:
+                for path in failing:
+                    click.echo(click.style(f"× {path}", fg="red"), color=True)
+            click.echo(
+                f"[{time.strftime('%H:%M:%S')}] {len(statuses)} file(s) tested, {len(failing)} failing, "
+                f"{len(removed)} removed. {watcher.summary()}, watching for changes..."
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pruner is not None:
+            pruner.stop()
+    return watcher
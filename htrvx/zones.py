@@ -1,9 +1,17 @@
-import os.path
 import re
-from typing import Dict, Optional, Union, Iterable, Tuple, List, IO, Pattern, Sequence
-from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Union, Iterable, Iterator, Tuple, List, IO, Pattern, Sequence, TYPE_CHECKING
+from dataclasses import dataclass, replace
 import lxml.etree as ET
 
+from htrvx.archives import exists as file_exists, join_link
+from htrvx.parsing import parse
+
+if TYPE_CHECKING:
+    from htrvx.checks import Check
+    from htrvx.images import ImageResolver
+    from htrvx.testing import Status
+
 SegmontoZones = frozenset(["CustomZone",
                            "DamageZone",
                            "GraphicZone",
@@ -30,24 +38,193 @@ SegmontoLines = frozenset(["CustomLine",
 SegmontoZoneRegex: Pattern = re.compile(f"({'|'.join(SegmontoZones)})" + r"(:\w+)?(#\w+)?")
 SegmontoLineRegex: Pattern = re.compile(f"({'|'.join(SegmontoLines)})" + r"(:\w+)?(#\w+)?")
 
-
-@dataclass
+# Namespaces are these prefixes followed by the version, eg. `ns-v4#` or `2019-07-15`
+AltoNamespacePrefix = "http://www.loc.gov/standards/alto/"
+PageNamespacePrefix = "http://schema.primaresearch.org/PAGE/gts/pagecontent/"
+
+
+# Number of distinct PAGE custom attributes whose category is memoized, shared by all files of a process
+CustomCacheSize = 4096
+# Number of distinct ALTO TAGREFS whose category is memoized for each file
+TagrefsCacheSize = 4096
+
+
+@lru_cache(maxsize=CustomCacheSize)
+def parse_custom_type(attribute_string: str) -> Optional[str]:
+    """ Returns the `type` of the `structure` annotation of a PAGE custom attribute, eg. `DefaultLine` for
+    `readingOrder {index:3;} structure {type:DefaultLine;}`. When repeated, the last annotation or key wins.
+
+    Only the `structure` annotation is split into keys and values, results are memoized as most files share a few
+    dozen distinct custom attributes.
+    """
+    if "structure" not in attribute_string:
+        return None
+    category = None
+    for chunk in attribute_string.split("}"):
+        tag, bracket, values = chunk.partition("{")
+        if not bracket or tag.strip() != "structure":
+            continue
+        category = None
+        for value in values.split(";"):
+            key, _, value = value.strip().partition(":")
+            if key == "type":
+                category = value
+    return category
+
+
+class UnknownFormat(ValueError):
+    """Error raised when the namespace of a document is neither ALTO nor PAGE"""
+
+
+def sniff_namespace(file: Union[str, IO, ET._ElementTree]) -> Optional[str]:
+    """ Returns the namespace of the root element of file. Files are only read up to the start tag of their
+    root, opened files are rewound afterwards.
+    """
+    if hasattr(file, "getroot"):
+        return ET.QName(file.getroot()).namespace
+    position = file.tell() if hasattr(file, "tell") else None
+    try:
+        for _, root in ET.iterparse(file, events=("start", )):
+            return ET.QName(root).namespace
+    finally:
+        if position is not None:
+            file.seek(position)
+    return None
+
+
+def detect_format(namespace: Optional[str]) -> Tuple[str, str]:
+    """ Returns the format (`alto` or `page`) and its version for a root namespace
+
+    >>> detect_format("http://www.loc.gov/standards/alto/ns-v4#")
+    ('alto', '4')
+    >>> detect_format("http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15")
+    ('page', '2019-07-15')
+    """
+    if namespace and namespace.startswith(AltoNamespacePrefix):
+        return "alto", namespace[len(AltoNamespacePrefix):].strip("#").replace("ns-v", "")
+    if namespace and namespace.startswith(PageNamespacePrefix):
+        return "page", namespace[len(PageNamespacePrefix):].strip("/")
+    raise UnknownFormat(f"Namespace `{namespace}` is neither ALTO nor PAGE")
+
+
+@dataclass(slots=True)
 class Element:
     id: str
     tagname: str
     category: Optional[str] = None
     has_content: bool = False
+    # Line of the source where the element starts
+    line: Optional[int] = None
 
 
 class XmlParser:
+    # Filled by _load_stream() when the document is read with the streaming engine
+    _streamed_zones: Optional[List[Element]] = None
+    _streamed_lines: Optional[List[Element]] = None
+    _streamed_image_links: Optional[List[str]] = None
+    # Width and height declared by the first page, as found by the streaming engine
+    _streamed_page_size: Optional[Tuple[Optional[str], Optional[str]]] = None
+    # Lift libxml2's safety limits, for very large files
+    _huge_tree: bool = False
+    # Elements whose subtree must be kept whole until their end event by the streaming engine
+    _stream_subtrees = frozenset(["TextLine"])
+    # Local names of the zones and of the element holding the text of a line, for the tree walk
+    _zone_tags: Tuple[str, ...] = ()
+    _content_tag: str = ""
+    # Checks of plugins by local name of the elements they need, fed once by the walk or the streaming engine
+    _check_listeners: Dict[str, List["Check"]] = {}
+    _checks: Tuple["Check", ...] = ()
+    _checks_fed: bool = False
+
+    def _set_checks(self, checks: Sequence["Check"]) -> None:
+        self._checks = tuple(checks)
+        self._check_listeners = {}
+        for check in self._checks:
+            for name in check.tags:
+                self._check_listeners.setdefault(name, []).append(check)
+        if self._check_listeners:
+            self._stream_subtrees = self._stream_subtrees | frozenset(self._check_listeners)
+
+    def run_checks(self) -> List["Status"]:
+        """ Returns the statuses of the checks given to the constructor, walking the tree for them only if the
+        built-in checks did not already do it
+        """
+        if not self._checks_fed and self._check_listeners:
+            self._walk_tree(collect=False)
+        self._checks_fed = True
+        return [status for check in self._checks for status in check.result()]
+
     def parse(self):
         raise NotImplemented
 
-    def get_zones(self) -> Iterable[Element]:
-        raise NotImplemented
+    def get_zones(self, check_empty: bool = False) -> Iterable[Element]:
+        return iter(self._collect(check_empty)[0])
 
-    def get_textlines(self) -> Iterable[Element]:
-        raise NotImplemented
+    def get_textlines(self, check_empty: bool = False) -> Iterable[Element]:
+        return iter(self._collect(check_empty)[1])
+
+    def _collect(self, check_empty: bool = False) -> Tuple[List[Element], List[Element]]:
+        """ Returns the zones and the lines of the document, in the order of get_zones() and get_textlines() """
+        if self._streamed_zones is not None:
+            return (
+                list(self._iter_streamed(self._streamed_zones, check_empty)),
+                list(self._iter_streamed(self._streamed_lines, check_empty))
+            )
+        return self._walk_tree(check_empty)
+
+    def _walk_tree(self, check_empty: bool = False, collect: bool = True) -> Tuple[List[Element], List[Element]]:
+        """ Builds zones and lines in a single ordered walk of the tree, restricted to the tags of the document's
+        namespace. Zones get their content from the lines found under them, lines look up their first content
+        element with a namespace-specific lookup that stops at the first match.
+
+        The same walk feeds the checks of plugins, once.
+
+        :param collect: Build zones and lines, otherwise only feed checks
+        """
+        root = self.xml.getroot() if hasattr(self.xml, "getroot") else self.xml
+        namespace = ET.QName(root).namespace
+        prefix = f"{{{namespace}}}" if namespace else ""
+        zone_tags = {f"{prefix}{name}": name for name in self._zone_tags} if collect else {}
+        line_tag = f"{prefix}TextLine"
+        content_tag = f"{prefix}{self._content_tag}"
+        listeners = {} if self._checks_fed else {
+            f"{prefix}{name}": checks for name, checks in self._check_listeners.items()
+        }
+        self._checks_fed = True
+        tags = [*zone_tags, line_tag] if collect else []
+
+        zones: Dict[ET._Element, Tuple[Tuple[int, ...], Element]] = {}
+        lines: List[Element] = []
+        for element in root.iter(*tags, *listeners):
+            if listeners and element.tag in listeners:
+                name = element.tag[len(prefix):]
+                for check in listeners[element.tag]:
+                    check.element(element, name)
+                if element.tag not in zone_tags and element.tag != line_tag:
+                    continue
+            if not collect:
+                continue
+            if element.tag == line_tag:
+                lines.append(self._to_element(
+                    element, "Line", check_empty and self._walk_line_content(element, content_tag)
+                ))
+                if check_empty:
+                    for ancestor in element.iterancestors():
+                        zone = zones.get(ancestor)
+                        if zone is not None:
+                            if zone[1].has_content:  # Its own ancestors were already flagged
+                                break
+                            zone[1].has_content = True
+            elif self._is_zone(element, zone_tags[element.tag]):
+                zones[element] = (
+                    self._zone_key(zone_tags[element.tag], len(zones)),
+                    self._to_element(element, "Region", False)
+                )
+        return [zone for _, zone in sorted(zones.values(), key=lambda x: x[0])], lines
+
+    def _walk_line_content(self, line: ET._Element, content_tag: str) -> bool:
+        """ Tells whether the line has some text, content_tag being the qualified name of the element holding it """
+        raise NotImplementedError
 
     def test(
             self,
@@ -66,7 +243,8 @@ class XmlParser:
         allow_empty_line = "line" in allow_untagged if allow_untagged else False
         untagged_zones = []
         untagged_lines = []
-        for zone in self.get_zones(check_empty=check_empty):
+        zones, lines = self._collect(check_empty=check_empty)
+        for zone in zones:
             if check_typing and typing_check_zones:
                 if zone.category and not typing_check_zones.match(zone.category):
                     zones_error.append(zone)
@@ -77,7 +255,7 @@ class XmlParser:
                         untagged_zones.append(zone)
             if not zone.has_content and check_empty:
                 empty.append(zone)
-        for line in self.get_textlines(check_empty=check_empty):
+        for line in lines:
             if check_typing and typing_check_lines:
                 if line.category is not None and not typing_check_lines.match(line.category):
                     line_error.append(line)
@@ -100,63 +278,150 @@ class XmlParser:
     def _check_line_content(self, line: ET._Element) -> bool:
         raise NotImplemented
 
-    def _check_zone_content(self, zone: ET._Element) -> bool:
-        raise NotImplemented
+    def check_image_link(self, filepath: Optional[str] = None,
+                         resolver: Optional["ImageResolver"] = None) -> Tuple[str, bool]:
+        """ Returns the path of the image linked by the file at filepath and whether it exists
+
+        :param resolver: Looks images up, by default each one is checked on the filesystem
+        """
+        raise NotImplementedError
 
-    def check_image_link(self, filepath: Optional[str] = None) -> Tuple[str, bool]:
+    def declared_image_size(self) -> Optional[Tuple[int, int]]:
+        """ Returns the width and height in pixels of the image, as declared by the page, if any """
         raise NotImplementedError
 
-    def _check_image_link(self, filepath: Optional[str], xpath_results: Iterable[str]) -> Tuple[str, bool]:
+    @staticmethod
+    def _parse_size(width: Optional[str], height: Optional[str]) -> Optional[Tuple[int, int]]:
+        try:
+            return round(float(width)), round(float(height))
+        except (TypeError, ValueError):
+            return None
+
+    def _is_zone(self, element: ET._Element, name: str) -> bool:
+        """ Tells whether element, whose local name is name, is a zone: called by the walk of the tree and by the
+        streaming engine at its start event, when the descendants of element are not parsed yet
+        """
+        raise NotImplementedError
+
+    def _zone_key(self, name: str, position: int) -> Tuple[int, ...]:
+        """ Sorting key of a zone, so that streamed zones come in the same order as get_zones() on a tree """
+        return (position, )
+
+    def _stream_start(self, element: ET._Element, name: str) -> None:
+        """ Hook called on every start event of the streaming engine """
+
+    def _stream_end(self, element: ET._Element, name: str) -> None:
+        """ Hook called on every end event of the streaming engine, before the element is cleared """
+
+    def _to_element(self, element: ET._Element, tagname: str, has_content: bool) -> Element:
+        raise NotImplementedError
+
+    def _iter_stream(self, source: Union[str, IO]) -> Iterator[Tuple[Tuple[int, ...], Element]]:
+        """ Streams the source with iterparse and yields zones and lines, with their sorting key, as their end
+        tags arrive. Processed subtrees are cleared so that only the current zone is kept in memory.
+        """
+        # Open zones as [key, element, has_line]
+        open_zones: List[list] = []
+        position = 0
+        kept = 0
+        for event, element in ET.iterparse(source, events=("start", "end"), remove_blank_text=True,
+                                           remove_comments=True, remove_pis=True, huge_tree=self._huge_tree):
+            if not isinstance(element.tag, str):  # Entities
+                continue
+            name = element.tag.rpartition("}")[2]
+            if event == "start":
+                if name in self._stream_subtrees:
+                    kept += 1
+                if name != "TextLine" and self._is_zone(element, name):
+                    open_zones.append([self._zone_key(name, position), element, False])
+                    position += 1
+                self._stream_start(element, name)
+                continue
+
+            if name in self._stream_subtrees:
+                kept -= 1
+            if name in self._check_listeners:
+                for check in self._check_listeners[name]:
+                    check.element(element, name)
+            if name == "TextLine":
+                for zone in open_zones:
+                    zone[2] = True
+                yield (), self._to_element(element, "Line", self._check_line_content(element))
+            elif open_zones and open_zones[-1][1] is element:
+                key, _, has_line = open_zones.pop()
+                yield key, self._to_element(element, "Region", has_line)
+            else:
+                self._stream_end(element, name)
+
+            if not kept:
+                element.clear(keep_tail=True)
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+    def iterparse(self, source: Union[str, IO]) -> Iterator[Element]:
+        """ Streams the source and yields zones and lines as their end tags arrive, keeping memory bounded by the
+        size of a single zone. Lines have their content checked, zones are flagged as having content when they
+        contain a line.
+        """
+        for _, element in self._iter_stream(source):
+            yield element
+
+    def _load_stream(self, source: Union[str, IO]) -> None:
+        zones, lines = [], []
+        for key, element in self._iter_stream(source):
+            if element.tagname == "Region":
+                zones.append((key, element))
+            else:
+                lines.append(element)
+        self._streamed_zones = [element for _, element in sorted(zones, key=lambda x: x[0])]
+        self._streamed_lines = lines
+        self._checks_fed = True
+
+    @staticmethod
+    def _iter_streamed(elements: List[Element], check_empty: bool) -> Iterator[Element]:
+        for element in elements:
+            if not check_empty and element.has_content:
+                element = replace(element, has_content=False)
+            yield element
+
+    def _check_image_link(self, filepath: Optional[str], xpath_results: Iterable[str],
+                          resolver: Optional["ImageResolver"] = None) -> Tuple[str, bool]:
         if not filepath:
             raise FileNotFoundError("Can't check an image link without a filepath")
         for filename in xpath_results:
             filename = str(filename)
-            filename = os.path.join(os.path.dirname(filepath), filename)
-            return filename, os.path.exists(filename)
+            filename = join_link(filepath, filename)
+            return filename, resolver.exists(filename) if resolver is not None else file_exists(filename)
         return "", False
 
 
 class PageXML(XmlParser):
-    def __init__(self, file: Union[str, ET._ElementTree, IO]):
-        if isinstance(file, str):
-            self.xml = ET.parse(file)
+    _zone_tags = ("TextRegion", )
+    _content_tag = "Unicode"
+
+    def __init__(self, file: Union[str, ET._ElementTree, IO], stream: bool = False, huge_tree: bool = False,
+                 checks: Sequence["Check"] = ()):
+        """
+        :param stream: Reads the file with the streaming engine instead of keeping the whole tree in memory.
+        :param huge_tree: Lift libxml2's safety limits on the size of trees, see htrvx.parsing.get_parser()
+        :param checks: Checks of plugins to feed with the elements they need, see run_checks()
+        """
+        self._huge_tree = huge_tree
+        self._set_checks(checks)
+        if stream:
+            self.xml = None
+            self._streamed_image_links = []
+            self._load_stream(file)
+        elif isinstance(file, str):
+            self.xml = parse(file, huge_tree=huge_tree)
         else:
             self.xml = file
 
     @staticmethod
-    def _parse_custom(attribute_string):
-        annotations = {}
-        attribute_string = attribute_string.strip()
-        annotations_chunks = [l_chunk for l_chunk in attribute_string.split('}') if l_chunk.strip() and "{" in l_chunk]
-        if annotations_chunks:
-            for chunk in annotations_chunks:
-                tag, vals = chunk.split('{')
-                tag_vals = {}
-                vals = [val.strip() for val in vals.split(';') if val.strip()]
-                for val in vals:
-                    key, *val = val.split(':')
-                    tag_vals[key] = ":".join(val)
-                annotations[tag.strip()] = tag_vals
-        return annotations.get("structure", {}).get("type", None)
-
-    def get_zones(self, check_empty: bool = False):
-        for region in self.xml.findall(".//{*}TextRegion"):
-            yield Element(
-                id=region.attrib.get("id", "UnknownID"), tagname="Region",
-                category=self._parse_custom(region.attrib.get("custom", "")),
-                has_content=False if not check_empty else self._check_zone_content(region)
-            )
-
-    def _check_zone_content(self, zone: ET._Element) -> bool:
-        return zone.find(".//{*}TextLine") is not None
-
-    def get_textlines(self, check_empty: bool = False):
-        for line in self.xml.findall('.//{*}TextLine'):
-            yield Element(
-                id=line.get("id", "UnknownID"), tagname="Line",
-                category=self._parse_custom(line.attrib.get("custom", "")),
-                has_content=False if not check_empty else self._check_line_content(line)
-            )
+    def _parse_custom(attribute_string: str) -> Optional[str]:
+        return parse_custom_type(attribute_string)
 
     def _check_line_content(self, line: ET._Element) -> bool:
         _line = line.find(".//{*}Unicode")
@@ -166,8 +431,42 @@ class PageXML(XmlParser):
             return bool(_line.text.strip())
         return False
 
-    def check_image_link(self, filepath: Optional[str] = None) -> Tuple[str, bool]:
-        return self._check_image_link(filepath, self.xml.xpath("//@imageFilename"))
+    def check_image_link(self, filepath: Optional[str] = None,
+                         resolver: Optional["ImageResolver"] = None) -> Tuple[str, bool]:
+        if self._streamed_image_links is not None:
+            return self._check_image_link(filepath, self._streamed_image_links, resolver)
+        return self._check_image_link(filepath, self.xml.xpath("//@imageFilename"), resolver)
+
+    def declared_image_size(self) -> Optional[Tuple[int, int]]:
+        if self._streamed_image_links is not None:
+            return self._parse_size(*(self._streamed_page_size or (None, None)))
+        page = self.xml.getroot().find("{*}Page")
+        if page is None:
+            return None
+        return self._parse_size(page.get("imageWidth"), page.get("imageHeight"))
+
+    def _is_zone(self, element: ET._Element, name: str) -> bool:
+        return name == "TextRegion"
+
+    def _walk_line_content(self, line: ET._Element, content_tag: str) -> bool:
+        for content in line.iter(content_tag):
+            return bool(content.text.strip()) if content.text is not None else False
+        return False
+
+    def _stream_start(self, element: ET._Element, name: str) -> None:
+        if not self._streamed_image_links:
+            image = element.get("imageFilename")
+            if image is not None:
+                self._streamed_image_links.append(image)
+        if name == "Page" and self._streamed_page_size is None:
+            self._streamed_page_size = (element.get("imageWidth"), element.get("imageHeight"))
+
+    def _to_element(self, element: ET._Element, tagname: str, has_content: bool) -> Element:
+        return Element(
+            id=element.get("id", "UnknownID"), tagname=tagname,
+            category=self._parse_custom(element.get("custom", "")),
+            has_content=has_content, line=element.sourceline
+        )
 
 
 class AltoXML(XmlParser):
@@ -175,48 +474,63 @@ class AltoXML(XmlParser):
                 'IllustrationType': 'illustration',
                 'GraphicalElementType': 'graphic',
                 'ComposedBlock': 'composed'}
-
-    def __init__(self, file: Union[str, ET._ElementTree, IO]):
+    _stream_subtrees = frozenset(["TextLine", "Tags"])
+    _zone_tags = tuple(_Regions)
+    _content_tag = "String"
+    _streamed_unit: Optional[str] = None
+
+    def __init__(self, file: Union[str, ET._ElementTree, IO], stream: bool = False, huge_tree: bool = False,
+                 checks: Sequence["Check"] = ()):
+        """
+        :param stream: Reads the file with the streaming engine instead of keeping the whole tree in memory. Tags
+            are expected to come before the Layout, as required by the ALTO schema.
+        :param huge_tree: Lift libxml2's safety limits on the size of trees, see htrvx.parsing.get_parser()
+        :param checks: Checks of plugins to feed with the elements they need, see run_checks()
+        """
+        self._huge_tree = huge_tree
+        self._set_checks(checks)
+        if stream:
+            self.xml = None
+            self._classes = {}
+            self._tagrefs_cache = {}
+            self._streamed_image_links = []
+            self._load_stream(file)
+            return
         if isinstance(file, str):
-            self.xml = ET.parse(file)
+            self.xml = parse(file, huge_tree=huge_tree)
         else:
             self.xml = file
         self._classes = self._get_class_maps(self.xml)
+        self._tagrefs_cache: Dict[str, Optional[str]] = {}
 
     def _parse_tagrefs(self, attribute_string: str) -> Optional[str]:
+        try:
+            return self._tagrefs_cache[attribute_string]
+        except KeyError:
+            pass
+        category = None
         for tagref in attribute_string.split():
             rtype = self._classes.get(tagref, None)
             if rtype:
-                return rtype
-        return
+                category = rtype
+                break
+        if len(self._tagrefs_cache) < TagrefsCacheSize:
+            self._tagrefs_cache[attribute_string] = category
+        return category
 
     def _get_class_maps(self, doc) -> Dict[str, str]:
-        cls_map = {}
         tags = doc.find('.//{*}Tags')
         if tags is not None:
-            for x in ['StructureTag', 'LayoutTag', 'OtherTag']:
-                for tag in tags.findall('./{{*}}{}'.format(x)):
-                    cls_map[tag.get('ID')] = tag.get('LABEL')
-        return cls_map
-
-    def get_textlines(self, check_empty: bool = False):
-        for line in self.xml.findall('.//{*}TextLine'):
-            yield Element(
-                id=line.get("ID", "UnknownID"), tagname="Line",
-                category=self._parse_tagrefs(line.get('TAGREFS', "")),
-                has_content=False if not check_empty else self._check_line_content(line)
-            )
+            return self._read_tags(tags)
+        return {}
 
-    def get_zones(self, check_empty: bool = False):
-        regions = []
-        for x in AltoXML._Regions.keys():
-            regions.extend(self.xml.findall('./{{*}}Layout/{{*}}Page/{{*}}PrintSpace/{{*}}{}'.format(x)))
-        for region in regions:
-            yield Element(
-                id=region.get("ID", "UnknownID"), tagname="Region",
-                category=self._parse_tagrefs(region.get('TAGREFS', "")),
-                has_content=False if not check_empty else self._check_zone_content(region)
-            )
+    @staticmethod
+    def _read_tags(tags: ET._Element) -> Dict[str, str]:
+        cls_map = {}
+        for x in ['StructureTag', 'LayoutTag', 'OtherTag']:
+            for tag in tags.findall('./{{*}}{}'.format(x)):
+                cls_map[tag.get('ID')] = tag.get('LABEL')
+        return cls_map
 
     def _check_line_content(self, line: ET._Element) -> bool:
         _line = line.find("{*}String")
@@ -224,11 +538,63 @@ class AltoXML(XmlParser):
             return bool(_line.attrib["CONTENT"].strip())
         return False
 
-    def _check_zone_content(self, zone: ET._Element) -> bool:
-        return zone.find(".//{*}TextLine") is not None
-
-    def check_image_link(self, filepath: Optional[str] = None) -> Tuple[str, bool]:
+    def check_image_link(self, filepath: Optional[str] = None,
+                         resolver: Optional["ImageResolver"] = None) -> Tuple[str, bool]:
+        if self._streamed_image_links is not None:
+            return self._check_image_link(filepath, self._streamed_image_links, resolver)
         return self._check_image_link(
             filepath,
-            [el.text for el in self.xml.findall(".//{*}fileName")]
+            [el.text for el in self.xml.findall(".//{*}fileName")],
+            resolver
+        )
+
+    def declared_image_size(self) -> Optional[Tuple[int, int]]:
+        """ Returns the size of the first page, unless it is expressed in another unit than pixels """
+        if self._streamed_image_links is not None:
+            unit, size = self._streamed_unit, self._streamed_page_size or (None, None)
+        else:
+            unit = self.xml.findtext("{*}Description/{*}MeasurementUnit")
+            page = self.xml.find("{*}Layout/{*}Page")
+            size = (page.get("WIDTH"), page.get("HEIGHT")) if page is not None else (None, None)
+        if unit is not None and unit.strip() != "pixel":
+            return None
+        return self._parse_size(*size)
+
+    def _is_zone(self, element: ET._Element, name: str) -> bool:
+        # Same as ./Layout/Page/PrintSpace/{Region} from the root
+        if name not in AltoXML._Regions:
+            return False
+        names = []
+        parent = element.getparent()
+        while parent is not None and len(names) < 4:
+            names.append(parent.tag.rpartition("}")[2])
+            parent = parent.getparent()
+        return names[:3] == ["PrintSpace", "Page", "Layout"] and len(names) == 4 and parent is None
+
+    def _zone_key(self, name: str, position: int) -> Tuple[int, ...]:
+        return list(AltoXML._Regions).index(name), position
+
+    def _walk_line_content(self, line: ET._Element, content_tag: str) -> bool:
+        for content in line.iterchildren(content_tag):
+            return bool(content.attrib["CONTENT"].strip())
+        return False
+
+    def _stream_end(self, element: ET._Element, name: str) -> None:
+        if name == "Tags" and not self._classes:
+            self._classes = self._read_tags(element)
+            self._tagrefs_cache = {}
+        elif name == "fileName":
+            self._streamed_image_links.append(element.text)
+        elif name == "MeasurementUnit" and self._streamed_unit is None:
+            self._streamed_unit = element.text or ""
+
+    def _stream_start(self, element: ET._Element, name: str) -> None:
+        if name == "Page" and self._streamed_page_size is None:
+            self._streamed_page_size = (element.get("WIDTH"), element.get("HEIGHT"))
+
+    def _to_element(self, element: ET._Element, tagname: str, has_content: bool) -> Element:
+        return Element(
+            id=element.get("ID", "UnknownID"), tagname=tagname,
+            category=self._parse_tagrefs(element.get('TAGREFS', "")),
+            has_content=has_content, line=element.sourceline
         )
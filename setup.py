@@ -112,7 +112,7 @@ setup(
 	package_data={'htrvx': ['schemas/*.xsd']},
 	include_package_data=True,
     entry_points={
-        'console_scripts': ['htrvx=htrvx.cli:cmd'],
+        'console_scripts': ['htrvx=htrvx.cli:main'],
     },
     install_requires=REQUIRED,
     extras_require=EXTRAS,
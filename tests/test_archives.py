@@ -0,0 +1,108 @@
+import os.path
+import tarfile
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.archives import split_member, exists, open_file
+from htrvx.cache import ResultCache
+from htrvx.cli import cmd
+from htrvx.inputs import iter_paths, MissingInput
+from htrvx.testing import test as htrvx_test, test_single as htrvx_test_single
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "page")
+_files = ("working.xml", "image_wronglink.xml", "empty_line.xml", "f33.jpeg")
+
+
+class ArchivesTestCase(TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.zip = os.path.join(self._dir.name, "release.zip")
+        self.tar = os.path.join(self._dir.name, "release.tar.gz")
+        with zipfile.ZipFile(self.zip, "w") as archive:
+            for name in _files:
+                archive.write(os.path.join(_data, name), f"data/{name}")
+        with tarfile.open(self.tar, "w:gz") as archive:
+            for name in _files:
+                archive.add(os.path.join(_data, name), f"./data/{name}")
+
+    def test_names(self):
+        """ Test that XML files of archives are named after the archive and their path in it """
+        for archive in (self.zip, self.tar):
+            with self.subTest(archive=archive):
+                self.assertEqual(list(iter_paths([archive])), [f"{archive}!data/{name}" for name in _files[:3]])
+                self.assertEqual(split_member(f"{archive}!data/working.xml"), (archive, "data/working.xml"))
+                self.assertTrue(exists(f"{archive}!data/../data/f33.jpeg"))
+                self.assertFalse(exists(f"{archive}!f33.jpeg"))
+        self.assertIsNone(split_member(os.path.join(_data, "working.xml")))
+        self.assertEqual(list(iter_paths([f"{self.zip}!data/working.xml"])), [f"{self.zip}!data/working.xml"])
+        with self.assertRaises(MissingInput):
+            list(iter_paths([f"{self.zip}!data/missing.xml"]))
+
+    def test_same_results(self):
+        """ Test that files inside archives get the results of extracted files, images being looked up in the
+        archive
+        """
+        options = dict(format="page", segmonto=True, check_empty=True, check_image=True, xsd=True)
+        for archive in (self.zip, self.tar):
+            for engine in ("dom", "stream"):
+                with self.subTest(archive=archive, engine=engine):
+                    for name in _files[:3]:
+                        expected = htrvx_test_single(os.path.join(_data, name), engine=engine, **options)
+                        filelog = htrvx_test_single(f"{archive}!data/{name}", engine=engine, **options)
+                        self.assertEqual([(status.task, status.status) for status in filelog],
+                                         [(status.task, status.status) for status in expected])
+        filelog = htrvx_test_single(f"{self.zip}!data/image_wronglink.xml", **options)
+        self.assertIn(f"`{self.zip}!data/FileNotFound.jpeg` not found", filelog.tests[-2].message)
+
+    def test_root_member_links(self):
+        """ Test that images linked by files at the root of an archive are looked up at the root of the archive,
+        not next to the archive
+        """
+        os.makedirs(os.path.join(self._dir.name, "sub"))
+        archive = os.path.join(self._dir.name, "sub", "rel.zip")
+        with zipfile.ZipFile(archive, "w") as f:
+            for name in ("working.xml", "image_wronglink.xml", "f33.jpeg"):
+                f.write(os.path.join(_data, name), name)
+        filelog = htrvx_test_single(f"{archive}!working.xml", format="page", check_image=True)
+        self.assertEqual(filelog.tests[-1].status, "success")
+        # A file next to the archive is not part of it
+        with open(os.path.join(self._dir.name, "sub", "FileNotFound.jpeg"), "wb"):
+            pass
+        filelog = htrvx_test_single(f"{archive}!image_wronglink.xml", format="page", check_image=True)
+        self.assertEqual(filelog.tests[-1].status, "failure")
+        self.assertIn(f"`{archive}!FileNotFound.jpeg` not found", filelog.tests[-1].message)
+
+    def test_cache(self):
+        """ Test that results of files inside archives are cached until the archive changes """
+        cache = ResultCache(os.path.join(self._dir.name, "cache"))
+        files = list(iter_paths([self.zip]))
+        first, _ = htrvx_test(files, format="page", check_image=True, cache=cache)
+        self.assertEqual(cache.stats()[0], 3)
+        second, _ = htrvx_test(files, format="page", check_image=True, cache=cache)
+        self.assertEqual(dict(first), dict(second))
+
+        with zipfile.ZipFile(self.zip, "a") as archive:
+            archive.write(os.path.join(_data, "f33.jpeg"), "data/FileNotFound.jpeg")
+        third, _ = htrvx_test(files, format="page", check_image=True, cache=cache)
+        self.assertEqual(third[f"{self.zip}!data/image_wronglink.xml"].tests[-1].status, "success",
+                         "Image links are checked again")
+
+    def test_cli(self):
+        result = CliRunner().invoke(cmd, ["--format", "page", "--no-cache", "--check-image", "--jobs", "2",
+                                          "--verbose", self.tar])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn(f"{self.tar}!data/working.xml", result.output)
+        self.assertIn("2/3 valid XML files", result.output)
+
+        broken = os.path.join(self._dir.name, "broken.zip")
+        with open(broken, "w") as f:
+            f.write("Not an archive")
+        result = CliRunner().invoke(cmd, [broken])
+        self.assertEqual(result.exit_code, 2)
+        with open_file(f"{self.tar}!data/working.xml") as f, open(os.path.join(_data, "working.xml"), "rb") as g:
+            self.assertEqual(f.read(), g.read())
@@ -0,0 +1,150 @@
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from htrvx.cache import ResultCache
+from htrvx.schemas import schema_cache, _schema_documents
+from htrvx.testing import FileLog, test as htrvx_test
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "page")
+
+
+class ResultCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.cache = ResultCache(os.path.join(self._dir.name, "cache"))
+        self.files = os.path.join(self._dir.name, "files")
+        os.makedirs(self.files)
+        for name in ("working.xml", "f33.jpeg", "empty_line.xml"):
+            shutil.copy(os.path.join(_data, name), self.files)
+
+    def getFile(self, filename: str):
+        return os.path.join(self.files, filename)
+
+    def run_test(self, *files, **options):
+        options.setdefault("cache", self.cache)
+        return htrvx_test([self.getFile(name) for name in files], format="page", check_empty=True,
+                          raise_empty=True, **options)
+
+    def test_reuse(self):
+        """ Test that a second run returns the cached results """
+        first, status = self.run_test("working.xml", "empty_line.xml")
+        self.assertEqual(self.cache.stats()[0], 2, "Both results are saved")
+        second, second_status = self.run_test("working.xml", "empty_line.xml")
+        self.assertEqual(dict(first), dict(second), "Cached results are the same")
+        self.assertEqual(status, second_status)
+
+    def test_invalidation(self):
+        """ Test that results are not reused when the file or the options change """
+        self.run_test("working.xml")
+        with open(self.getFile("working.xml"), "a") as f:
+            f.write("<!-- changed -->")
+        self.run_test("working.xml")
+        self.assertEqual(self.cache.stats()[0], 2, "Changed content gets a new entry")
+        self.run_test("working.xml", segmonto=False)
+        self.assertEqual(self.cache.stats()[0], 3, "Changed options get a new entry")
+
+    def test_image_dependency(self):
+        """ Test that a result is dropped when its image appears or disappears """
+        logs, status = self.run_test("working.xml", check_image=True)
+        self.assertTrue(status)
+        os.remove(self.getFile("f33.jpeg"))
+        logs, status = self.run_test("working.xml", check_image=True)
+        self.assertFalse(status, "Missing image is detected despite the cache")
+
+    def test_dependencies_field(self):
+        """ Test that dependencies are kept on the log but out of its comparisons and exports """
+        logs, _ = self.run_test("working.xml", check_image=True, cache=None)
+        filelog = logs[self.getFile("working.xml")]
+        self.assertEqual(filelog.dependencies, {self.getFile("f33.jpeg"): True})
+        self.assertNotIn("dependencies", filelog.to_dict())
+        self.assertEqual(FileLog.from_dict(filelog.to_dict()), filelog, "Dependencies are not compared")
+
+    def test_image_size_dependency(self):
+        """ Test that a result checking the size of the image is dropped when the image changes """
+        def size_check(logs):
+            return [status for status in logs[self.getFile("working.xml")] if status.task == "image-size-check"][0]
+
+        logs, status = self.run_test("working.xml", check_image_size=True)
+        self.assertEqual(size_check(logs).status, "warning", "Test image is empty")
+        with open(self.getFile("f33.jpeg"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR\x00\x00\x00\x01\x00\x00\x00\x01")
+        logs, status = self.run_test("working.xml", check_image_size=True)
+        self.assertEqual(size_check(logs).status, "failure", "New image is read")
+
+    def test_schema_dependency(self):
+        """ Test that XSD results are dropped when the schema they were validated against changes """
+        schema = os.path.join(self._dir.name, "local.xsd")
+        with open(schema, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+                    'targetNamespace="urn:test"><xs:element name="root"/></xs:schema>')
+        with open(self.getFile("local.xml"), "w") as f:
+            f.write(f'<root xmlns="urn:test" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                    f'xsi:schemaLocation="urn:test {schema}"/>')
+        logs, status = htrvx_test([self.getFile("local.xml")], segmonto=False, check_empty=False, xsd=True,
+                                  cache=self.cache)
+        self.assertTrue(status)
+        with open(schema, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+                    'targetNamespace="urn:test"><xs:element name="other"/></xs:schema>')
+        # Schemas are read and compiled once per process: start over like a new run
+        schema_cache.clear()
+        _schema_documents.clear()
+        logs, status = htrvx_test([self.getFile("local.xml")], segmonto=False, check_empty=False, xsd=True,
+                                  cache=self.cache)
+        self.assertFalse(status, "The changed schema is used despite the cache")
+
+    def test_unwritable(self):
+        """ Test that a cache directory which can't be written only disables the cache, with a single warning """
+        path = os.path.join(self._dir.name, "file")
+        with open(path, "w"):
+            pass
+        cache = ResultCache(path)
+        with self.assertLogs("htrvx.cache", level="WARNING") as logs:
+            statuses, status = self.run_test("working.xml", "empty_line.xml", cache=cache)
+        self.assertEqual(len(statuses), 2, "Files are tested")
+        self.assertEqual(len(logs.output), 1, "Failure is logged once")
+        self.assertTrue(cache.read_only)
+        self.assertEqual(cache.stats(), (0, 0))
+
+    def test_prune(self):
+        """ Test that the cache is pruned to its maximum size, and emptied by clear() """
+        self.cache.max_size = 0
+        self.run_test("working.xml", "empty_line.xml")
+        self.assertEqual(self.cache.stats(), (0, 0), "Entries above the size limit are removed")
+        self.cache.max_size = 1024 * 1024
+        self.run_test("working.xml", "empty_line.xml")
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(), (0, 0), "Cache is emptied")
+
+    def test_concurrent_prune(self):
+        """ Test that entries removed by another process while pruning are skipped """
+        self.run_test("working.xml", "empty_line.xml")
+        entries = list(self.cache._entries())
+        self.cache.clear()
+        self.cache.max_size = 0
+        with mock.patch.object(ResultCache, "_entries", return_value=iter(entries)):
+            self.assertEqual(self.cache.prune(), 0)
+        self.cache.max_size = 1024 * 1024
+        self.run_test("working.xml", "empty_line.xml")
+        self.cache.max_size = 0
+        entries = list(self.cache._entries())
+        os.remove(entries[0].path)
+        with mock.patch.object(ResultCache, "_entries", return_value=iter(entries)), \
+                mock.patch("htrvx.cache.os.remove", side_effect=FileNotFoundError):
+            self.assertEqual(self.cache.prune(), 0)
+        with mock.patch.object(ResultCache, "_entries", return_value=iter(entries)):
+            self.assertEqual(self.cache.stats()[0], 1, "Removed entries are not counted")
+
+    def test_pruned_after_read(self):
+        """ Test that an entry removed by another process right after it was read is still returned """
+        first, _ = self.run_test("working.xml")
+        with mock.patch("htrvx.cache.os.utime", side_effect=FileNotFoundError) as utime, \
+                mock.patch("htrvx.testing.test_single") as test_single:
+            second, _ = self.run_test("working.xml")
+        self.assertTrue(utime.called)
+        test_single.assert_not_called()
+        self.assertEqual(dict(first), dict(second))
@@ -0,0 +1,106 @@
+import os.path
+from typing import List
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.checks import Check, register, get_check, UnknownCheck, _registry
+from htrvx.cli import cmd, main
+from htrvx.testing import Status, test as htrvx_test, test_single as htrvx_test_single
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+class LinesWithoutId(Check):
+    """ Flags text lines without an ID """
+    name = "test-lines-without-id"
+    tags = frozenset(["TextLine"])
+    seen: List[str] = []
+
+    def __init__(self, format, filepath=None):
+        super().__init__(format, filepath)
+        self.lines = 0
+        self.missing = 0
+
+    def element(self, element, name):
+        LinesWithoutId.seen.append(name)
+        self.lines += 1
+        if not element.get("ID") and not element.get("id"):
+            self.missing += 1
+
+    def result(self) -> List[Status]:
+        if self.missing:
+            return [Status("failure", task=self.name, message=f"{self.missing} line(s) out of {self.lines} without ID")]
+        return [Status("success", task=self.name, message=f"{self.lines} line(s)")]
+
+
+class ChecksTestCase(TestCase):
+    def setUp(self):
+        register(LinesWithoutId)
+        LinesWithoutId.seen = []
+        self.addCleanup(_registry.pop, LinesWithoutId.name, None)
+
+    def test_unknown_check(self):
+        with self.assertRaises(UnknownCheck):
+            get_check("no-such-check")
+
+    def test_engines(self):
+        """ Test that plugins get the same elements whatever the engine """
+        for format, name in (("alto", "working.xml"), ("page", "working.xml")):
+            file = os.path.join(_data, format, name)
+            results = []
+            for engine in ("dom", "stream"):
+                with self.subTest(format=format, engine=engine):
+                    filelog = htrvx_test_single(file, format=format, engine=engine, checks=[LinesWithoutId.name])
+                    statuses = [status for status in filelog if status.task == LinesWithoutId.name]
+                    self.assertEqual(len(statuses), 1)
+                    self.assertEqual(statuses[0].status, "success", statuses[0].message)
+                    results.append(statuses[0])
+            self.assertEqual(results[0], results[1])
+
+    def test_shared_walk(self):
+        """ Test that each line is given once, with the built-in checks walking the tree too """
+        file = os.path.join(_data, "alto", "working.xml")
+        for engine in ("dom", "stream"):
+            with self.subTest(engine=engine):
+                LinesWithoutId.seen = []
+                htrvx_test_single(file, format="alto", engine=engine, segmonto=True, check_empty=True,
+                                  checks=[LinesWithoutId.name])
+                lines = len(LinesWithoutId.seen)
+                self.assertGreater(lines, 0)
+                LinesWithoutId.seen = []
+                htrvx_test_single(file, format="alto", engine=engine, checks=[LinesWithoutId.name])
+                self.assertEqual(len(LinesWithoutId.seen), lines, "Walked once, with or without built-in checks")
+
+    def test_failing_check(self):
+        """ Test that a failing plugin fails the run """
+        class NoLines(Check):
+            name = "test-no-lines"
+            tags = frozenset(["TextLine"])
+            formats = frozenset(["alto"])
+
+            def result(self):
+                return [Status("failure", task=self.name, message="Lines found")]
+        register(NoLines)
+        self.addCleanup(_registry.pop, NoLines.name, None)
+        _, status = htrvx_test([os.path.join(_data, "alto", "working.xml")], format="alto", checks=[NoLines.name])
+        self.assertFalse(status)
+        filelog = htrvx_test_single(os.path.join(_data, "page", "working.xml"), format="page", checks=[NoLines.name])
+        self.assertNotIn(NoLines.name, [status.task for status in filelog], "Only run on the formats it declares")
+
+    def test_cli(self):
+        runner = CliRunner()
+        result = runner.invoke(main, ["checks"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("test-lines-without-id: Flags text lines without an ID (elements: TextLine)", result.output)
+
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", "--check", "no-such-check",
+                                     os.path.join(_data, "alto", "working.xml")])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("No check named `no-such-check`", result.output)
+
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", "--check", LinesWithoutId.name, "--verbose",
+                                     os.path.join(_data, "alto", "working.xml")])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Test lines without id", result.output)
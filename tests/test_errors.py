@@ -0,0 +1,119 @@
+import io
+import json
+import os.path
+import pickle
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.errors import ErrorLog, ErrorRecord, error_limit
+from htrvx.testing import FileLog, test_single as htrvx_test_single
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def _document(lines: int) -> io.BytesIO:
+    """ Returns an ALTO document with a forbidden zone and lines of forbidden type, one line of the source each """
+    text_lines = "".join(
+        f'\n<TextLine ID="l{idx}" TAGREFS="BAD"><String CONTENT="x"/></TextLine>' for idx in range(lines)
+    )
+    return io.BytesIO(
+        f'<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#">'
+        f'<Tags><OtherTag ID="BAD" LABEL="Nope"/></Tags><Layout><Page ID="p"><PrintSpace>'
+        f'<TextBlock ID="z" TAGREFS="BAD">{text_lines}\n</TextBlock></PrintSpace></Page></Layout></alto>'.encode()
+    )
+
+
+class ErrorLogTestCase(TestCase):
+    def test_format_on_access(self):
+        """ Test that records are formatted with their source line when read """
+        log = ErrorLog("typing", "line")
+        log.add("l1", None, 12)
+        log.add("l2", "Nope", 13)
+        self.assertEqual(list(log), ["Line with id #l1 is not categorized (line 12)",
+                                     "Line with id #l2 has a forbidden type (`Nope`) (line 13)"])
+        self.assertEqual(log.records[0], ErrorRecord("typing", "line", "l1", None, 12))
+        self.assertEqual(log, ["Line with id #l1 is not categorized (line 12)",
+                               "Line with id #l2 has a forbidden type (`Nope`) (line 13)"])
+
+    def test_limit(self):
+        """ Test that errors past the limit are counted but not kept """
+        log = ErrorLog("empty", "zone", limit=2)
+        for idx in range(5):
+            log.add(f"z{idx}")
+        self.assertEqual(len(log.records), 2)
+        self.assertEqual(log.total, 5)
+        self.assertEqual(list(log), ["Region with id #z0 is empty", "Region with id #z1 is empty", "+3 more"])
+        self.assertEqual(len(log), 3)
+
+    def test_grouped_limit(self):
+        """ Test that grouped messages count the errors that were not kept """
+        log = ErrorLog("typing", "zone", group=True, limit=2)
+        for idx, category in enumerate(["A", None, "A", "B", "A"]):
+            log.add(f"z{idx}", category)
+        self.assertEqual(list(log), [
+            "Missing tag for zone(s) is forbidden (1 annotations): #z1",
+            "`A` tag for zone(s) is forbidden (3 annotations): #z0, +2 more",
+            "`B` tag for zone(s) is forbidden (1 annotations): +1 more"
+        ])
+
+    def test_empty(self):
+        log = ErrorLog("schema", limit=0)
+        self.assertFalse(log)
+        self.assertEqual(list(log), [])
+        log.add(category="Error", line=1)
+        self.assertTrue(log, "Errors past the limit still make the log true")
+
+    def test_error_limit(self):
+        self.assertIsNone(error_limit(None, "schema"))
+        self.assertEqual(error_limit(3, "schema"), 3)
+        self.assertEqual(error_limit({"schema": 3, "*": 10}, "schema"), 3)
+        self.assertEqual(error_limit({"schema": 3, "*": 10}, "segmonto"), 10)
+        self.assertIsNone(error_limit({"schema": 3}, "segmonto"))
+
+
+class MaxErrorsTestCase(TestCase):
+    def test_max_errors(self):
+        """ Test that each check keeps at most max_errors errors, its status still counting all of them """
+        filelog = htrvx_test_single(_document(50), group=False, max_errors=5)
+        zones, lines = filelog.tests[0], filelog.tests[1]
+        self.assertEqual(lines.message, "50 wrongly tagged lines")
+        self.assertEqual(lines.errors.total, 50)
+        self.assertEqual(len(lines.errors.records), 5)
+        self.assertEqual(lines.errors[0], "Line with id #l0 has a forbidden type (`Nope`) (line 2)")
+        self.assertEqual(lines.errors[-1], "+45 more")
+        self.assertEqual(list(zones.errors), ["Zone with id #z has a forbidden type (`Nope`) (line 1)"])
+
+    def test_max_errors_per_check(self):
+        """ Test that limits are set by check name, `*` applying to the others """
+        filelog = htrvx_test_single(_document(20), group=True, max_errors={"segmonto": 3, "*": 0})
+        self.assertEqual(list(filelog.tests[1].errors),
+                         ["`Nope` tag for line(s) is forbidden (20 annotations): #l0, #l1, #l2, +17 more"])
+        filelog = htrvx_test_single(_document(20), group=True, max_errors={"empty-verification": 3})
+        self.assertEqual(filelog.tests[1].errors.total, 20)
+        self.assertEqual(len(filelog.tests[1].errors.records), 20)
+
+    def test_export(self):
+        """ Test that logs are exported as messages, pickled as records, and equal to their export """
+        filelog = htrvx_test_single(_document(10), group=False, max_errors=2)
+        exported = json.loads(json.dumps(filelog.to_dict()))
+        self.assertEqual(exported["tests"][1]["errors"], [
+            "Line with id #l0 has a forbidden type (`Nope`) (line 2)",
+            "Line with id #l1 has a forbidden type (`Nope`) (line 3)",
+            "+8 more"
+        ])
+        self.assertEqual(FileLog.from_dict(exported), filelog)
+        self.assertEqual(pickle.loads(pickle.dumps(filelog)), filelog)
+
+    def test_cli(self):
+        """ Test that --max-errors summarizes the other errors and rejects malformed limits """
+        runner = CliRunner()
+        path = os.path.join(_data, "alto", "empty_zone.xml")
+        result = runner.invoke(cmd, ["--verbose", "--check-empty", "--no-cache", "--max-errors", "0", path])
+        self.assertIn("+1 more", result.output)
+        self.assertNotIn("is empty", result.output)
+        result = runner.invoke(cmd, ["--max-errors", "schema=x", path])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("is neither N nor CHECK=N", result.output)
@@ -0,0 +1,48 @@
+import os.path
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.testing import test as htrvx_test, test_single as htrvx_test_single
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+_working = os.path.join(_data, "working.xml")
+_failing = os.path.join(_data, "segmonto_wrong_tag.xml")
+
+
+class FailFastTestCase(TestCase):
+    def test_checks_skipped(self):
+        """ Test that costly checks are skipped once a cheaper one failed """
+        options = dict(segmonto=True, check_empty=True, check_image=True, xsd=True)
+        full = htrvx_test_single(_failing, **options)
+        short = htrvx_test_single(_failing, fail_fast=True, **options)
+        self.assertIn("schema", [status.task for status in full])
+        self.assertEqual([status.task for status in short], ["segmonto", "segmonto", "empty-verification",
+                                                             "empty-verification"])
+        self.assertEqual(full.tests[:4], short.tests, "Checks run from the cheapest")
+        self.assertEqual(htrvx_test_single(_working, fail_fast=True, **options), htrvx_test_single(_working, **options),
+                         "Passing files run every check")
+
+    def test_stop_at_first_failure(self):
+        """ Test that no file is tested after the first failing one, serially or in parallel """
+        files = [_working, _failing, _working, _failing] * 5
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                statuses, status = htrvx_test(files, jobs=jobs, fail_fast=True)
+                self.assertFalse(status)
+                self.assertEqual(list(statuses), [_working, _failing])
+
+    def test_max_failures(self):
+        statuses, status = htrvx_test([_failing, _working, _failing, _failing], max_failures=2, keep_logs=True)
+        self.assertFalse(status)
+        self.assertEqual(len(statuses), 2, "Same files are logged once")
+        self.assertEqual(list(statuses), [_failing, _working])
+
+    def test_cli(self):
+        result = CliRunner().invoke(cmd, ["--format", "alto", "--no-cache", "--segmonto", "--fail-fast", "--verbose",
+                                          _failing, _working])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Stopped after 1 failing file(s)", result.output)
+        self.assertNotIn("working.xml", result.output)
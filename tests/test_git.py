@@ -0,0 +1,90 @@
+import os.path
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.git import changed_files, GitError
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "page")
+
+
+class ChangedSinceTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.repo = os.path.realpath(self._dir.name)
+        os.makedirs(os.path.join(self.repo, "data"))
+        for name in ("working.xml", "empty_line.xml", "f33.jpeg"):
+            shutil.copy(os.path.join(_data, name), os.path.join(self.repo, "data", name))
+        self.git("init", "-q")
+        self.commit("Initial")
+
+    def git(self, *args):
+        subprocess.run(["git", "-c", "user.name=htrvx", "-c", "user.email=htrvx@example.com", *args],
+                       cwd=self.repo, check=True, capture_output=True)
+
+    def commit(self, message):
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+
+    def getFile(self, filename: str):
+        return os.path.join(self.repo, "data", filename)
+
+    def test_modified_and_untracked(self):
+        """ Test that modified, committed or not, and untracked XML files are selected """
+        self.assertEqual(changed_files("HEAD", cwd=self.repo), [], "Nothing changed")
+        with open(self.getFile("empty_line.xml"), "a") as f:
+            f.write("<!-- changed -->")
+        self.commit("Change")
+        shutil.copy(self.getFile("working.xml"), self.getFile("new.xml"))
+        self.assertEqual(
+            changed_files("HEAD~1", cwd=self.repo),
+            [self.getFile("empty_line.xml"), self.getFile("new.xml")]
+        )
+
+    def test_changed_image(self):
+        """ Test that files linking to a changed or deleted image are selected """
+        os.remove(self.getFile("f33.jpeg"))
+        self.assertEqual(
+            changed_files("HEAD", cwd=self.repo),
+            [self.getFile("empty_line.xml"), self.getFile("working.xml")],
+            "Both files link to f33.jpeg"
+        )
+
+    def test_many_images_upper_case(self):
+        """ Test that images are matched in files with an upper case extension, whatever their number """
+        shutil.move(self.getFile("working.xml"), self.getFile("WORKING.XML"))
+        for idx in range(200):
+            with open(self.getFile(f"image_{idx:03d}_{'x' * 100}.jpg"), "wb"):
+                pass
+        self.commit("Images")
+        for idx in range(200):
+            os.remove(self.getFile(f"image_{idx:03d}_{'x' * 100}.jpg"))
+        os.remove(self.getFile("f33.jpeg"))
+        self.assertEqual(
+            changed_files("HEAD", cwd=self.repo, extension=".xml"),
+            [self.getFile("WORKING.XML"), self.getFile("empty_line.xml")]
+        )
+
+    def test_unknown_ref(self):
+        with self.assertRaises(GitError):
+            changed_files("not-a-ref", cwd=self.repo)
+
+    def test_cli(self):
+        """ Test that only changed files are tested by the command line """
+        with open(self.getFile("empty_line.xml"), "a") as f:
+            f.write("<!-- changed -->")
+        cwd = os.getcwd()
+        os.chdir(self.repo)
+        self.addCleanup(os.chdir, cwd)
+        result = CliRunner().invoke(cmd, ["--format", "page", "--no-cache", "--verbose", "--check-empty",
+                                          "--raise-empty", "--changed-since", "HEAD"])
+        self.assertEqual(result.exit_code, 1, "Changed file fails")
+        self.assertIn("0/1 valid XML files", result.output, "Only the changed file is tested")
+        result = CliRunner().invoke(cmd, ["--format", "page", "--no-cache", "--changed-since", "not-a-ref"])
+        self.assertEqual(result.exit_code, 2, "Unknown reference is a usage error")
@@ -0,0 +1,144 @@
+import os.path
+import pickle
+import shutil
+import struct
+import tempfile
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.images import ImageResolver, image_size
+from htrvx.testing import test as htrvx_test, test_single as htrvx_test_single
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+
+
+def _png(width, height):
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + header
+
+
+def _jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + b"\xff" + sof + b"\xff\xd9"
+
+
+def _tiff(width, height, order="<"):
+    magic = b"II*\x00" if order == "<" else b"MM\x00*"
+    return magic + struct.pack(f"{order}IH", 8, 3) + \
+        struct.pack(f"{order}HHIHH", 254, 4, 1, 0, 0) + \
+        struct.pack(f"{order}HHIHH", 256, 3, 1, width, 0) + \
+        struct.pack(f"{order}HHII", 257, 4, 1, height)
+
+
+class ImageResolverTestCase(TestCase):
+    def test_listing_once(self):
+        """ Test that a directory is listed once for every image it holds """
+        resolver = ImageResolver()
+        with mock.patch("htrvx.images.os.listdir", wraps=os.listdir) as listdir:
+            self.assertTrue(resolver.exists(os.path.join(_data, "f33.jpeg")))
+            self.assertFalse(resolver.exists(os.path.join(_data, "FileNotFound.jpeg")))
+            self.assertTrue(resolver.exists(os.path.join(_data, "f33.jpeg")))
+            self.assertFalse(resolver.exists(os.path.join(_data, "missing", "f33.jpeg")))
+        self.assertEqual(listdir.call_count, 2, "One listing per directory")
+
+    def test_case_sensitive(self):
+        """ Test that names are compared as written, whatever the filesystem """
+        self.assertFalse(ImageResolver().exists(os.path.join(_data, "F33.JPEG")))
+
+    def test_prefetching(self):
+        """ Test that directories of the next files are listed ahead, and that test() closes its own resolver """
+        resolver = ImageResolver()
+        files = [os.path.join(_data, "working.xml"), os.path.join(os.path.dirname(_data), "page", "working.xml")]
+        with mock.patch.object(resolver, "prefetch", wraps=resolver.prefetch) as prefetch:
+            iterator = resolver.prefetching(iter(files), ahead=1)
+            self.assertEqual(next(iterator), files[0])
+            self.assertEqual(prefetch.call_count, 2, "Directory of the next file is listed ahead")
+            self.assertEqual(list(iterator), files[1:])
+        with mock.patch.object(ImageResolver, "close", autospec=True) as close:
+            htrvx_test(files[:1], check_image=True, image_resolver=resolver)
+            close.assert_not_called()
+            htrvx_test(files[:1], check_image=True)
+            close.assert_called_once()
+        resolver.close()
+
+    def test_manifest(self):
+        """ Test that a manifest replaces the filesystem """
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, "images.txt")
+            with open(manifest, "w") as f:
+                f.write("scans/a.jpg\nscans/b.jpg\n")
+            resolver = ImageResolver.from_manifest(manifest)
+            self.assertTrue(resolver.exists(os.path.join(directory, "scans", "a.jpg")))
+            self.assertTrue(resolver.exists(os.path.join(directory, "scans", "..", "scans", "b.jpg")))
+            self.assertFalse(resolver.exists(os.path.join(directory, "scans", "c.jpg")))
+            self.assertIsNotNone(resolver.fingerprint)
+            copy = pickle.loads(pickle.dumps(resolver))
+            self.assertEqual(copy.manifest, resolver.manifest, "Manifest is sent to worker processes")
+
+    def test_same_results(self):
+        """ Test that results match the default lookup """
+        resolver = ImageResolver()
+        for file in ("working.xml", "image_wronglink.xml", "image_no_link.xml"):
+            with self.subTest(file=file):
+                self.assertEqual(
+                    htrvx_test_single(os.path.join(_data, file), check_image=True, image_resolver=resolver),
+                    htrvx_test_single(os.path.join(_data, file), check_image=True)
+                )
+
+    def test_cli_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, "images.txt")
+            with open(manifest, "w") as f:
+                f.write(os.path.join(_data, "FileNotFound.jpeg") + "\n")
+            result = CliRunner().invoke(cmd, ["--format", "alto", "--no-cache", "--check-image",
+                                              "--image-manifest", manifest, os.path.join(_data, "image_wronglink.xml")])
+            self.assertEqual(result.exit_code, 0, "Image is in the manifest")
+            result = CliRunner().invoke(cmd, ["--format", "alto", "--no-cache", "--check-image",
+                                              "--image-manifest", manifest, os.path.join(_data, "working.xml")])
+            self.assertEqual(result.exit_code, 1, "Image is not in the manifest")
+
+
+class ImageSizeTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self._dir.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_headers(self):
+        """ Test that sizes are read from PNG, JPEG and TIFF headers, and that other files give None """
+        self.assertEqual(image_size(self.write("a.png", _png(1417, 2006))), (1417, 2006))
+        self.assertEqual(image_size(self.write("a.jpg", _jpeg(1417, 2006))), (1417, 2006))
+        self.assertEqual(image_size(self.write("a.tif", _tiff(1417, 2006))), (1417, 2006))
+        self.assertEqual(image_size(self.write("b.tif", _tiff(300, 70000, order=">"))), (300, 70000))
+        self.assertIsNone(image_size(self.write("empty.jpg", b"")))
+        self.assertIsNone(image_size(self.write("truncated.jpg", _jpeg(10, 10)[:12])))
+        self.assertIsNone(image_size(self.write("a.gif", b"GIF89a\x01\x00\x01\x00")))
+
+    def check(self, format, image, engine="dom"):
+        xml = os.path.join(self._dir.name, "page.xml")
+        shutil.copy(os.path.join(os.path.dirname(_data), format, "working.xml"), xml)
+        if image is not None:
+            self.write("f33.jpeg", image)
+        filelog = htrvx_test_single(xml, format=format, segmonto=False, check_empty=False, check_image_size=True,
+                                    engine=engine)
+        return [(status.task, status.status) for status in filelog][0]
+
+    def test_check(self):
+        """ Test the comparison with the size declared by ALTO and PAGE pages, with both engines """
+        for format in ("alto", "page"):
+            for engine in ("dom", "stream"):
+                with self.subTest(format=format, engine=engine):
+                    self.assertEqual(self.check(format, _jpeg(1417, 2006), engine), ("image-size-check", "success"))
+                    self.assertEqual(self.check(format, _png(2006, 1417), engine), ("image-size-check", "failure"))
+                    self.assertEqual(self.check(format, b"", engine), ("image-size-check", "warning"))
+                    os.remove(os.path.join(self._dir.name, "f33.jpeg"))
+                    self.assertEqual(self.check(format, None, engine), ("image-size-check", "failure"))
@@ -0,0 +1,25 @@
+import os.path
+import subprocess
+import sys
+from unittest import TestCase
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded(module: str, names) -> list:
+    """ Returns which of names are loaded once module is imported in a fresh interpreter """
+    code = f"import sys; loaded = set(sys.modules); import {module}; " \
+           f"print(' '.join(name for name in {list(names)!r} if name in sys.modules and name not in loaded))"
+    return subprocess.run([sys.executable, "-c", code], cwd=_root, capture_output=True, text=True,
+                          check=True).stdout.split()
+
+
+class LazyImportsTestCase(TestCase):
+    def test_library(self):
+        """ Test that testing files does not import network, multiprocessing, archive or terminal support """
+        self.assertEqual(_loaded("htrvx.testing", ["requests", "multiprocessing", "importlib.metadata", "click",
+                                                   "zipfile", "tarfile", "concurrent.futures", "logging"]), [])
+
+    def test_cli(self):
+        self.assertEqual(_loaded("htrvx.cli", ["requests", "multiprocessing", "importlib.metadata", "http.server",
+                                               "http.client", "statistics"]), [])
@@ -0,0 +1,74 @@
+import io
+import os.path
+import tempfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.inputs import iter_paths, read_file_list, walk, MissingInput
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+class InputsTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.root = self._dir.name
+        for path in ("b.xml", "a.XML", "notes.txt", "sub/c.xml", "sub/deeper/d.xml", "z/e.xml"):
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("<root/>")
+
+    def relative(self, paths):
+        return [os.path.relpath(path, self.root) for path in paths]
+
+    def test_walk(self):
+        """ Test that directories are walked recursively, in a stable order, keeping XML files only """
+        self.assertEqual(self.relative(walk(self.root)),
+                         ["a.XML", "b.xml", "sub/c.xml", "sub/deeper/d.xml", "z/e.xml"])
+
+    def test_iter_paths(self):
+        """ Test that files, directories and glob patterns can be mixed """
+        paths = iter_paths([
+            os.path.join(self.root, "b.xml"),
+            os.path.join(self.root, "sub"),
+            os.path.join(self.root, "**", "e.xml")
+        ])
+        self.assertEqual(self.relative(paths), ["b.xml", "sub/c.xml", "sub/deeper/d.xml", "z/e.xml"])
+
+    def test_iter_paths_lazy(self):
+        """ Test that files are yielded before a missing source is reached """
+        paths = iter_paths([os.path.join(self.root, "b.xml"), os.path.join(self.root, "missing.xml")])
+        self.assertEqual(self.relative([next(paths)]), ["b.xml"])
+        with self.assertRaises(MissingInput):
+            next(paths)
+
+    def test_read_file_list(self):
+        """ Test lists separated by new lines or by NUL characters, across chunks """
+        self.assertEqual(list(read_file_list(io.StringIO("a.xml\r\n\nb c.xml\nd.xml"))), ["a.xml", "b c.xml", "d.xml"])
+        self.assertEqual(list(read_file_list(io.StringIO("a.xml\0b\nc.xml\0"), chunk_size=8)), ["a.xml", "b\nc.xml"])
+        self.assertEqual(list(read_file_list(io.StringIO(""))), [])
+
+    def test_cli(self):
+        """ Test directories, patterns and --files-from in the command line """
+        alto = os.path.join(_data, "alto")
+        runner = CliRunner()
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", "-v", os.path.join(alto, "work*.xml")])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("working.xml", result.output)
+
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", "-v", "--files-from", "-"],
+                               input=os.path.join(alto, "working.xml") + "\n")
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("1/1 valid XML files", result.output)
+
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", "--segmonto", alto])
+        self.assertEqual(result.exit_code, 1, "The directory holds failing files")
+
+        result = runner.invoke(cmd, ["--format", "alto", "--no-cache", os.path.join(alto, "missing.xml")])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("does not exist", result.output)
@@ -1,7 +1,8 @@
 import os.path
+import tempfile
 from unittest import TestCase
 from click.testing import CliRunner
-from htrvx.cli import cmd
+from htrvx.cli import cmd, main
 from htrvx.testing import test_single as htrvx_test_single, test as htrvx_test
 from lxml.etree import parse
 import re
@@ -36,7 +37,9 @@ class AltoTestCase(TestCase):
             "test_data",
             type(self).FOLDER
         )
-        self._runner = CliRunner()
+        self._cache = tempfile.TemporaryDirectory()
+        self.addCleanup(self._cache.cleanup)
+        self._runner = CliRunner(env={"HTRVX_CACHE_DIR": self._cache.name})
         self._format = type(self).FOLDER
 
     def cmd(self, *args):
@@ -405,6 +408,58 @@ class AltoTestCase(TestCase):
         for f in file:
             f.close()
 
+    def test_jobs_match_serial(self):
+        """ Test that a parallel run returns the same results, in the same order, as a serial one """
+        files = [self.getFile(name) for name in ("working.xml", "empty_line.xml", "segmonto_wrong_tag.xml")]
+        options = dict(segmonto=True, group=True, check_empty=True, raise_empty=True, xsd=True, format=self.FOLDER)
+        serial, serial_status = htrvx_test(files, **options)
+        parallel, parallel_status = htrvx_test(files, jobs=2, **options)
+        self.assertEqual(list(serial), list(parallel), "Files are in the same order")
+        self.assertEqual(dict(serial), dict(parallel), "Logs are the same")
+        self.assertEqual(serial_status, parallel_status, "Global status is the same")
+
+    def test_jobs_cli(self):
+        """ Test that verbose output keeps the order of files with --jobs """
+        result = self.cmd("--verbose", "--segmonto", "--jobs", "2",
+                          self.getFile("segmonto_wrong_tag.xml"), self.getFile("working.xml"))
+        self.assertEqual(result.exit_code, 1, "Test fails")
+        self.assertLess(result.output.index("segmonto_wrong_tag.xml"), result.output.index("working.xml"),
+                        "Files are printed in the original order")
+        self.assertIn("1/2 valid XML files", result.output, "One file does not pass")
+
+    def test_auto_format(self):
+        """ Test that the format is detected from the namespace, including in mixed corpora """
+        other = os.path.join(os.path.dirname(self._folder), "page" if self.FOLDER == "alto" else "alto")
+        for engine in ("dom", "stream"):
+            result = self.cmd("--verbose", "--segmonto", "--check-empty", "--format", "auto", "--engine", engine,
+                              self.getFile("working.xml"), os.path.join(other, "working.xml"))
+            self.assertEqual(result.exit_code, 0, "Test passes")
+            self.assertIn("2/2 valid XML files", result.output, "Both formats are validated")
+
+    def test_auto_format_unknown(self):
+        """ Test that a file in an unknown namespace fails with auto format """
+        xsd = os.path.join(os.path.dirname(__file__), "..", "htrvx", "schemas", "alto4.xsd")
+        log = htrvx_test_single(xsd, format="auto", segmonto=True)
+        self.assertEqual(log.status, False, "Test fails")
+        self.assertEqual([status.task for status in log], ["format-detection"], "Only detection is reported")
+
 
 class PageTestCase(AltoTestCase):
     FOLDER = "page"
+
+
+class MainTestCase(TestCase):
+    def test_help(self):
+        """ Test that the help of htrvx lists its commands, while files still go to `htrvx check` """
+        runner = CliRunner()
+        for option in ("--help", "-h"):
+            with self.subTest(option=option):
+                result = runner.invoke(main, [option])
+                self.assertEqual(result.exit_code, 0)
+                for command in ("check", "checks", "client", "schemas", "serve"):
+                    self.assertIn(f"  {command} ", result.output)
+        result = runner.invoke(main, ["check", "--help"])
+        self.assertIn("--segmonto", result.output)
+        result = runner.invoke(main, ["--no-cache", os.path.join(os.path.dirname(__file__), "test_data", "alto",
+                                                                 "working.xml")])
+        self.assertEqual(result.exit_code, 0)
@@ -0,0 +1,28 @@
+import io
+import threading
+from unittest import TestCase
+
+from htrvx.parsing import get_parser, parse
+
+
+class SharedParserTestCase(TestCase):
+    def test_reused_per_thread(self):
+        """ Test that a thread reuses its parser, and that threads and options get their own """
+        self.assertIs(get_parser(), get_parser())
+        self.assertIsNot(get_parser(), get_parser(huge_tree=True))
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_parser()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], get_parser())
+
+    def test_lean_tree(self):
+        """ Test that blank text, comments and processing instructions are dropped, but not text content """
+        tree = parse(io.BytesIO(
+            b"<?xml version='1.0'?><root>\n  <!-- note --><?pi data?>\n  <a> </a><b>text</b>\n</root>"
+        ))
+        root = tree.getroot()
+        self.assertEqual([child.tag for child in root], ["a", "b"])
+        self.assertIsNone(root.text, "Blank text between elements is dropped")
+        self.assertEqual(root[0].text, " ", "Blank content of an element is kept")
+        self.assertEqual(root[1].text, "text")
@@ -0,0 +1,61 @@
+import json
+import os.path
+import tempfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+from lxml import etree
+
+from htrvx.cli import cmd
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+
+
+class ReportTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.output = os.path.join(self._dir.name, "report")
+
+    def run_report(self, kind):
+        result = CliRunner().invoke(cmd, [
+            "--format", "alto", "--no-cache", "--segmonto", "--check-empty", "--group",
+            "--report", kind, "--output", self.output,
+            os.path.join(_data, "working.xml"), os.path.join(_data, "segmonto_wrong_tag.xml")
+        ])
+        self.assertEqual(result.exit_code, 1, "Second file fails")
+        with open(self.output) as f:
+            return f.read()
+
+    def test_jsonl(self):
+        """ Test that each file gets a JSON line with its structured tests """
+        lines = [json.loads(line) for line in self.run_report("jsonl").splitlines()]
+        self.assertEqual([line["file"] for line in lines],
+                         [os.path.join(_data, "working.xml"), os.path.join(_data, "segmonto_wrong_tag.xml")])
+        self.assertEqual([line["status"] for line in lines], [True, False])
+        failing = [test for test in lines[1]["tests"] if test["status"] == "failure"]
+        self.assertEqual(failing[0]["task"], "segmonto")
+        self.assertIn("`WrongZoneType` tag for zone(s) is forbidden (1 annotations): #incorrect_zone",
+                      failing[0]["errors"])
+        self.assertNotIn("\033", self.run_report("jsonl"), "No terminal escape codes")
+
+    def test_verbose_stdout(self):
+        """ Test that the verbose output does not mix with a report written to the standard output """
+        result = CliRunner().invoke(cmd, [
+            "--format", "alto", "--no-cache", "--segmonto", "--verbose", "--report", "jsonl",
+            os.path.join(_data, "working.xml"), os.path.join(_data, "segmonto_wrong_tag.xml")
+        ])
+        self.assertEqual(result.exit_code, 1)
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual([line["status"] for line in lines], [True, False])
+        self.assertIn("1/2 valid XML files", result.stderr)
+
+    def test_junit(self):
+        """ Test that the JUnit report has one testsuite per file with failures """
+        report = etree.fromstring(self.run_report("junit").encode())
+        suites = report.findall("testsuite")
+        self.assertEqual(len(suites), 2)
+        self.assertEqual([suite.get("failures") for suite in suites], ["0", "2"])
+        self.assertEqual(len(suites[1].findall("testcase/failure")), 2, "Zone and line typing fail")
+        self.assertEqual(suites[1].find("testcase").get("name"), "segmonto[zone]")
@@ -0,0 +1,94 @@
+import os.path
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.sampling import draw_sample, parse_sample_size, wilson_interval, SampleEstimate, InvalidSampleSize, \
+    AnyCheck
+from htrvx.testing import FileLog, Status
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def _filelog(*failed: bool) -> FileLog:
+    filelog = FileLog()
+    for failure in failed:
+        filelog.append(Status("failure" if failure else "success", task="segmonto"))
+    return filelog
+
+
+class SampleSizeTestCase(TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_sample_size("10"), 10)
+        self.assertEqual(parse_sample_size("12.5%"), 0.125)
+        for value in ("0", "-3", "0%", "150%", "ten", "1.5"):
+            with self.subTest(value=value):
+                with self.assertRaises(InvalidSampleSize):
+                    parse_sample_size(value)
+
+
+class DrawSampleTestCase(TestCase):
+    def setUp(self):
+        self.paths = [f"big/{idx}.xml" for idx in range(80)] + [f"small/{idx}.xml" for idx in range(20)]
+
+    def test_reproducible(self):
+        """ Test that the same seed draws the same files, whatever the order of paths """
+        sample = draw_sample(self.paths, 10, seed=4)
+        self.assertEqual(sample, draw_sample(list(reversed(self.paths)), 10, seed=4))
+        self.assertNotEqual(sample.files, draw_sample(self.paths, 10, seed=5).files)
+        self.assertIsInstance(draw_sample(self.paths, 10).seed, int, "Random seeds are returned")
+
+    def test_stratified(self):
+        """ Test that directories get their share of the sample """
+        sample = draw_sample(self.paths, 0.1, seed=1)
+        self.assertEqual(len(sample.files), 10)
+        self.assertEqual(sum(path.startswith("small/") for path in sample.files), 2)
+        self.assertEqual(sample.strata, {"big": 80, "small": 20})
+        self.assertEqual(len(set(sample.files)), 10)
+
+    def test_bounds(self):
+        self.assertEqual(sorted(draw_sample(self.paths, 1000, seed=1).files), sorted(self.paths))
+        self.assertEqual(len(draw_sample(self.paths, 0.001, seed=1).files), 1, "At least one file")
+        self.assertEqual(draw_sample([], 0.5, seed=1).files, [])
+
+
+class SampleEstimateTestCase(TestCase):
+    def test_wilson(self):
+        low, high = wilson_interval(0.0, 20, 1.96)
+        self.assertEqual(low, 0.0)
+        self.assertAlmostEqual(high, 0.161, places=3)
+        self.assertEqual(wilson_interval(0.5, 10, 0.0), (0.5, 0.5))
+
+    def test_weighted_rate(self):
+        """ Test that files weigh the size of their directory """
+        paths = [f"big/{idx}.xml" for idx in range(90)] + [f"small/{idx}.xml" for idx in range(10)]
+        sample = draw_sample(paths, 20, seed=2)
+        estimate = SampleEstimate(sample)
+        for path in sample.files:
+            estimate.add(path, _filelog(path.startswith("small/")))
+        rate = estimate.rate("segmonto")
+        self.assertEqual((rate.failures, rate.tested), (2, 20))
+        self.assertAlmostEqual(rate.rate, 0.1)
+        self.assertLess(rate.low, 0.1)
+        self.assertGreater(rate.high, 0.1)
+        self.assertEqual(estimate.rates()[0].task, AnyCheck)
+
+    def test_whole_corpus(self):
+        """ Test that there is no uncertainty left when every file was tested """
+        paths = [f"dir/{idx}.xml" for idx in range(8)]
+        estimate = SampleEstimate(draw_sample(paths, 8, seed=0))
+        for idx, path in enumerate(paths):
+            estimate.add(path, _filelog(idx < 2))
+        rate = estimate.rate(AnyCheck)
+        self.assertEqual((rate.rate, rate.low, rate.high), (0.25, 0.25, 0.25))
+
+    def test_cli(self):
+        args = ["--format", "auto", "--segmonto", "--no-cache", "--sample", "25%", "--seed", "7", _data]
+        result = CliRunner().invoke(cmd, args)
+        self.assertIn("6 of 24 file(s) sampled from 2 director(y/ies) with --seed 7", result.output)
+        self.assertIn("segmonto", result.output)
+        self.assertEqual(result.output, CliRunner().invoke(cmd, args).output, "Same seed, same sample")
+        result = CliRunner().invoke(cmd, ["--sample", "lots", _data])
+        self.assertEqual(result.exit_code, 2)
@@ -0,0 +1,168 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from htrvx.cli import main
+from htrvx.schemas import SchemaCache, Schemas, Validator, SchemaStore, SchemaNotFound, _schema_documents
+from htrvx.schemas.store import KnownSchemas
+from htrvx.cache import ResultCache
+from htrvx.testing import test as htrvx_test, test_single as htrvx_test_single
+
+
+class SchemaCacheTestCase(TestCase):
+    def test_compiled_once(self):
+        """ Test that a schema is compiled once, whatever the way it is referenced """
+        cache = SchemaCache()
+        first = Validator("alto", cache=cache)
+        second = Validator(Schemas["alto"], cache=cache)
+        self.assertIs(first.xmlschema, second.xmlschema, "Compiled schema is shared")
+        self.assertEqual(cache.stats()["misses"], 1, "Schema is compiled once")
+        self.assertEqual(cache.stats()["hits"], 1, "Second access is a hit")
+
+    def test_eviction_and_clear(self):
+        """ Test that the least recently used schema is evicted and that clear() empties the cache """
+        cache = SchemaCache(maxsize=1)
+        cache.get("alto")
+        cache.get("page")
+        self.assertNotIn("alto", cache, "Oldest schema is evicted")
+        self.assertIn("page", cache, "Newest schema is kept")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0, "Cache is empty")
+        self.assertEqual(cache.stats()["misses"], 0, "Stats are reset")
+
+
+class SchemaStoreTestCase(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.store = SchemaStore(self._dir.name)
+        patcher = mock.patch.dict(os.environ, {"HTRVX_OFFLINE": "1", "HTRVX_SCHEMA_DIR": self._dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sync_offline(self):
+        """ Test that known schemas and their imports are stored from the copies shipped with HTRVX """
+        stored = self.store.sync()
+        self.assertIn("http://www.loc.gov/standards/xlink/xlink.xsd", stored, "Imports are stored")
+        self.assertEqual(len(self.store.entries()), len(KnownSchemas) + 1)
+        self.assertEqual(self.store.verify(), [])
+
+    def test_add_from_file(self):
+        """ Test that a local copy is stored with its relative includes, and found by get_schema() """
+        main, included = os.path.join(self._dir.name, "main.src"), os.path.join(self._dir.name, "types.src")
+        with open(included, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"/>')
+        with open(main, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"><xs:include schemaLocation="types.xsd"/>'
+                    '</xs:schema>')
+        with self.assertRaises(SchemaNotFound, msg="The include is neither stored nor reachable offline"):
+            self.store.add("https://example.org/schemas/main.xsd", source=main)
+        self.store.add("https://example.org/schemas/types.xsd", source=included)
+        self.store.add("https://example.org/schemas/main.xsd", source=main)
+        self.assertEqual(self.store.verify(), [])
+        self.assertEqual(Validator.get_schema("http://example.org/schemas/main.xsd"),
+                         self.store.path("https://example.org/schemas/main.xsd"), "Scheme does not matter")
+        with self.assertRaises(SchemaNotFound):
+            Validator.get_schema("https://example.org/schemas/unknown.xsd")
+
+    def test_relative_include(self):
+        """ Test that includes of a stored schema are resolved against its URL, not the directory of the store """
+        main, included = os.path.join(self._dir.name, "main.src"), os.path.join(self._dir.name, "types.src")
+        namespace = 'xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:test"'
+        with open(included, "w") as f:
+            f.write(f'<xs:schema {namespace}><xs:element name="root"/></xs:schema>')
+        with open(main, "w") as f:
+            f.write(f'<xs:schema {namespace}><xs:include schemaLocation="sub/types.xsd"/></xs:schema>')
+        self.store.add("https://example.org/schemas/sub/types.xsd", source=included)
+        self.store.add("https://example.org/schemas/main.xsd", source=main)
+        path = os.path.join(self._dir.name, "included.xml")
+        with open(path, "w") as f:
+            f.write('<root xmlns="urn:test" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                    'xsi:schemaLocation="urn:test https://example.org/schemas/main.xsd"/>')
+        filelog = htrvx_test_single(path, format="alto", xsd=True, segmonto=False, check_empty=False)
+        self.assertEqual(filelog.tests[-1].task, "schema")
+        self.assertEqual(filelog.tests[-1].status, "success", filelog.tests[-1].message)
+
+    def test_missing_offline(self):
+        """ Test that a schema missing from the store offline fails its file rather than the run """
+        path = os.path.join(self._dir.name, "unknown_schema.xml")
+        with open(path, "w") as f:
+            f.write('<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#" '
+                    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                    'xsi:schemaLocation="http://www.loc.gov/standards/alto/ns-v4# http://example.org/none.xsd"/>')
+        filelog = htrvx_test_single(path, xsd=True, segmonto=False, check_empty=False)
+        self.assertEqual(filelog.tests[-1].status, "failure")
+        self.assertEqual(filelog.tests[-1].task, "schema")
+        self.assertIn("http://example.org/none.xsd is not in the schema store", filelog.tests[-1].message)
+        working = os.path.join(os.path.dirname(__file__), "test_data", "alto", "working.xml")
+        result = CliRunner().invoke(main, ["--no-cache", "--xsd", "--verbose", working, path])
+        self.assertIsInstance(result.exception, SystemExit, "The run goes on")
+        self.assertEqual(result.exit_code, 1)
+
+        # Once the schema is stored, a cached failure is not reused
+        cache = ResultCache(os.path.join(self._dir.name, "cache"))
+        _, status = htrvx_test([path], xsd=True, segmonto=False, check_empty=False, cache=cache)
+        self.assertFalse(status)
+        source = os.path.join(self._dir.name, "none.src")
+        with open(source, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+                    'targetNamespace="http://www.loc.gov/standards/alto/ns-v4#"><xs:element name="alto"/></xs:schema>')
+        self.store.add("http://example.org/none.xsd", source=source)
+        _, status = htrvx_test([path], xsd=True, segmonto=False, check_empty=False, cache=cache)
+        self.assertTrue(status, "The stored schema is used")
+        self.assertIn("1/2 valid XML files", result.output)
+
+    def test_missing_import(self):
+        """ Test that a schema whose import can't be resolved offline fails its file rather than the run """
+        schema, path = os.path.join(self._dir.name, "main.xsd"), os.path.join(self._dir.name, "missing_import.xml")
+        with open(schema, "w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+                    'targetNamespace="http://www.loc.gov/standards/alto/ns-v4#">'
+                    '<xs:import namespace="urn:other" schemaLocation="http://example.org/missing.xsd"/>'
+                    '<xs:element name="alto"/></xs:schema>')
+        with open(path, "w") as f:
+            f.write('<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#" '
+                    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                    f'xsi:schemaLocation="http://www.loc.gov/standards/alto/ns-v4# {schema}"/>')
+        filelog = htrvx_test_single(path, xsd=True, segmonto=False, check_empty=False)
+        self.assertEqual(filelog.tests[-1].status, "failure")
+        self.assertEqual(filelog.tests[-1].task, "schema")
+        self.assertIn("http://example.org/missing.xsd", filelog.tests[-1].message)
+        working = os.path.join(os.path.dirname(__file__), "test_data", "alto", "working.xml")
+        result = CliRunner().invoke(main, ["--no-cache", "--xsd", "--verbose", path, working])
+        self.assertIsInstance(result.exception, SystemExit, "The run goes on")
+        self.assertIn("1/2 valid XML files", result.output)
+
+    def test_verify(self):
+        """ Test that modified and missing files are reported """
+        self.store.sync(["http://www.loc.gov/standards/alto/v4/alto-4-2.xsd"])
+        with open(self.store.path("http://www.loc.gov/standards/alto/v4/alto-4-2.xsd"), "a") as f:
+            f.write("<!-- modified -->")
+        os.remove(self.store.path("http://www.loc.gov/standards/xlink/xlink.xsd"))
+        self.assertEqual(len(self.store.verify()), 2)
+
+    def test_cli(self):
+        runner = CliRunner()
+        result = runner.invoke(main, ["schemas", "--store", self._dir.name, "sync"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(main, ["schemas", "--store", self._dir.name, "list"])
+        self.assertIn("alto-4-2.xsd", result.output)
+        result = runner.invoke(main, ["schemas", "--store", self._dir.name, "verify"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(main, ["--format", "alto", "--no-cache", "--xsd",
+                                      os.path.join(os.path.dirname(__file__), "test_data", "alto", "working.xml")])
+        self.assertEqual(result.exit_code, 0, "Files are checked without the check subcommand")
+
+
+class CacheResolverTestCase(TestCase):
+    def test_imports_read_once(self):
+        """ Test that imported schemas are read once per process and then resolved from memory """
+        xlink = "http://www.loc.gov/standards/xlink/xlink.xsd"
+        SchemaCache().get("alto")
+        self.assertIn(xlink, _schema_documents, "Import is kept in memory")
+        with mock.patch("htrvx.schemas.open", side_effect=AssertionError("File read again")):
+            schema = SchemaCache().get("alto")
+        self.assertIsNotNone(schema)
@@ -0,0 +1,120 @@
+import json
+import os.path
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from htrvx.cli import main
+from htrvx.cache import ResultCache, PeriodicPrune
+from htrvx.client import Client, ClientError
+from htrvx.server import Validation, BadRequest, make_server
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+_working = os.path.join(_data, "working.xml")
+_failing = os.path.join(_data, "segmonto_wrong_tag.xml")
+
+
+class ServerTestCase(TestCase):
+    def start(self, **kwargs):
+        server = make_server(Validation({"segmonto": {"segmonto": True}}), **kwargs)
+        thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.addCleanup(stop)
+        return server
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.socket = os.path.join(self.directory, "htrvx.sock")
+        self.start(socket_path=self.socket)
+        self.client = Client(socket_path=self.socket, timeout=30)
+
+    def test_validate(self):
+        """ Test requests by path and by payload, which get the same statuses """
+        self.assertEqual(self.client.health(), {"status": "ok", "profiles": ["default", "segmonto"]})
+        result = self.client.validate(path=_failing, profile="segmonto")
+        self.assertEqual(result["name"], _failing)
+        self.assertFalse(result["status"])
+        self.assertEqual([status["task"] for status in result["tests"]], ["segmonto", "segmonto"])
+        with open(_failing) as f:
+            payload = self.client.validate(xml=f.read(), name="page.xml", profile="segmonto")
+        self.assertEqual(payload["tests"], result["tests"])
+        self.assertEqual(payload["name"], "page.xml")
+        self.assertTrue(self.client.validate(path=_failing, options={"segmonto": False, "xsd": True})["status"])
+
+    def test_concurrent_schema_errors(self):
+        """ Test that concurrent requests validated against the same schema each get the errors of their document """
+        with open(_working) as f:
+            xml = f.read()
+        results = {}
+
+        def validate(idx):
+            for run in range(5):
+                payload = xml.replace("<Description>", f"<Description><Wrong{idx}x{run}/>", 1)
+                results[idx, run] = self.client.validate(xml=payload, options={"segmonto": False, "xsd": True})
+
+        threads = [threading.Thread(target=validate, args=(idx, )) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 40)
+        for (idx, run), result in results.items():
+            with self.subTest(idx=idx, run=run):
+                errors = result["tests"][-1]["errors"]
+                self.assertTrue(errors)
+                self.assertTrue(all(f"Wrong{idx}x{run}" in error for error in errors), errors)
+
+    def test_errors(self):
+        for kwargs, message in (({"path": _failing, "profile": "nope"}, "Unknown profile `nope`"),
+                                ({"path": _failing, "options": {"jobs": 2}}, "Unknown option(s): jobs"),
+                                ({"path": os.path.join(_data, "missing.xml")}, "is not a file"),
+                                ({"xml": "<alto"}, "payload")):
+            with self.subTest(message=message):
+                with self.assertRaises(ClientError) as context:
+                    self.client.validate(**kwargs)
+                self.assertIn(message, str(context.exception))
+        with self.assertRaises(ClientError):
+            Client(socket_path=os.path.join(self.directory, "none.sock")).health()
+        with self.assertRaises(BadRequest):
+            Validation({"broken": {"verbose": True}})
+
+    def test_cache_not_pruned_by_requests(self):
+        """ Test that requests use the cache without pruning it, which PeriodicPrune does on a timer """
+        cache = ResultCache(os.path.join(self.directory, "cache"))
+        validation = Validation(cache=cache)
+        with mock.patch.object(ResultCache, "prune") as prune:
+            validation.validate({"path": _working})
+            validation.validate({"path": _working})
+            self.assertEqual(cache.stats()[0], 1)
+            prune.assert_not_called()
+            pruner = PeriodicPrune(cache, interval=0.01).start()
+            pruner._stop.wait(0.1)
+            self.assertTrue(prune.called, "Pruned on the timer")
+            prune.reset_mock()
+            pruner.stop()
+            prune.assert_called_once_with()
+
+    def test_tcp(self):
+        server = self.start(host="127.0.0.1", port=0)
+        client = Client(port=server.server_address[1], timeout=30)
+        self.assertTrue(client.validate(path=_working, profile="segmonto")["status"])
+
+    def test_cli(self):
+        result = CliRunner().invoke(main, ["client", "--socket", self.socket, "--profile", "segmonto",
+                                           _working, _failing])
+        self.assertEqual(result.exit_code, 1)
+        results = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([(result["name"], result["status"]) for result in results],
+                         [(_working, True), (_failing, False)])
+        result = CliRunner().invoke(main, ["client", "--socket", self.socket, "--payload", _working])
+        self.assertEqual(result.exit_code, 0)
@@ -0,0 +1,76 @@
+import os.path
+import tempfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+
+from htrvx.cli import cmd
+from htrvx.cache import ResultCache
+from htrvx.testing import test as htrvx_test, test_single as htrvx_test_single
+from htrvx.timings import TimingReport, add_hook, remove_hook
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+
+
+class TimingsTestCase(TestCase):
+    def test_off_by_default(self):
+        """ Test that nothing is measured without timings """
+        filelog = htrvx_test_single(os.path.join(_data, "working.xml"), xsd=True, check_image=True)
+        self.assertIsNone(filelog.timings)
+        self.assertIsNone(filelog.duration)
+        self.assertTrue(all(status.duration is None for status in filelog))
+
+    def test_phases(self):
+        """ Test that each phase and each check gets a duration """
+        for engine in ("dom", "stream"):
+            with self.subTest(engine=engine):
+                filelog = htrvx_test_single(os.path.join(_data, "working.xml"), xsd=True, check_image=True,
+                                            engine=engine, timings=True)
+                self.assertEqual(set(filelog.timings), {"parse", "image-link-check", "zones-and-lines", "schema"})
+                self.assertAlmostEqual(filelog.duration, sum(filelog.timings.values()))
+                for status in filelog:
+                    self.assertIsNotNone(status.duration, status.task)
+                    self.assertGreaterEqual(status.duration, 0)
+
+    def test_same_results(self):
+        """ Test that timings do not change results """
+        options = dict(xsd=True, check_image=True, group=True)
+        for file in ("working.xml", "segmonto_wrong_tag.xml"):
+            with self.subTest(file=file):
+                plain = htrvx_test_single(os.path.join(_data, file), **options)
+                timed = htrvx_test_single(os.path.join(_data, file), timings=True, **options)
+                for status in timed:
+                    status.duration = None
+                timed.timings = None
+                self.assertEqual(plain, timed)
+
+    def test_hooks_and_report(self):
+        """ Test that hooks and the timing report receive every file, skipping the cache """
+        received = []
+
+        def hook(name, timings):
+            received.append((name, timings))
+
+        files = [os.path.join(_data, "working.xml"), os.path.join(_data, "segmonto_wrong_tag.xml")]
+        report = TimingReport(slowest=1)
+        add_hook(hook)
+        self.addCleanup(remove_hook, hook)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            htrvx_test(files, cache=cache)
+            htrvx_test(files, cache=cache, timing_report=report)
+        self.assertEqual([name for name, _ in received], files, "Untimed run does not call hooks")
+        self.assertEqual(report.files, 2)
+        self.assertEqual(len(report.slowest_files()), 1)
+        self.assertIn("parse", report.totals)
+
+    def test_cli(self):
+        result = CliRunner().invoke(cmd, [
+            "--format", "alto", "--no-cache", "--segmonto", "--timings", "--slowest", "1",
+            os.path.join(_data, "working.xml"), os.path.join(_data, "segmonto_wrong_tag.xml")
+        ])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("TIMINGS", result.output)
+        self.assertIn("zones-and-lines", result.output)
+        self.assertIn("Slowest files:", result.output)
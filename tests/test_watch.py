@@ -0,0 +1,72 @@
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from htrvx.cache import ResultCache
+from htrvx.cli import cmd
+from htrvx.watch import Watcher, watch
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data", "alto")
+_working = os.path.join(_data, "working.xml")
+_failing = os.path.join(_data, "segmonto_wrong_tag.xml")
+
+
+class WatchTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.makedirs(os.path.join(self.directory, "sub"))
+        self.first = os.path.join(self.directory, "first.xml")
+        self.second = os.path.join(self.directory, "sub", "second.xml")
+        shutil.copy(_working, self.first)
+        shutil.copy(_working, self.second)
+
+    def test_poll(self):
+        """ Test that only added, modified and removed files are reported after the first poll """
+        watcher = Watcher([self.directory])
+        self.assertEqual(sorted(watcher.poll()[0]), sorted([self.first, self.second]))
+        self.assertEqual(watcher.poll(), ([], []))
+        shutil.copy(_failing, self.second)
+        third = os.path.join(self.directory, "third.xml")
+        shutil.copy(_working, third)
+        os.remove(self.first)
+        changed, removed = watcher.poll()
+        self.assertEqual(sorted(changed), sorted([self.second, third]))
+        self.assertEqual(removed, [self.first])
+
+    def test_validate(self):
+        """ Test that statuses are updated file by file """
+        watcher = Watcher([self.directory])
+        watcher.validate(watcher.poll()[0], segmonto=True, format="alto")
+        self.assertEqual(watcher.summary(), "2/2 valid XML files")
+        shutil.copy(_failing, self.second)
+        watcher.validate(watcher.poll()[0], segmonto=True, format="alto")
+        self.assertEqual(watcher.failing, [self.second])
+        os.remove(self.second)
+        watcher.poll()
+        self.assertEqual(watcher.summary(), "1/1 valid XML files")
+
+    def test_watch(self):
+        watcher = watch([self.directory], interval=0.01, rounds=3, segmonto=True, format="alto")
+        self.assertEqual(watcher.summary(), "2/2 valid XML files")
+
+    def test_watch_prunes_on_exit(self):
+        """ Test that rounds do not prune the cache, which is pruned once on exit """
+        cache = ResultCache(os.path.join(self.directory, "cache"))
+        with mock.patch.object(ResultCache, "prune") as prune:
+            watch([self.directory], interval=0.01, rounds=3, segmonto=True, format="alto", cache=cache)
+        prune.assert_called_once_with()
+
+    def test_cli(self):
+        result = CliRunner().invoke(cmd, ["--watch", self.directory, _working])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("--watch can't be combined", result.output)
+        for option in (["--jobs", "2"], ["--fail-fast"], ["--max-failures", "3"], ["--timings"], ["--clear-cache"]):
+            with self.subTest(option=option[0]):
+                result = CliRunner().invoke(cmd, ["--watch", self.directory, *option])
+                self.assertEqual(result.exit_code, 2)
+                self.assertIn("--watch can't be combined", result.output)
@@ -0,0 +1,158 @@
+import glob
+import os.path
+from unittest import TestCase
+
+from lxml import etree
+
+from htrvx.testing import test_single as htrvx_test_single
+from htrvx.zones import AltoXML, PageXML, SegmontoZoneRegex, SegmontoLineRegex, UnknownFormat, \
+    sniff_namespace, detect_format
+
+
+_data = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def _reference_elements(obj, check_empty):
+    """ Zones and lines found with one wildcard query per element, as done before the single walk """
+    xml = obj.xml
+    if isinstance(obj, PageXML):
+        def line_content(line):
+            unicode = line.find(".//{*}Unicode")
+            return unicode is not None and bool((unicode.text or "").strip())
+        zones = [(el, "id", obj._parse_custom(el.get("custom", ""))) for el in xml.findall(".//{*}TextRegion")]
+        lines = [(el, "id", obj._parse_custom(el.get("custom", ""))) for el in xml.findall(".//{*}TextLine")]
+    else:
+        def line_content(line):
+            string = line.find("{*}String")
+            return string is not None and bool(string.attrib["CONTENT"].strip())
+        zones = [
+            (el, "ID", obj._parse_tagrefs(el.get("TAGREFS", "")))
+            for name in AltoXML._Regions
+            for el in xml.findall(f"./{{*}}Layout/{{*}}Page/{{*}}PrintSpace/{{*}}{name}")
+        ]
+        lines = [(el, "ID", obj._parse_tagrefs(el.get("TAGREFS", ""))) for el in xml.findall(".//{*}TextLine")]
+    return (
+        [(el.get(id_attr, "UnknownID"), category, check_empty and el.find(".//{*}TextLine") is not None)
+         for el, id_attr, category in zones],
+        [(el.get(id_attr, "UnknownID"), category, check_empty and line_content(el))
+         for el, id_attr, category in lines]
+    )
+
+
+class StreamingEngineTestCase(TestCase):
+    FOLDER = "alto"
+    CLS = AltoXML
+
+    def getFiles(self):
+        return sorted(glob.glob(os.path.join(_data, type(self).FOLDER, "*.xml")))
+
+    def test_walk_matches_wildcard_queries(self):
+        """ Test that the single walk finds the same zones and lines as one wildcard query per element """
+        for file in self.getFiles():
+            obj = self.CLS(etree.parse(file))
+            for check_empty in (True, False):
+                self.assertEqual(
+                    tuple(
+                        [(el.id, el.category, el.has_content) for el in elements]
+                        for elements in obj._collect(check_empty)
+                    ),
+                    _reference_elements(obj, check_empty),
+                    f"Walk gives the same elements for {file}"
+                )
+
+    def test_same_results_as_dom(self):
+        """ Test that the streaming engine finds the same zones, lines, errors and image links as the DOM """
+        for file in self.getFiles():
+            dom, stream = self.CLS(file), self.CLS(file, stream=True)
+            for check_empty in (True, False):
+                self.assertEqual(
+                    list(dom.get_zones(check_empty=check_empty)), list(stream.get_zones(check_empty=check_empty)),
+                    f"Zones are the same in {file}"
+                )
+                self.assertEqual(
+                    list(dom.get_textlines(check_empty=check_empty)),
+                    list(stream.get_textlines(check_empty=check_empty)),
+                    f"Lines are the same in {file}"
+                )
+            options = dict(check_empty=True, check_typing=True, allow_untagged="zone",
+                           typing_check_zones=SegmontoZoneRegex, typing_check_lines=SegmontoLineRegex)
+            self.assertEqual(dom.test(**options), stream.test(**options), f"Results are the same in {file}")
+            self.assertEqual(dom.check_image_link(file), stream.check_image_link(file),
+                             f"Image links are the same in {file}")
+
+    def test_same_filelog(self):
+        """ Test that test_single gives the same log with both engines """
+        for file in self.getFiles():
+            options = dict(segmonto=True, check_empty=True, check_image=True, xsd=True, format=self.FOLDER)
+            self.assertEqual(
+                htrvx_test_single(file, **options), htrvx_test_single(file, engine="stream", **options),
+                f"Logs are the same for {file}"
+            )
+
+    def test_iterparse_releases_lines(self):
+        """ Test that lines are emitted before the end of their zone """
+        stream = self.CLS(os.path.join(_data, type(self).FOLDER, "working.xml"), stream=True)
+        elements = list(stream.iterparse(os.path.join(_data, type(self).FOLDER, "working.xml")))
+        self.assertEqual(elements[0].tagname, "Line", "First line comes before its zone")
+        self.assertIn("Region", [element.tagname for element in elements])
+
+
+class PageStreamingEngineTestCase(StreamingEngineTestCase):
+    FOLDER = "page"
+    CLS = PageXML
+
+
+class FormatDetectionTestCase(TestCase):
+    def test_detect_format(self):
+        """ Test that format and version are read from the namespace """
+        self.assertEqual(detect_format("http://www.loc.gov/standards/alto/ns-v2#"), ("alto", "2"))
+        self.assertEqual(detect_format("http://www.loc.gov/standards/alto/ns-v4#"), ("alto", "4"))
+        self.assertEqual(
+            detect_format("http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"),
+            ("page", "2013-07-15")
+        )
+        with self.assertRaises(UnknownFormat):
+            detect_format("http://www.tei-c.org/ns/1.0")
+        with self.assertRaises(UnknownFormat):
+            detect_format(None)
+
+    def test_sniff_rewinds(self):
+        """ Test that sniffing an opened file leaves it ready to be parsed """
+        with open(os.path.join(_data, "page", "working.xml"), "rb") as f:
+            self.assertTrue(sniff_namespace(f).startswith("http://schema.primaresearch.org/"))
+            self.assertEqual(f.tell(), 0, "File is rewound")
+            self.assertEqual(etree.parse(f).getroot().tag.rpartition("}")[2], "PcGts")
+
+
+def _reference_parse_custom(attribute_string):
+    """ Former parser of PAGE custom attributes """
+    annotations = {}
+    annotations_chunks = [chunk for chunk in attribute_string.strip().split('}') if chunk.strip() and "{" in chunk]
+    for chunk in annotations_chunks:
+        tag, vals = chunk.split('{')
+        tag_vals = {}
+        for val in [val.strip() for val in vals.split(';') if val.strip()]:
+            key, *val = val.split(':')
+            tag_vals[key] = ":".join(val)
+        annotations[tag.strip()] = tag_vals
+    return annotations.get("structure", {}).get("type", None)
+
+
+class CategoryResolutionTestCase(TestCase):
+    def test_custom_same_as_reference(self):
+        """ Test that the memoized custom parser gives the same categories as the former one """
+        for custom in [
+            "", "readingOrder {index:3;}", "readingOrder {index:3;} structure {type:DefaultLine;}",
+            "structure {type:MainZone:column#1;}", "structure{ type : x ; }", "structure {type:A;} structure {id:2;}",
+            "structure {type:A; type:B;}", "  structure {type:HeadingLine}  ", "structure {}", "structure type:A;",
+            "readingOrder {index:0;} structure {type:DefaultLine;} textStyle {offset:0; length:3;}"
+        ]:
+            self.assertEqual(PageXML._parse_custom(custom), _reference_parse_custom(custom), f"Same for `{custom}`")
+
+    def test_tagrefs_memoized(self):
+        """ Test that TAGREFS are resolved once per file """
+        obj = AltoXML(os.path.join(_data, "alto", "working.xml"))
+        self.assertEqual(obj._parse_tagrefs("BT1707"), "MainZone")
+        self.assertEqual(obj._parse_tagrefs("unknown BT1707"), "MainZone")
+        self.assertIsNone(obj._parse_tagrefs("unknown"))
+        self.assertEqual(obj._tagrefs_cache, {"BT1707": "MainZone", "unknown BT1707": "MainZone", "unknown": None})